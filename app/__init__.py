@@ -1,26 +1,44 @@
-from flask import Flask, render_template
-from .config import Config
-from .extensions import db
-
-def create_app():
-    app = Flask(__name__)
-    app.config.from_object(Config)
-
-    db.init_app(app)
-
-    from .routes.certificates import bp as cert_bp
-    from .routes.assets import bp as assets_bp
-    from .routes.sync import bp as sync_bp
-    from .routes.api import bp as api_bp   
-    from .routes.home import bp as home_bp
-
-    app.register_blueprint(cert_bp)
-    app.register_blueprint(assets_bp)
-    app.register_blueprint(sync_bp)
-    app.register_blueprint(api_bp)
-    app.register_blueprint(home_bp)     
-
-    with app.app_context():
-        db.create_all()
-
-    return app
+from flask import Flask, render_template
+from .config import Config
+from .extensions import db
+from .migrations import upgrade_schema
+
+def create_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+
+    db.init_app(app)
+
+    from .routes.certificates import bp as cert_bp
+    from .routes.assets import bp as assets_bp
+    from .routes.sync import bp as sync_bp
+    from .routes.api import bp as api_bp   
+    from .routes.home import bp as home_bp
+    from .routes.dashboard import bp as dashboard_bp
+    from .routes.metrics import bp as metrics_bp
+
+    app.register_blueprint(cert_bp)
+    app.register_blueprint(assets_bp)
+    app.register_blueprint(sync_bp)
+    app.register_blueprint(api_bp)
+    app.register_blueprint(home_bp)
+    app.register_blueprint(dashboard_bp)     
+    app.register_blueprint(metrics_bp)
+
+    with app.app_context():
+        upgrade_schema()
+
+    from .services.job_runner import job_runner
+    job_runner.init_app(app)
+
+    from .commands import (
+        archive_list_command, archive_replay_command, normalize_backfill_command, rollup_rebuild_command,
+        search_reindex_command,
+    )
+    app.cli.add_command(search_reindex_command)
+    app.cli.add_command(normalize_backfill_command)
+    app.cli.add_command(rollup_rebuild_command)
+    app.cli.add_command(archive_list_command)
+    app.cli.add_command(archive_replay_command)
+
+    return app
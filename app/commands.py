@@ -0,0 +1,176 @@
+import json
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert, select, update
+
+from .extensions import db
+from .models import Certificate, Asset, AssetPort, CertificateAsset, CertificateSource
+from .services.page_archive import archived_run_ids, read_index, read_manifest
+from .services.rollup_service import rebuild_rollups
+from .services.search_service import index_search_terms, ip_key, set_index_complete
+from .services.sync_service import replay_archived_run
+from .services.upsert_service import (
+    asset_child_rows, certificate_child_rows, certificate_row, delete_child_rows, replace_asset_addresses,
+)
+
+@click.command("search-reindex")
+@click.option("--batch-size", default=5000, show_default=True)
+@with_appcontext
+def search_reindex_command(batch_size):
+    """
+    Backfills DN / asset name trigrams and asset IP keys for rows synced before
+    they existed, then lets DN / name searches use the trigram index.
+    """
+    last_id, terms = 0, 0
+    while True:
+        rows = db.session.execute(
+            select(Certificate.id, Certificate.dn).where(Certificate.id > last_id).order_by(Certificate.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        terms += index_search_terms("cert_dn", {r.dn for r in rows})
+        last_id = rows[-1].id
+    set_index_complete(["cert_dn"], True)
+    click.echo(f"certificates: {terms} new DN terms")
+
+    last_id, terms, keyed = 0, 0, 0
+    while True:
+        rows = db.session.execute(
+            select(Asset.id, Asset.name, Asset.primary_ip, Asset.primary_ip_key)
+            .where(Asset.id > last_id).order_by(Asset.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        terms += index_search_terms("asset_name", {r.name for r in rows})
+        keys = [
+            {"id": r.id, "primary_ip_key": ip_key(r.primary_ip)}
+            for r in rows if r.primary_ip and r.primary_ip_key is None
+        ]
+        if keys:
+            db.session.execute(update(Asset), keys)
+            db.session.commit()
+            keyed += len(keys)
+        last_id = rows[-1].id
+    set_index_complete(["asset_name"], True)
+    click.echo(f"assets: {terms} new name terms, {keyed} IP keys filled")
+
+NORMALIZED_CERT_COLUMNS = ("subject_cn", "subject_o", "subject_ou", "issuer_cn", "issuer_o")
+
+def _loads(value):
+    return json.loads(value) if value else None
+
+@click.command("normalize-backfill")
+@click.option("--batch-size", default=1000, show_default=True)
+@with_appcontext
+def normalize_backfill_command(batch_size):
+    """
+    Fills the subject / issuer columns and the source, port and address tables from
+    the stored JSON of rows synced before they existed. SANs are not in the stored
+    JSON; the next full sync fills those.
+    """
+    models = (CertificateSource, AssetPort)
+    last_id, done = 0, 0
+    while True:
+        certs = db.session.execute(
+            select(Certificate.id, Certificate.page_range, Certificate.subject_json, Certificate.issuer_json, Certificate.sources_json)
+            .where(Certificate.id > last_id).order_by(Certificate.id).limit(batch_size)
+        ).all()
+        if not certs:
+            break
+        cert_ids = [c.id for c in certs]
+
+        updates = []
+        rows = {model: [] for model in models}
+        for c in certs:
+            item = {"subject": _loads(c.subject_json), "issuer": _loads(c.issuer_json), "sources": _loads(c.sources_json)}
+            mapped = certificate_row(item, c.page_range)
+            updates.append({"id": c.id, **{k: mapped[k] for k in NORMALIZED_CERT_COLUMNS}})
+            rows[CertificateSource].extend(certificate_child_rows(c.id, item)[CertificateSource])
+
+        links = db.session.execute(
+            select(CertificateAsset.certificate_id, CertificateAsset.asset_id, CertificateAsset.host_instances_json)
+            .where(CertificateAsset.certificate_id.in_(cert_ids))
+        )
+        for link in links:
+            item = {"id": link.asset_id, "hostInstances": _loads(link.host_instances_json)}
+            for model, model_rows in asset_child_rows(link.certificate_id, item).items():
+                if model in rows:
+                    rows[model].extend(model_rows)
+
+        db.session.execute(update(Certificate), updates)
+        delete_child_rows(cert_ids, models)
+        for model, model_rows in rows.items():
+            if model_rows:
+                db.session.execute(insert(model), model_rows)
+        db.session.commit()
+
+        done += len(certs)
+        last_id = cert_ids[-1]
+    click.echo(f"certificates: {done} backfilled")
+
+    last_id, done = 0, 0
+    while True:
+        assets = db.session.execute(
+            select(Asset.id, Asset.asset_interfaces_json)
+            .where(Asset.id > last_id).order_by(Asset.id).limit(batch_size)
+        ).all()
+        if not assets:
+            break
+        replace_asset_addresses(
+            {a.id: {"id": a.id, "assetInterfaces": _loads(a.asset_interfaces_json)} for a in assets},
+            [a.id for a in assets],
+        )
+        db.session.commit()
+
+        done += len(assets)
+        last_id = assets[-1].id
+    click.echo(f"assets: {done} backfilled")
+
+@click.command("rollup-rebuild")
+@with_appcontext
+def rollup_rebuild_command():
+    """Recomputes the dashboard rollups from the certificates table."""
+    click.echo(f"rollups: {rebuild_rollups()} rows")
+
+def _archive_dir(archive_dir):
+    root = archive_dir or current_app.config.get("QUALYS_PAGE_ARCHIVE_DIR")
+    if not root:
+        raise click.UsageError("set QUALYS_PAGE_ARCHIVE_DIR or pass --archive-dir")
+    return root
+
+@click.command("archive-list")
+@click.option("--archive-dir", default=None, help="defaults to QUALYS_PAGE_ARCHIVE_DIR")
+@with_appcontext
+def archive_list_command(archive_dir):
+    """Lists the sync runs in the raw page archive."""
+    root = _archive_dir(archive_dir)
+    for run_id in archived_run_ids(root):
+        manifest = read_manifest(root, run_id)
+        entries = read_index(root, run_id)
+        size = sum(e["bytes"] for e in entries)
+        click.echo(
+            f"run {run_id}: {manifest.get('filter_value')}/{manifest.get('asset_type')} {manifest.get('mode')}, "
+            f"{len(entries)} pages, {size / 1e6:.1f} MB raw, started {manifest.get('started_at')}"
+        )
+
+@click.command("archive-replay")
+@click.argument("run_ids", nargs=-1, type=int, required=True)
+@click.option("--archive-dir", default=None, help="defaults to QUALYS_PAGE_ARCHIVE_DIR")
+@click.option("--upsert-mode", type=click.Choice(["bulk", "orm"]), default=None)
+@click.option("--batch-items", type=int, default=None, help="certificates per upsert batch")
+@with_appcontext
+def archive_replay_command(run_ids, archive_dir, upsert_mode, batch_items):
+    """Rebuilds / backfills the database from archived pages of the given sync runs, without calling CertView."""
+    root = _archive_dir(archive_dir)
+    for run_id in run_ids:
+        try:
+            result = replay_archived_run(run_id, root, upsert_mode=upsert_mode, batch_items=batch_items)
+        except LookupError as e:
+            raise click.ClickException(str(e))
+        rate = result["processed"] / result["seconds"] if result["seconds"] else 0
+        click.echo(
+            f"run {run_id}: {result['pages']} pages, {result['inserted']} inserted, {result['updated']} updated, "
+            f"{result['unchanged']} unchanged in {result['seconds']}s ({rate:.0f} certificates/sec)"
+        )
@@ -1,26 +1,107 @@
-import os
-
-class Config:
-    SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")
-
-    # MSSQL LocalDB example:
-    # Server=(localdb)\MSSQLLocalDB;Database=QualysCertDB;Trusted_Connection=yes;TrustServerCertificate=yes;
-    MSSQL_ODBC_CONN_STR = os.getenv(
-        "MSSQL_ODBC_CONN_STR",
-        r"DRIVER={ODBC Driver 18 for SQL Server};"
-        r"SERVER=(localdb)\MSSQLLocalDB;"
-        r"DATABASE=QualysCertDB;"
-        r"Trusted_Connection=yes;"
-        r"TrustServerCertificate=yes;"
-    )
-
-    SQLALCHEMY_DATABASE_URI = "mssql+pyodbc:///?odbc_connect=" + MSSQL_ODBC_CONN_STR.replace(";", "%3B").replace("=", "%3D")
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
-
-    QUALYS_BASE_URL = os.getenv("QUALYS_BASE_URL", "https://qualys_base_url")
-    #QUALYS_JWT = os.getenv("QUALYS_JWT", "")
-    QUALYS_PAGE_SIZE = int(os.getenv("QUALYS_PAGE_SIZE", "100"))  # adjust as needed
-    QUALYS_TIMEOUT_SECS = int(os.getenv("QUALYS_TIMEOUT_SECS", "60"))
-    QUALYS_USERNAME = os.getenv("QUALYS_USERNAME", "")
-    QUALYS_PASSWORD = os.getenv("QUALYS_PASSWORD", "")
-    QUALYS_AUTH_URL = os.getenv("QUALYS_AUTH_URL", "https://gateway.qg3.apps.qualys.com/auth")
+import os
+
+class Config:
+    SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")
+
+    # MSSQL LocalDB example:
+    # Server=(localdb)\MSSQLLocalDB;Database=QualysCertDB;Trusted_Connection=yes;TrustServerCertificate=yes;
+    MSSQL_ODBC_CONN_STR = os.getenv(
+        "MSSQL_ODBC_CONN_STR",
+        r"DRIVER={ODBC Driver 18 for SQL Server};"
+        r"SERVER=(localdb)\MSSQLLocalDB;"
+        r"DATABASE=QualysCertDB;"
+        r"Trusted_Connection=yes;"
+        r"TrustServerCertificate=yes;"
+    )
+
+    # DATABASE_URL overrides the MSSQL connection (e.g. "sqlite:///qualys.db" for local runs)
+    SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL") or (
+        "mssql+pyodbc:///?odbc_connect=" + MSSQL_ODBC_CONN_STR.replace(";", "%3B").replace("=", "%3D")
+    )
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # pyodbc sends executemany batches as a single parameter array instead of one round trip per row
+    SQLALCHEMY_ENGINE_OPTIONS = (
+        {"fast_executemany": True} if SQLALCHEMY_DATABASE_URI.startswith("mssql+pyodbc") else {}
+    )
+
+    QUALYS_BASE_URL = os.getenv("QUALYS_BASE_URL", "https://qualys_base_url")
+    #QUALYS_JWT = os.getenv("QUALYS_JWT", "")
+    QUALYS_PAGE_SIZE = int(os.getenv("QUALYS_PAGE_SIZE", "100"))  # adjust as needed
+    QUALYS_TIMEOUT_SECS = int(os.getenv("QUALYS_TIMEOUT_SECS", "60"))
+    QUALYS_USERNAME = os.getenv("QUALYS_USERNAME", "")
+    QUALYS_PASSWORD = os.getenv("QUALYS_PASSWORD", "")
+    QUALYS_AUTH_URL = os.getenv("QUALYS_AUTH_URL", "https://gateway.qg3.apps.qualys.com/auth")
+    # cached tokens are refreshed this long before TOKEN_LIFETIME runs out
+    QUALYS_TOKEN_REFRESH_MARGIN_SECS = int(os.getenv("QUALYS_TOKEN_REFRESH_MARGIN_SECS", "300"))
+
+    # Shared keep-alive HTTP session + retry/backoff for 429/5xx and connection errors
+    QUALYS_HTTP_POOL_SIZE = int(os.getenv("QUALYS_HTTP_POOL_SIZE", "10"))
+    QUALYS_HTTP_MAX_RETRIES = int(os.getenv("QUALYS_HTTP_MAX_RETRIES", "5"))
+    QUALYS_HTTP_BACKOFF_SECS = float(os.getenv("QUALYS_HTTP_BACKOFF_SECS", "1"))
+    QUALYS_HTTP_MAX_BACKOFF_SECS = float(os.getenv("QUALYS_HTTP_MAX_BACKOFF_SECS", "60"))
+    # requests/sec per Qualys base URL across all syncs in this process (0 = unlimited)
+    QUALYS_RATE_LIMIT_PER_SEC = float(os.getenv("QUALYS_RATE_LIMIT_PER_SEC", "0"))
+    QUALYS_RATE_LIMIT_BURST = int(os.getenv("QUALYS_RATE_LIMIT_BURST", "1"))
+
+    # "bulk" = set-based lookups + executemany per page, "orm" = legacy per-row session.get/query loop
+    QUALYS_SYNC_UPSERT_MODE = os.getenv("QUALYS_SYNC_UPSERT_MODE", "bulk")
+    # >1 fetches pages on a worker pool while this thread writes them in page order
+    QUALYS_SYNC_CONCURRENCY = int(os.getenv("QUALYS_SYNC_CONCURRENCY", "1"))
+    # pages requested ahead of the writer (never less than the concurrency)
+    QUALYS_SYNC_PREFETCH = int(os.getenv("QUALYS_SYNC_PREFETCH", "4"))
+    # 1 = spool each page body to a temp file and parse it certificate by certificate (needs ijson),
+    # upserting STREAM_BATCH_ITEMS certificates at a time; bodies above STREAM_SPOOL_MB go to disk
+    QUALYS_SYNC_STREAMING = os.getenv("QUALYS_SYNC_STREAMING", "0").lower() in ("1", "true", "yes")
+    QUALYS_STREAM_BATCH_ITEMS = int(os.getenv("QUALYS_STREAM_BATCH_ITEMS", "200"))
+    QUALYS_STREAM_SPOOL_MB = int(os.getenv("QUALYS_STREAM_SPOOL_MB", "16"))
+    # adaptive: pageSize moves between PAGE_SIZE_MIN and PAGE_SIZE_MAX (starting at QUALYS_PAGE_SIZE) so a
+    # page takes about PAGE_TARGET_SECS and stays under PAGE_MAX_MB; timeouts / 5xx retry the page smaller
+    QUALYS_ADAPTIVE_PAGE_SIZE = os.getenv("QUALYS_ADAPTIVE_PAGE_SIZE", "0").lower() in ("1", "true", "yes")
+    QUALYS_PAGE_SIZE_MIN = int(os.getenv("QUALYS_PAGE_SIZE_MIN", "25"))
+    QUALYS_PAGE_SIZE_MAX = int(os.getenv("QUALYS_PAGE_SIZE_MAX", "1000"))
+    QUALYS_PAGE_TARGET_SECS = float(os.getenv("QUALYS_PAGE_TARGET_SECS", "10"))
+    QUALYS_PAGE_MAX_MB = int(os.getenv("QUALYS_PAGE_MAX_MB", "50"))
+    # set = keep every raw page as gzip NDJSON under this directory (run-<id>/...) for `flask archive-replay`;
+    # a new segment file starts once the current one passes ARCHIVE_SEGMENT_MB
+    QUALYS_PAGE_ARCHIVE_DIR = os.getenv("QUALYS_PAGE_ARCHIVE_DIR", "")
+    QUALYS_ARCHIVE_SEGMENT_MB = int(os.getenv("QUALYS_ARCHIVE_SEGMENT_MB", "256"))
+
+    # Partitioned sync: the filter is split into slices (extra filters) paged in parallel by PARTITION_WORKERS
+    # threads, each with its own checkpoint. Default slices: PARTITION_MONTHS-month windows of PARTITION_FIELD
+    # from PARTITION_YEARS_BACK years ago to PARTITION_YEARS_AHEAD years ahead, plus one open-ended slice on
+    # each side. QUALYS_PARTITION_SLICES (JSON [{"key": ..., "filters": [...]}, ...]) replaces them.
+    QUALYS_PARTITION_WORKERS = int(os.getenv("QUALYS_PARTITION_WORKERS", "4"))
+    QUALYS_PARTITION_FIELD = os.getenv("QUALYS_PARTITION_FIELD", "certificate.validToDate")
+    QUALYS_PARTITION_LOWER_OPERATOR = os.getenv("QUALYS_PARTITION_LOWER_OPERATOR", "GREATER")
+    QUALYS_PARTITION_UPPER_OPERATOR = os.getenv("QUALYS_PARTITION_UPPER_OPERATOR", "LESSER")
+    QUALYS_PARTITION_MONTHS = int(os.getenv("QUALYS_PARTITION_MONTHS", "3"))
+    QUALYS_PARTITION_YEARS_BACK = int(os.getenv("QUALYS_PARTITION_YEARS_BACK", "1"))
+    QUALYS_PARTITION_YEARS_AHEAD = int(os.getenv("QUALYS_PARTITION_YEARS_AHEAD", "3"))
+    QUALYS_PARTITION_SLICES = os.getenv("QUALYS_PARTITION_SLICES", "")
+
+    # Incremental sync: range filter on the certificate update date, starting from the
+    # last high-water mark minus an overlap (re-upserting a few rows is harmless)
+    QUALYS_UPDATED_DATE_FIELD = os.getenv("QUALYS_UPDATED_DATE_FIELD", "certificate.updateDate")
+    QUALYS_UPDATED_DATE_OPERATOR = os.getenv("QUALYS_UPDATED_DATE_OPERATOR", "GREATER")
+    QUALYS_INCREMENTAL_OVERLAP_SECS = int(os.getenv("QUALYS_INCREMENTAL_OVERLAP_SECS", "300"))
+    # an incremental request becomes a full, deletion-reconciling run when the last one is older than this
+    QUALYS_FULL_SYNC_INTERVAL_HOURS = float(os.getenv("QUALYS_FULL_SYNC_INTERVAL_HOURS", "24"))
+
+    # Background sync jobs (in-process thread pool; runs are tracked in sync_runs)
+    SYNC_JOB_WORKERS = int(os.getenv("SYNC_JOB_WORKERS", "3"))
+    # a queued/running run without a page commit for this long is treated as abandoned
+    SYNC_STALE_RUN_MINUTES = int(os.getenv("SYNC_STALE_RUN_MINUTES", "30"))
+    SYNC_JOB_STREAM_INTERVAL_SECS = float(os.getenv("SYNC_JOB_STREAM_INTERVAL_SECS", "2"))
+
+    # Exports stream rows from the cursor and flush every N rows
+    EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))
+
+    # Bulk mapped_to_inventory updates by filter commit every N certificates
+    BULK_UPDATE_BATCH_ROWS = int(os.getenv("BULK_UPDATE_BATCH_ROWS", "5000"))
+
+    # List views page by id (keyset); filtered totals are cached instead of counted per page view
+    LIST_COUNT_CACHE_SECS = int(os.getenv("LIST_COUNT_CACHE_SECS", "300"))
+
+    # Dashboard: RSA/DSA keys below this size count as weak; expiry buckets in days from today
+    DASHBOARD_WEAK_KEY_BITS = int(os.getenv("DASHBOARD_WEAK_KEY_BITS", "2048"))
+    DASHBOARD_EXPIRY_BUCKETS = [int(d) for d in os.getenv("DASHBOARD_EXPIRY_BUCKETS", "30,60,90").split(",")]
@@ -1,7 +1,12 @@
 import csv
+from datetime import date, datetime, timezone
+from itertools import islice
 from typing import IO, Dict, Any, Optional
+from sqlalchemy import insert, select, update
 from sqlalchemy.orm import Session
 
+from .services.db_utils import chunked
+
 # Your existing SQLAlchemy model
 # from yourapp.models import QualysLeafCertificates
 
@@ -13,7 +18,44 @@ def _norm(v: Optional[str]) -> Optional[str]:
     return s if s else None
 
 
-def import_leaf_certs_row_by_row(
+def _typed(value: Optional[str], column_type):
+    """
+    CSV text -> the column's Python type (datetime, int, Decimal, ...), so the
+    upsert compares like with like; text that does not parse is kept as is.
+    """
+    if value is None:
+        return None
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is str:
+        return value
+    try:
+        if python_type in (datetime, date):
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            if python_type is date:
+                return parsed.date()
+            if parsed.tzinfo is not None and not getattr(column_type, "timezone", False):
+                # naive UTC, the form stored in DateTime columns
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            return parsed
+        if python_type is bool:
+            return {"true": True, "1": True, "false": False, "0": False}[value.lower()]
+        return python_type(value)
+    except (KeyError, TypeError, ValueError, ArithmeticError):
+        return value
+
+
+def _read_batches(reader, batch_size: int):
+    while True:
+        batch = list(islice(reader, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_leaf_certs(
     file_handle: IO[str],
     session: Session,
     Model,  # QualysLeafCertificates
@@ -21,54 +63,114 @@ def import_leaf_certs_row_by_row(
     csv_to_model_map: Dict[str, str],
     serial_csv_col: str = "Serial Number",
     serial_model_field: str = "SerialNumber",
-    commit_every: int = 2000,
-) -> None:
+    batch_size: int = 2000,
+    upsert: bool = False,
+) -> Dict[str, Any]:
     """
-    Reads CSV row-by-row and:
-      1) checks existence with: session.query(Model).filter_by(SerialNumber=...).first()
-      2) inserts a new Model instance if not found
+    Reads the CSV in batches of `batch_size` rows and, per batch:
+      1) drops serials already seen earlier in the file (first occurrence wins)
+      2) resolves stored serials with one IN-list query per 1000 serials
+      3) inserts the new rows with one bulk INSERT
+      4) upsert=True: updates stored rows whose mapped fields differ, comparing
+         values converted to each column's Python type (otherwise stored
+         serials are skipped, as before)
+      5) commits
 
     - file_handle: already-open text file handler
     - session: active SQLAlchemy Session (DB connection already covered by you)
     - Model: your SQLAlchemy model class (QualysLeafCertificates)
     - csv_to_model_map: maps CSV column -> Model field, e.g. {"Serial Number": "SerialNumber"}
-    - commit_every: commit in batches to avoid huge transactions
+
+    Returns counts: rows_read, skipped_blank, duplicates_in_file, existing, inserted, updated.
     """
 
     reader = csv.DictReader(file_handle)
-
-    pending = 0
-    for row in reader:
-        serial_value = _norm(row.get(serial_csv_col))
-        if not serial_value:
-            continue
-
-        # Existence check exactly as requested (filter_by per row)
-        exists = (
-            session.query(Model)
-            .filter_by(**{serial_model_field: serial_value})
-            .first()
-        )
-        if exists:
+    serial_attr = getattr(Model, serial_model_field)
+    pk_attrs = [getattr(Model, c.key) for c in Model.__mapper__.primary_key]
+    fields = list(dict.fromkeys(csv_to_model_map.values()))
+    column_types = {f: getattr(Model, f).type for f in fields}
+
+    stats = {"rows_read": 0, "skipped_blank": 0, "duplicates_in_file": 0, "existing": 0, "inserted": 0, "updated": 0}
+    seen = set()
+
+    for batch in _read_batches(reader, batch_size):
+        stats["rows_read"] += len(batch)
+
+        records = {}
+        for row in batch:
+            serial_value = _norm(row.get(serial_csv_col))
+            if not serial_value:
+                stats["skipped_blank"] += 1
+                continue
+            if serial_value in seen:
+                stats["duplicates_in_file"] += 1
+                continue
+            seen.add(serial_value)
+
+            # Populate model fields from CSV based on mapping
+            record = {
+                model_field: _typed(_norm(row.get(csv_col)), column_types[model_field])
+                for csv_col, model_field in csv_to_model_map.items()
+                if csv_col in row
+            }
+            record[serial_model_field] = serial_value
+            records[serial_value] = record
+
+        if not records:
             continue
 
-        obj = Model()
+        # serial -> stored row (pk + mapped fields, for the upsert diff)
+        stored = {}
+        columns = [*pk_attrs, serial_attr, *(getattr(Model, f) for f in fields)] if upsert else [serial_attr]
+        for chunk in chunked(list(records)):
+            for r in session.execute(select(*columns).where(serial_attr.in_(chunk))):
+                stored[getattr(r, serial_model_field)] = r
+        stats["existing"] += len(stored)
+
+        new_rows = [record for serial, record in records.items() if serial not in stored]
+        if new_rows:
+            session.execute(insert(Model), new_rows)
+        stats["inserted"] += len(new_rows)
+
+        if upsert:
+            changed_rows = []
+            for serial, r in stored.items():
+                changes = {
+                    field: value
+                    for field, value in records[serial].items()
+                    if field != serial_model_field and getattr(r, field) != value
+                }
+                if changes:
+                    changed_rows.append({**{a.key: getattr(r, a.key) for a in pk_attrs}, **changes})
+            if changed_rows:
+                session.execute(update(Model), changed_rows)
+            stats["updated"] += len(changed_rows)
 
-        # Populate model fields from CSV based on mapping
-        for csv_col, model_field in csv_to_model_map.items():
-            if csv_col not in row:
-                continue
-            setattr(obj, model_field, _norm(row.get(csv_col)))
+        session.commit()
 
-        session.add(obj)
-        pending += 1
+    return stats
 
-        if pending >= commit_every:
-            session.commit()
-            pending = 0
 
-    if pending:
-        session.commit()
+def import_leaf_certs_row_by_row(
+    file_handle: IO[str],
+    session: Session,
+    Model,  # QualysLeafCertificates
+    *,
+    csv_to_model_map: Dict[str, str],
+    serial_csv_col: str = "Serial Number",
+    serial_model_field: str = "SerialNumber",
+    commit_every: int = 2000,
+) -> Dict[str, Any]:
+    """Former per-row entry point; kept for existing callers, now runs import_leaf_certs in batches of commit_every."""
+    return import_leaf_certs(
+        file_handle,
+        session,
+        Model,
+        csv_to_model_map=csv_to_model_map,
+        serial_csv_col=serial_csv_col,
+        serial_model_field=serial_model_field,
+        batch_size=commit_every,
+    )
 
 
 # -------------------------
@@ -86,13 +188,14 @@ csv_to_model_map = {
 }
 
 with open("leafcerts.csv", "r", encoding="utf-8", newline="") as f:
-    import_leaf_certs_row_by_row(
+    stats = import_leaf_certs(
         file_handle=f,
         session=db.session,  # your SQLAlchemy session
         Model=QualysLeafCertificates,
         csv_to_model_map=csv_to_model_map,
         serial_csv_col="Serial Number",
         serial_model_field="SerialNumber",
-        commit_every=2000,
+        batch_size=2000,
+        upsert=False,  # True: update stored rows whose fields changed
     )
 """
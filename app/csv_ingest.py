@@ -0,0 +1,376 @@
+"""
+Parallel ingestion of many leaf certificate CSV exports (a directory or a glob).
+
+  parser processes --(one bounded queue per writer)--> writer threads --> DB
+
+Parsers read a file in chunks, normalize them (leafcert_import.normalize_chunk),
+drop serials repeated in the file and split each chunk by a hash of the serial,
+so a given serial always goes to the same writer and writers never race each
+other on it. The queues are bounded: when the DB falls behind, parsers wait.
+
+csv_import_files records every file by content hash; completed files are
+skipped on the next run (--force loads them again). Loading a file twice is
+harmless anyway, since stored serials are never inserted again. A failed
+manifest update is retried, and on the way out the parsers and writers are
+always stopped and unfinished files recorded as failed.
+
+Usage:
+  python -m app.csv_ingest "drops/*.csv" --parsers 4 --writers 2 [--strategy staged]
+"""
+import argparse
+import glob
+import hashlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from .config import Config
+from .leafcert_import import DEFAULT_COLUMN_MAP, STRATEGIES, frame_rows, make_inserter, normalize_chunk
+from .models import CsvImportFile
+
+
+def find_csv_files(source: str) -> list:
+    if os.path.isdir(source):
+        source = os.path.join(source, "*.csv")
+    return sorted(p for p in glob.glob(source) if os.path.isfile(p))
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _parse_file(path, file_id, column_map, serial_col, chunksize, writer_queues, events):
+    """Parser process: normalized, de-duplicated row batches onto the writer queues."""
+    import pandas as pd
+
+    seen = set()
+    rows_read = 0
+    batches = 0
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False):
+        rows_read += len(chunk)
+        df = normalize_chunk(chunk, column_map, serial_col)
+        df = df[~(df[serial_col].duplicated() | df[serial_col].isin(seen))]
+        seen.update(df[serial_col])
+
+        # stable across processes (unlike hash())
+        part = pd.util.hash_pandas_object(df[serial_col], index=False) % len(writer_queues)
+        for writer, batch in df.groupby(part.values):
+            # blocks while the writer's queue is full
+            writer_queues[writer].put((file_id, frame_rows(batch)))
+            batches += 1
+
+        events.put(("parsed", file_id, rows_read))
+    return file_id, rows_read, batches
+
+
+def _write_batches(engine, writer_queue, events, table, serial_col, db_columns, strategy, aborted):
+    """Writer thread: one connection, one commit per batch. Once `aborted` is set, batches are only drained."""
+    conn = inserter = None
+    try:
+        conn = engine.raw_connection()
+        inserter = make_inserter(conn.cursor(), table, serial_col, db_columns, strategy)
+        startup_error = None
+    except Exception as e:
+        # keep draining the queue, or the parsers feeding it would block forever
+        startup_error = str(e)
+
+    try:
+        while True:
+            item = writer_queue.get()
+            if item is None:
+                return
+            file_id, rows = item
+            if aborted.is_set():
+                continue
+            if startup_error:
+                events.put(("write_failed", file_id, startup_error))
+                continue
+            try:
+                inserted = inserter.insert(rows)
+                conn.commit()
+                events.put(("written", file_id, inserted, len(rows) - inserted))
+            except Exception as e:
+                conn.rollback()
+                events.put(("write_failed", file_id, str(e)))
+    finally:
+        if inserter is not None:
+            inserter.close()
+        if conn is not None:
+            conn.close()
+
+
+class _FileProgress:
+    def __init__(self, record: CsvImportFile, path: str):
+        self.file_id = record.id
+        self.name = record.file_name
+        self.path = path
+        self.status = None         # set by _finish_file
+        self.manifest_error = None
+        self.rows_read = 0
+        self.batches = None        # known once the parser is done
+        self.batches_written = 0
+        self.inserted = 0
+        self.existing = 0
+        self.error = None
+        self.started = time.perf_counter()
+
+    @property
+    def done(self) -> bool:
+        return self.error is not None or (self.batches is not None and self.batches_written >= self.batches)
+
+
+def ingest_files(
+    paths: list,
+    database_url: str,
+    *,
+    table: str = "qualysLeafcertificates",
+    serial_col: str = "serial_number",
+    column_map: dict = None,
+    strategy: str = "in_list",
+    parsers: int = 4,
+    writers: int = 2,
+    chunksize: int = 50000,
+    queue_batches: int = 8,
+    force: bool = False,
+    echo=print,
+) -> dict:
+    """
+    Loads `paths` through the parser/writer pipeline. Returns per-file results
+    keyed by file name, plus "skipped" for files already in the manifest.
+    """
+    column_map = column_map or DEFAULT_COLUMN_MAP
+    db_columns = list(column_map.keys())
+    engine = create_engine(database_url)
+    CsvImportFile.__table__.create(engine, checkfirst=True)
+
+    progress = {}
+    skipped = []
+    with Session(engine, expire_on_commit=False) as session:
+        for path in paths:
+            sha = file_sha256(path)
+            record = session.scalar(
+                select(CsvImportFile).where(CsvImportFile.target_table == table, CsvImportFile.file_sha256 == sha)
+            )
+            if record is not None and record.status == "completed" and not force:
+                skipped.append(path)
+                continue
+            if record is None:
+                record = CsvImportFile(target_table=table, file_sha256=sha)
+                session.add(record)
+            record.file_name = os.path.basename(path)
+            record.file_size = os.path.getsize(path)
+            record.status = "running"
+            record.error_message = None
+            record.started_at = datetime.utcnow()
+            record.finished_at = None
+            session.flush()
+            progress[record.id] = _FileProgress(record, path)
+        session.commit()
+
+        for path in skipped:
+            echo(f"skip {os.path.basename(path)} (already imported)")
+        if not progress:
+            return {"files": {}, "skipped": skipped}
+
+        unrecorded = []
+        abort_reason = "ingest aborted"
+        with multiprocessing.Manager() as manager:
+            writer_queues = [manager.Queue(maxsize=queue_batches) for _ in range(writers)]
+            events = manager.Queue()
+            aborted = threading.Event()
+
+            writer_threads = [
+                threading.Thread(
+                    target=_write_batches,
+                    args=(engine, q, events, table, serial_col, db_columns, strategy, aborted),
+                    name=f"csv-writer-{n}",
+                    daemon=True,
+                )
+                for n, q in enumerate(writer_queues)
+            ]
+            for t in writer_threads:
+                t.start()
+
+            pool = ProcessPoolExecutor(max_workers=parsers)
+            try:
+                futures = {
+                    pool.submit(_parse_file, p.path, file_id, column_map, serial_col, chunksize, writer_queues, events): file_id
+                    for file_id, p in progress.items()
+                }
+                pending = set(progress)
+                while pending:
+                    for future, file_id in list(futures.items()):
+                        if not future.done():
+                            continue
+                        del futures[future]
+                        try:
+                            _, rows_read, batches = future.result()
+                            progress[file_id].rows_read = rows_read
+                            progress[file_id].batches = batches
+                        except Exception as e:
+                            progress[file_id].error = f"parse failed: {e}"
+
+                    try:
+                        event = events.get(timeout=0.5)
+                    except queue.Empty:
+                        event = None
+                    if event is not None:
+                        _apply_event(progress, event, echo)
+
+                    for file_id in [f for f in pending if progress[f].done]:
+                        pending.discard(file_id)
+                        if not _finish_file(session, progress[file_id], echo):
+                            unrecorded.append(progress[file_id])
+            except BaseException as e:
+                # writers only drain from here on, so parsers blocked on a full queue can finish
+                aborted.set()
+                abort_reason = f"ingest aborted: {e!r}"
+                raise
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+                for q in writer_queues:
+                    q.put(None)
+                for t in writer_threads:
+                    t.join()
+
+                for p in progress.values():
+                    if p.status is None:
+                        p.error = p.error or abort_reason
+                        if not _finish_file(session, p, echo):
+                            unrecorded.append(p)
+                # the writers are gone, so nothing holds the database anymore
+                for p in unrecorded:
+                    if not _record_file(session, p):
+                        echo(f"manifest row of {p.name} not updated: {p.manifest_error}")
+
+    return {
+        "files": {
+            p.name: {
+                "status": p.status,
+                "rows_read": p.rows_read,
+                "inserted": p.inserted,
+                "existing": p.existing,
+                "error": p.error,
+                "manifest_error": p.manifest_error,
+            }
+            for p in progress.values()
+        },
+        "skipped": skipped,
+    }
+
+
+def _apply_event(progress: dict, event: tuple, echo) -> None:
+    kind, file_id = event[0], event[1]
+    p = progress[file_id]
+    if kind == "parsed":
+        p.rows_read = event[2]
+        echo(f"  {p.name}: {p.rows_read} rows parsed, {p.inserted} inserted")
+    elif kind == "written":
+        p.batches_written += 1
+        p.inserted += event[2]
+        p.existing += event[3]
+    elif kind == "write_failed":
+        p.batches_written += 1
+        p.error = p.error or f"write failed: {event[2]}"
+
+
+MANIFEST_ATTEMPTS = 5
+
+
+def _record_file(session: Session, p: _FileProgress) -> bool:
+    """
+    Writes the file's outcome to its manifest row. Retried with backoff: on
+    SQLite the writers' commits hold the database lock ("database is locked").
+    """
+    values = {
+        "status": p.status,
+        "error_message": p.error,
+        "rows_read": p.rows_read,
+        "inserted": p.inserted,
+        "existing": p.existing,
+        "finished_at": datetime.utcnow(),
+    }
+    for attempt in range(MANIFEST_ATTEMPTS):
+        if attempt:
+            time.sleep(0.2 * 2 ** attempt)
+        try:
+            session.execute(update(CsvImportFile).where(CsvImportFile.id == p.file_id).values(**values))
+            session.commit()
+            p.manifest_error = None
+            return True
+        except DBAPIError as e:
+            session.rollback()
+            p.manifest_error = str(e)
+    return False
+
+
+def _finish_file(session: Session, p: _FileProgress, echo) -> bool:
+    """Records and reports a finished file; False if its manifest row could not be updated yet."""
+    p.status = "failed" if p.error else "completed"
+    recorded = _record_file(session, p)
+
+    secs = time.perf_counter() - p.started
+    echo(
+        f"{p.status} {p.name}: {p.rows_read} rows, {p.inserted} inserted, "
+        f"{p.existing} already stored | {secs:.1f}s, {p.rows_read / secs if secs else 0:.0f} rows/s"
+        + (f" | {p.error}" if p.error else "")
+        + ("" if recorded else f" | manifest update failed, retried at the end: {p.manifest_error}")
+    )
+    return recorded
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Load a directory or glob of leaf certificate CSVs in parallel.")
+    parser.add_argument("source", help="directory (all *.csv) or glob pattern")
+    parser.add_argument("--table", default="qualysLeafcertificates")
+    parser.add_argument("--serial-col", default="serial_number")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="in_list")
+    parser.add_argument("--parsers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--chunksize", type=int, default=50000)
+    parser.add_argument("--queue-batches", type=int, default=8, help="batches buffered per writer before parsers wait")
+    parser.add_argument("--force", action="store_true", help="load files the manifest lists as completed")
+    parser.add_argument("--database-url", default=Config.SQLALCHEMY_DATABASE_URI)
+    args = parser.parse_args(argv)
+
+    paths = find_csv_files(args.source)
+    if not paths:
+        parser.error(f"no CSV files match {args.source}")
+
+    started = time.perf_counter()
+    result = ingest_files(
+        paths,
+        args.database_url,
+        table=args.table,
+        serial_col=args.serial_col,
+        strategy=args.strategy,
+        parsers=args.parsers,
+        writers=args.writers,
+        chunksize=args.chunksize,
+        queue_batches=args.queue_batches,
+        force=args.force,
+    )
+    files = result["files"].values()
+    rows = sum(f["rows_read"] for f in files)
+    secs = time.perf_counter() - started
+    print(
+        f"{len(result['files'])} files loaded ({sum(f['status'] == 'failed' for f in files)} failed), "
+        f"{len(result['skipped'])} skipped | {rows} rows, {sum(f['inserted'] for f in files)} inserted | "
+        f"{secs:.1f}s, {rows / secs if secs else 0:.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Bulk import of leaf certificate CSV exports into a SQL table, inserting only
+serial numbers that are not stored yet.
+
+Normalization and de-duplication are column operations on each pandas chunk;
+rows only become Python tuples for the executemany. Two ways to skip stored
+serials:
+
+  in_list  one IN-list query per 1500 serials, then executemany of the new rows
+  staged   executemany into a temp table, then one INSERT ... SELECT ... WHERE NOT EXISTS
+           (anti-join inside the server; best for very large tables)
+
+Usage:
+  python -m app.leafcert_import leaf_certs.csv [--strategy staged] [--database-url sqlite:///x.db]
+"""
+import argparse
+import time
+from typing import Dict, IO, List
+
+import pandas as pd
+
+# DB column -> CSV column
+DEFAULT_COLUMN_MAP: Dict[str, str] = {
+    "serial_number": "Serial number",
+    "cert_name": "Cert name",
+    "certhash": "Cert hash",
+    "valid_from_date": "Valid from",
+    "valid_to_date": "Valid to",
+    "certificate_status": "Cert status",
+}
+
+STRATEGIES = ("in_list", "staged")
+
+
+def normalize_serial(value) -> str | None:
+    if value is None:
+        return None
+    s = str(value).strip()
+    return s if s else None
+
+
+def _is_sqlite(cursor) -> bool:
+    # by the connection, so wrapped cursors (e.g. the benchmark's statement counter) are recognised too
+    return type(cursor.connection).__module__ == "sqlite3"
+
+
+def fetch_existing_serials(
+    cursor,
+    table: str,
+    serial_col: str,
+    serials: List[str],
+    batch_size: int = 1500,
+) -> set[str]:
+    existing = set()
+
+    for i in range(0, len(serials), batch_size):
+        batch = serials[i : i + batch_size]
+        placeholders = ",".join("?" * len(batch))
+        sql = f"""
+            SELECT {serial_col}
+            FROM {table}
+            WHERE {serial_col} IN ({placeholders})
+        """
+        cursor.execute(sql, batch)
+        existing.update(row[0] for row in cursor.fetchall())
+
+    return existing
+
+
+def normalize_chunk(chunk: pd.DataFrame, column_map: Dict[str, str], serial_col: str) -> pd.DataFrame:
+    """CSV columns -> DB columns, values stripped, blanks -> NULL, rows without a serial dropped."""
+    df = chunk[list(column_map.values())].set_axis(list(column_map), axis=1)
+    df = df.apply(lambda col: col.str.strip())
+    # not .replace("", None): pandas < 2 reads that as "pad from the previous row"
+    df = df.mask(df == "")
+    return df[df[serial_col].notna()]
+
+
+def frame_rows(df: pd.DataFrame) -> list:
+    """DataFrame -> list of row tuples for executemany, NaN as None."""
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+
+class _InListInserter:
+    """Looks the serials up with IN-lists, then inserts the rest with executemany."""
+
+    def __init__(self, cursor, table: str, serial_col: str, db_columns: List[str]):
+        self.cursor = cursor
+        self.table = table
+        self.serial_col = serial_col
+        self.serial_idx = db_columns.index(serial_col)
+        self.insert_sql = f"""
+            INSERT INTO {table} ({",".join(db_columns)})
+            VALUES ({",".join("?" * len(db_columns))})
+        """
+
+    def insert(self, rows: list) -> int:
+        existing = fetch_existing_serials(self.cursor, self.table, self.serial_col, [r[self.serial_idx] for r in rows])
+        new_rows = [r for r in rows if r[self.serial_idx] not in existing]
+        if new_rows:
+            self.cursor.executemany(self.insert_sql, new_rows)
+        return len(new_rows)
+
+    def close(self) -> None:
+        pass
+
+
+class _StagedInserter:
+    """Temp table with the target's column types; each batch is anti-joined into the target."""
+
+    def __init__(self, cursor, table: str, serial_col: str, db_columns: List[str]):
+        self.cursor = cursor
+        self.sqlite = _is_sqlite(cursor)
+        self.stage = "leafcert_stage" if self.sqlite else "#leafcert_stage"
+        cols = ",".join(db_columns)
+
+        if self.sqlite:
+            cursor.execute(f"CREATE TEMP TABLE {self.stage} AS SELECT {cols} FROM {table} WHERE 1 = 0")
+        else:
+            cursor.execute(f"SELECT TOP 0 {cols} INTO {self.stage} FROM {table}")
+
+        self.stage_sql = f"INSERT INTO {self.stage} ({cols}) VALUES ({','.join('?' * len(db_columns))})"
+        self.merge_sql = f"""
+            INSERT INTO {table} ({cols})
+            SELECT {",".join(f"s.{c}" for c in db_columns)}
+            FROM {self.stage} s
+            WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{serial_col} = s.{serial_col})
+        """
+        self.clear_sql = f"DELETE FROM {self.stage}" if self.sqlite else f"TRUNCATE TABLE {self.stage}"
+
+    def insert(self, rows: list) -> int:
+        self.cursor.executemany(self.stage_sql, rows)
+        self.cursor.execute(self.merge_sql)
+        inserted = self.cursor.rowcount
+        self.cursor.execute(self.clear_sql)
+        return inserted
+
+    def close(self) -> None:
+        self.cursor.execute(f"DROP TABLE {self.stage}")
+
+
+def make_inserter(cursor, table: str, serial_col: str, db_columns: List[str], strategy: str = "in_list"):
+    """
+    Object with insert(rows) -> inserted count and close(). Rows are tuples in
+    db_columns order whose serials are unique within the batch.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"unknown strategy {strategy!r} (expected one of {', '.join(STRATEGIES)})")
+
+    if hasattr(cursor, "fast_executemany"):
+        # pyodbc: one parameter array per executemany instead of a round trip per row
+        cursor.fast_executemany = True
+
+    if strategy == "staged":
+        return _StagedInserter(cursor, table, serial_col, db_columns)
+    return _InListInserter(cursor, table, serial_col, db_columns)
+
+
+def import_leafcert_csv(
+    file_handle: IO,
+    cursor,
+    table: str = "qualysLeafcertificates",
+    serial_col: str = "serial_number",
+    chunksize: int = 5000,
+    *,
+    column_map: Dict[str, str] = None,
+    strategy: str = "in_list",
+    commit: bool = False,
+) -> dict:
+    """
+    Reads CSV from file handler and inserts only new certificates
+    based on serial number. A serial repeated in the file is inserted once
+    (first occurrence). commit=True commits after every chunk; otherwise the
+    caller owns the transaction.
+
+    Returns counts: rows_read, duplicates_in_file, existing, inserted, seconds, rows_per_sec.
+    """
+    column_map = column_map or DEFAULT_COLUMN_MAP
+    inserter = make_inserter(cursor, table, serial_col, list(column_map.keys()), strategy)
+
+    reader = pd.read_csv(
+        file_handle,
+        chunksize=chunksize,
+        dtype=str,
+        keep_default_na=False,
+    )
+
+    stats = {"rows_read": 0, "duplicates_in_file": 0, "existing": 0, "inserted": 0}
+    seen = set()
+    started = time.perf_counter()
+
+    try:
+        for chunk in reader:
+            stats["rows_read"] += len(chunk)
+            df = normalize_chunk(chunk, column_map, serial_col)
+
+            # first occurrence in the file wins
+            repeated = df[serial_col].duplicated() | df[serial_col].isin(seen)
+            stats["duplicates_in_file"] += int(repeated.sum())
+            df = df[~repeated]
+            seen.update(df[serial_col])
+            if df.empty:
+                continue
+
+            inserted = inserter.insert(frame_rows(df))
+            stats["inserted"] += inserted
+            stats["existing"] += len(df) - inserted
+
+            if commit:
+                cursor.connection.commit()
+    finally:
+        inserter.close()
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["rows_per_sec"] = round(stats["rows_read"] / stats["seconds"]) if stats["seconds"] else None
+    return stats
+
+
+def main(argv=None) -> None:
+    from sqlalchemy import create_engine
+    from .config import Config
+
+    parser = argparse.ArgumentParser(description="Import a leaf certificate CSV, inserting new serial numbers only.")
+    parser.add_argument("csv_path")
+    parser.add_argument("--table", default="qualysLeafcertificates")
+    parser.add_argument("--serial-col", default="serial_number")
+    parser.add_argument("--chunksize", type=int, default=50000)
+    parser.add_argument("--strategy", choices=STRATEGIES, default="in_list")
+    parser.add_argument("--database-url", default=Config.SQLALCHEMY_DATABASE_URI)
+    args = parser.parse_args(argv)
+
+    conn = create_engine(args.database_url).raw_connection()
+    try:
+        with open(args.csv_path, "r", encoding="utf-8", newline="") as f:
+            stats = import_leafcert_csv(
+                f,
+                conn.cursor(),
+                table=args.table,
+                serial_col=args.serial_col,
+                chunksize=args.chunksize,
+                strategy=args.strategy,
+                commit=True,
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+    print(
+        f"{stats['rows_read']} rows read, {stats['inserted']} inserted, {stats['existing']} already stored, "
+        f"{stats['duplicates_in_file']} repeated in file | {stats['seconds']}s, {stats['rows_per_sec']} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+from sqlalchemy import MetaData, Table, inspect, text
+from .extensions import db
+from .services.search_service import ip_key, set_index_complete
+
+def add_missing_columns() -> list:
+    """
+    db.create_all() only creates missing tables. This adds columns declared on
+    the models but missing from existing tables, so an
+    existing database picks up new nullable columns without manual DDL.
+    Returns the "table.column" names that were added.
+    """
+    inspector = inspect(db.engine)
+    added = []
+
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+
+                col_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD {column.name} {col_type} NULL"))
+                added.append(f"{table.name}.{column.name}")
+
+    return added
+
+def add_missing_indexes() -> list:
+    """Creates model indexes missing from existing tables (new columns, or index=True added later)."""
+    inspector = inspect(db.engine)
+    added = []
+
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    added.append(index.name)
+
+    return added
+
+def _rename_table(conn, old: str, new: str) -> None:
+    if conn.dialect.name == "mssql":
+        conn.execute(text(f"EXEC sp_rename '{old}', '{new}'"))
+    else:
+        conn.execute(text(f"ALTER TABLE {old} RENAME TO {new}"))
+
+def _set_aside_if_per_certificate(table: str) -> bool:
+    """
+    Renames `table` to <table>_legacy if it still has a certificate_id column
+    (after dropping its ix_ indexes, whose names the new table reuses), so
+    create_all() can build the per-asset shape. Returns True if it was moved.
+    """
+    inspector = inspect(db.engine)
+    if not inspector.has_table(table):
+        return False
+    if "certificate_id" not in {c["name"] for c in inspector.get_columns(table)}:
+        return False
+
+    with db.engine.begin() as conn:
+        legacy = Table(table, MetaData(), autoload_with=conn)
+        for index in legacy.indexes:
+            if index.name and index.name.startswith("ix_"):
+                index.drop(conn)
+        _rename_table(conn, table, f"{table}_legacy")
+    return True
+
+def set_aside_legacy_assets() -> bool:
+    """
+    assets used to hold one row per (certificate, asset) with the Qualys id in
+    asset_id, and asset_addresses one row per (certificate, asset, address).
+    Moves either shape aside to <table>_legacy. Returns True if a table was moved.
+    """
+    moved_assets = _set_aside_if_per_certificate("assets")
+    moved_addresses = _set_aside_if_per_certificate("asset_addresses")
+    return moved_assets or moved_addresses
+
+# assets columns copied from assets_legacy ("id" comes from its asset_id); ones the legacy table lacks become NULL
+LEGACY_ASSET_COLUMNS = (
+    "uuid", "name", "netbios_name", "operating_system", "primary_ip", "primary_ip_key",
+    "asset_interfaces_json", "inserted_at",
+)
+
+def _fill_primary_ip_keys(conn) -> None:
+    rows = conn.execute(text(
+        "SELECT id, primary_ip FROM assets WHERE primary_ip_key IS NULL AND primary_ip IS NOT NULL"
+    )).all()
+    keys = [{"id": r.id, "key": ip_key(r.primary_ip)} for r in rows]
+    keys = [k for k in keys if k["key"]]
+    if keys:
+        conn.execute(text("UPDATE assets SET primary_ip_key = :key WHERE id = :id"), keys)
+
+def migrate_legacy_assets() -> None:
+    """
+    Copies assets_legacy into assets (newest row per Qualys asset id) and
+    certificate_assets (one link per certificate/asset pair), then drops it.
+    The legacy table may predate some columns (primary_ip_key is computed
+    here); port and address rows are rebuilt by normalize-backfill.
+    """
+    inspector = inspect(db.engine)
+    if not inspector.has_table("assets_legacy"):
+        return
+    legacy = {c["name"] for c in inspector.get_columns("assets_legacy")}
+    selected = ", ".join(f"l.{c}" if c in legacy else "NULL" for c in LEGACY_ASSET_COLUMNS)
+
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            f"""
+            INSERT INTO assets (id, {", ".join(LEGACY_ASSET_COLUMNS)})
+            SELECT l.asset_id, {selected}
+            FROM assets_legacy l
+            WHERE l.id IN (SELECT MAX(id) FROM assets_legacy GROUP BY asset_id)
+              AND NOT EXISTS (SELECT 1 FROM assets a WHERE a.id = l.asset_id)
+            """
+        ))
+        _fill_primary_ip_keys(conn)
+        host_instances = "l.host_instances_json" if "host_instances_json" in legacy else "NULL"
+        conn.execute(text(
+            f"""
+            INSERT INTO certificate_assets (certificate_id, asset_id, host_instances_json)
+            SELECT l.certificate_id, l.asset_id, {host_instances}
+            FROM assets_legacy l
+            WHERE l.id IN (SELECT MAX(id) FROM assets_legacy GROUP BY certificate_id, asset_id)
+              AND NOT EXISTS (
+                  SELECT 1 FROM certificate_assets ca
+                  WHERE ca.certificate_id = l.certificate_id AND ca.asset_id = l.asset_id
+              )
+            """
+        ))
+        conn.execute(text("DROP TABLE assets_legacy"))
+
+def migrate_legacy_asset_addresses() -> None:
+    """Copies asset_addresses_legacy into asset_addresses (one row per asset/address), then drops it."""
+    if not inspect(db.engine).has_table("asset_addresses_legacy"):
+        return
+
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            """
+            INSERT INTO asset_addresses (asset_id, address, address_key)
+            SELECT DISTINCT l.asset_id, l.address, l.address_key
+            FROM asset_addresses_legacy l
+            WHERE NOT EXISTS (SELECT 1 FROM asset_addresses a WHERE a.asset_id = l.asset_id)
+            """
+        ))
+        conn.execute(text("DROP TABLE asset_addresses_legacy"))
+
+# trigram index kind -> table whose values it covers
+SEARCH_INDEX_TABLES = {"cert_dn": "certificates", "asset_name": "assets"}
+
+def init_search_index_state() -> None:
+    """
+    A kind seen for the first time is complete only if its table is still empty
+    (the sync indexes every page from then on); otherwise searches use ILIKE
+    until `flask search-reindex` has backfilled it.
+    """
+    with db.engine.connect() as conn:
+        known = {r.kind for r in conn.execute(text("SELECT kind FROM search_index_state"))}
+        empty = [
+            kind for kind, table in SEARCH_INDEX_TABLES.items()
+            if kind not in known and conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() == 0
+        ]
+        pending = [kind for kind in SEARCH_INDEX_TABLES if kind not in known and kind not in empty]
+    if empty:
+        set_index_complete(empty, True)
+    if pending:
+        set_index_complete(pending, False)
+
+def upgrade_schema() -> None:
+    set_aside_legacy_assets()
+    db.create_all()
+    migrate_legacy_assets()
+    migrate_legacy_asset_addresses()
+    add_missing_columns()
+    add_missing_indexes()
+    init_search_index_state()
@@ -1,95 +1,325 @@
-from datetime import datetime
-from sqlalchemy import UniqueConstraint
-from .extensions import db
-
-class Certificate(db.Model):
-    __tablename__ = "certificates"
-
-    id = db.Column(db.BigInteger, primary_key=True)  # Qualys "id"
-    certhash = db.Column(db.String(128), index=True)
-    serial_number = db.Column(db.String(128), index=True)
-    dn = db.Column(db.String(1024), index=True)
-    cert_type = db.Column(db.String(64), index=True)  # "Root"
-    signature_algorithm = db.Column(db.String(128))
-    key_size = db.Column(db.Integer)
-    self_signed = db.Column(db.Boolean)
-    extended_validation = db.Column(db.Boolean)
-
-    valid_from_date = db.Column(db.DateTime, nullable=True)
-    valid_to_date = db.Column(db.DateTime, nullable=True)
-
-    created_date = db.Column(db.DateTime, nullable=True)
-    update_date = db.Column(db.DateTime, nullable=True)
-
-    issuer_category = db.Column(db.String(128), nullable=True)
-    instance_count = db.Column(db.Integer, nullable=True)
-    asset_count = db.Column(db.Integer, nullable=True)
-
-    sources_json = db.Column(db.Text, nullable=True)     # store list as JSON string
-    subject_json = db.Column(db.Text, nullable=True)     # store dict as JSON string
-    issuer_json = db.Column(db.Text, nullable=True)      # store dict as JSON string
-
-    # REQUIRED extra fields:
-    page_range = db.Column(db.String(32), nullable=False)          # e.g. "0-99"
-    mapped_to_inventory = db.Column(db.Boolean, default=False)     # yes/no
-
-    inserted_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-    assets = db.relationship("Asset", backref="certificate", cascade="all, delete-orphan", lazy=True)
-
-class Asset(db.Model):
-    __tablename__ = "assets"
-    __table_args__ = (
-        UniqueConstraint("certificate_id", "asset_id", name="uq_asset_per_cert"),
-    )
-
-    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    certificate_id = db.Column(db.BigInteger, db.ForeignKey("certificates.id"), nullable=False)
-
-    # Qualys asset "id"
-    asset_id = db.Column(db.BigInteger, nullable=False, index=True)
-    uuid = db.Column(db.String(64), nullable=True, index=True)
-    name = db.Column(db.String(512), nullable=True, index=True)
-    netbios_name = db.Column(db.String(256), nullable=True, index=True)
-    operating_system = db.Column(db.String(256), nullable=True)
-
-    primary_ip = db.Column(db.String(64), nullable=True, index=True)
-
-    host_instances_json = db.Column(db.Text, nullable=True)      # list of instances
-    asset_interfaces_json = db.Column(db.Text, nullable=True)    # list of interfaces
-
-    inserted_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-class ApiLog(db.Model):
-    __tablename__ = "api_logs"
-
-    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    endpoint = db.Column(db.String(256), nullable=False)
-    page_number = db.Column(db.Integer, nullable=False)
-    page_size = db.Column(db.Integer, nullable=False)
-    page_range = db.Column(db.String(32), nullable=False)
-    status_code = db.Column(db.Integer, nullable=True)
-
-    request_body_json = db.Column(db.Text, nullable=False)
-    response_count = db.Column(db.Integer, nullable=True)
-    error_message = db.Column(db.Text, nullable=True)
-
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-
-class QualysAuthToken(db.Model):
-    __tablename__ = "qualys_auth_tokens"
-
-    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-
-    token_value = db.Column(db.Text, nullable=False)
-
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    expires_at = db.Column(db.DateTime, nullable=False)
-
-    valid = db.Column(db.Boolean, nullable=False, default=True)
-
-    # optional tracking
-    auth_url = db.Column(db.String(512), nullable=True)
-    status_code = db.Column(db.Integer, nullable=True)
-    error_message = db.Column(db.Text, nullable=True)
\ No newline at end of file
+from datetime import datetime
+from sqlalchemy import UniqueConstraint
+from .extensions import db
+
+# BIGINT identity on MSSQL; SQLite only autoincrements an INTEGER PRIMARY KEY
+BigIntPK = db.BigInteger().with_variant(db.Integer(), "sqlite")
+
+class Certificate(db.Model):
+    __tablename__ = "certificates"
+
+    id = db.Column(db.BigInteger, primary_key=True)  # Qualys "id"
+    certhash = db.Column(db.String(128), index=True)
+    serial_number = db.Column(db.String(128), index=True)
+    dn = db.Column(db.String(1024), index=True)
+    cert_type = db.Column(db.String(64), index=True)  # "Root"
+    signature_algorithm = db.Column(db.String(128))
+    key_size = db.Column(db.Integer)
+    self_signed = db.Column(db.Boolean)
+    extended_validation = db.Column(db.Boolean)
+
+    valid_from_date = db.Column(db.DateTime, nullable=True)
+    valid_to_date = db.Column(db.DateTime, nullable=True)
+
+    created_date = db.Column(db.DateTime, nullable=True)
+    update_date = db.Column(db.DateTime, nullable=True)
+
+    issuer_category = db.Column(db.String(128), nullable=True)
+    instance_count = db.Column(db.Integer, nullable=True)
+    asset_count = db.Column(db.Integer, nullable=True)
+
+    sources_json = db.Column(db.Text, nullable=True)     # store list as JSON string
+    subject_json = db.Column(db.Text, nullable=True)     # store dict as JSON string
+    issuer_json = db.Column(db.Text, nullable=True)      # store dict as JSON string
+
+    # queryable copies of the most used subject / issuer fields (the JSON above stays the full record)
+    subject_cn = db.Column(db.String(512), nullable=True, index=True)
+    subject_o = db.Column(db.String(256), nullable=True, index=True)
+    subject_ou = db.Column(db.String(256), nullable=True, index=True)
+    issuer_cn = db.Column(db.String(512), nullable=True, index=True)
+    issuer_o = db.Column(db.String(256), nullable=True, index=True)
+
+    # REQUIRED extra fields:
+    page_range = db.Column(db.String(32), nullable=False)          # e.g. "0-99"
+    mapped_to_inventory = db.Column(db.Boolean, default=False)     # yes/no
+
+    # sync run that last returned this certificate (full runs use it to find deletions)
+    last_seen_run_id = db.Column(db.BigInteger, nullable=True, index=True)
+    # upsert_service.content_hash of the CertView item last written; equal hash = no rewrite
+    content_hash = db.Column(db.String(64), nullable=True)
+
+    inserted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Asset(db.Model):
+    """One row per Qualys asset, however many certificates it presents (see CertificateAsset)."""
+    __tablename__ = "assets"
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)  # Qualys asset "id"
+    uuid = db.Column(db.String(64), nullable=True, index=True)
+    name = db.Column(db.String(512), nullable=True, index=True)
+    netbios_name = db.Column(db.String(256), nullable=True, index=True)
+    operating_system = db.Column(db.String(256), nullable=True, index=True)
+
+    primary_ip = db.Column(db.String(64), nullable=True, index=True)
+    # 32 hex digits of the IPv6 (or IPv4-mapped) address: sorts like the address, for CIDR/range seeks
+    primary_ip_key = db.Column(db.String(32), nullable=True, index=True)
+
+    asset_interfaces_json = db.Column(db.Text, nullable=True)    # list of interfaces
+
+    # sync run that last wrote this row
+    last_seen_run_id = db.Column(db.BigInteger, nullable=True)
+    # upsert_service.asset_content_hash of the asset item last written (hostInstances excluded)
+    content_hash = db.Column(db.String(64), nullable=True)
+
+    inserted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CertificateAsset(db.Model):
+    """Certificate <-> asset link with the per-certificate instance data."""
+    __tablename__ = "certificate_assets"
+    __table_args__ = (
+        db.Index("ix_certificate_assets_asset", "asset_id", "certificate_id"),
+    )
+
+    certificate_id = db.Column(db.BigInteger, db.ForeignKey("certificates.id"), primary_key=True)
+    asset_id = db.Column(db.BigInteger, primary_key=True)
+    host_instances_json = db.Column(db.Text, nullable=True)      # ports / protocols this certificate was seen on
+
+class CertificateSource(db.Model):
+    """One row per entry of Certificate.sources_json."""
+    __tablename__ = "certificate_sources"
+    __table_args__ = (
+        db.Index("ix_certificate_sources_source", "source", "certificate_id"),
+    )
+
+    certificate_id = db.Column(db.BigInteger, db.ForeignKey("certificates.id"), primary_key=True)
+    source = db.Column(db.String(64), primary_key=True)
+
+class CertificateSan(db.Model):
+    """Subject alternative names, one row per name."""
+    __tablename__ = "certificate_sans"
+
+    id = db.Column(BigIntPK, primary_key=True, autoincrement=True)
+    certificate_id = db.Column(db.BigInteger, db.ForeignKey("certificates.id"), nullable=False, index=True)
+    san_type = db.Column(db.String(32), nullable=True)     # "DNS", "IP", ...
+    value = db.Column(db.String(512), nullable=False, index=True)
+
+class AssetPort(db.Model):
+    """Host instances (port/protocol the certificate was seen on), one row per entry of CertificateAsset.host_instances_json."""
+    __tablename__ = "asset_ports"
+    __table_args__ = (
+        db.Index("ix_asset_ports_asset", "certificate_id", "asset_id"),
+        db.Index("ix_asset_ports_asset_id", "asset_id"),
+    )
+
+    id = db.Column(BigIntPK, primary_key=True, autoincrement=True)
+    certificate_id = db.Column(db.BigInteger, db.ForeignKey("certificates.id"), nullable=False)
+    asset_id = db.Column(db.BigInteger, nullable=False)
+    port = db.Column(db.Integer, nullable=True, index=True)
+    protocol = db.Column(db.String(16), nullable=True)
+
+class AssetAddress(db.Model):
+    """Interface addresses, one row per entry of Asset.asset_interfaces_json; rebuilt when the asset row changes."""
+    __tablename__ = "asset_addresses"
+    __table_args__ = (
+        db.Index("ix_asset_addresses_asset_id", "asset_id"),
+    )
+
+    id = db.Column(BigIntPK, primary_key=True, autoincrement=True)
+    asset_id = db.Column(db.BigInteger, nullable=False)
+    address = db.Column(db.String(64), nullable=True, index=True)
+    address_key = db.Column(db.String(32), nullable=True, index=True)   # see Asset.primary_ip_key
+
+class ApiLog(db.Model):
+    __tablename__ = "api_logs"
+
+    id = db.Column(BigIntPK, primary_key=True, autoincrement=True)
+    endpoint = db.Column(db.String(256), nullable=False)
+    page_number = db.Column(db.Integer, nullable=False)
+    page_size = db.Column(db.Integer, nullable=False)
+    page_range = db.Column(db.String(32), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)
+
+    request_body_json = db.Column(db.Text, nullable=False)
+    response_count = db.Column(db.Integer, nullable=True)
+    response_bytes = db.Column(db.BigInteger, nullable=True)    # decoded body size
+    error_message = db.Column(db.Text, nullable=True)
+
+    # per-page timing (ms): request = until the whole body arrived, parse = JSON decoding,
+    # upsert = certificate/asset statements, commit = the page's COMMIT
+    latency_ms = db.Column(db.Integer, nullable=True)
+    parse_ms = db.Column(db.Integer, nullable=True)
+    upsert_ms = db.Column(db.Integer, nullable=True)
+    commit_ms = db.Column(db.Integer, nullable=True)
+    rows_inserted = db.Column(db.Integer, nullable=True)
+    rows_updated = db.Column(db.Integer, nullable=True)
+    rows_unchanged = db.Column(db.Integer, nullable=True)    # content hash matched, not rewritten
+
+    sync_run_id = db.Column(db.BigInteger, nullable=True, index=True)
+    sync_slice_id = db.Column(db.BigInteger, nullable=True)   # partitioned runs
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SyncRun(db.Model):
+    __tablename__ = "sync_runs"
+
+    id = db.Column(BigIntPK, primary_key=True, autoincrement=True)
+
+    # what is being synced; page_size is the (initial) pageSize, a resume continues from next_offset
+    filter_value = db.Column(db.String(128), nullable=False, index=True)
+    asset_type = db.Column(db.String(64), nullable=False)
+    includes_json = db.Column(db.Text, nullable=True)
+    page_size = db.Column(db.Integer, nullable=False)
+
+    mode = db.Column(db.String(16), nullable=False, default="full")  # full / incremental
+    updated_since = db.Column(db.DateTime, nullable=True)   # incremental: updateDate lower bound sent to CertView
+    max_update_date = db.Column(db.DateTime, nullable=True) # newest updateDate seen so far
+    deleted_count = db.Column(db.Integer, nullable=True)    # full: certificates removed by reconciliation
+
+    status = db.Column(db.String(32), nullable=False, default="running", index=True)  # queued / running / completed / failed / cancelled
+    last_committed_page = db.Column(db.Integer, nullable=True)   # None = nothing committed yet
+    next_offset = db.Column(db.BigInteger, nullable=True)        # first certificate offset not committed yet (pages may vary in size)
+    total_inserted = db.Column(db.Integer, nullable=False, default=0)
+    pages_committed = db.Column(db.Integer, nullable=True, default=0)
+    assets_upserted = db.Column(db.Integer, nullable=True, default=0)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    error_message = db.Column(db.Text, nullable=True)
+
+    # partitioned runs: number of SyncSlice rows (the checkpoints live there); None = one walk over the whole filter
+    slice_count = db.Column(db.Integer, nullable=True)
+    # partitioned runs: certificates returned by more than one slice (sum of slice rows - distinct certificates)
+    overlap_count = db.Column(db.Integer, nullable=True)
+
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)   # heartbeat, bumped every page
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class SyncSlice(db.Model):
+    """
+    One disjoint part of a partitioned sync run: the run's filter plus
+    filters_json, paged on its own with its own checkpoint.
+    """
+    __tablename__ = "sync_slices"
+    __table_args__ = (
+        UniqueConstraint("sync_run_id", "slice_key", name="uq_sync_slice_key"),
+    )
+
+    id = db.Column(BigIntPK, primary_key=True, autoincrement=True)
+    sync_run_id = db.Column(db.BigInteger, db.ForeignKey("sync_runs.id"), nullable=False, index=True)
+    slice_key = db.Column(db.String(128), nullable=False)     # e.g. "validTo 2026-01-01..2026-04-01"
+    filters_json = db.Column(db.Text, nullable=False)         # extra CertView filters ANDed to the run's
+
+    status = db.Column(db.String(32), nullable=False, default="pending")  # pending / running / completed / failed / cancelled
+    last_committed_page = db.Column(db.Integer, nullable=True)
+    next_offset = db.Column(db.BigInteger, nullable=True)
+    total_inserted = db.Column(db.Integer, nullable=False, default=0)
+    pages_committed = db.Column(db.Integer, nullable=True, default=0)
+    assets_upserted = db.Column(db.Integer, nullable=True, default=0)
+    max_update_date = db.Column(db.DateTime, nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class SyncWatermark(db.Model):
+    __tablename__ = "sync_watermarks"
+    __table_args__ = (
+        UniqueConstraint("filter_value", "asset_type", name="uq_watermark_scope"),
+    )
+
+    id = db.Column(BigIntPK, primary_key=True, autoincrement=True)
+    filter_value = db.Column(db.String(128), nullable=False)
+    asset_type = db.Column(db.String(64), nullable=False)
+
+    high_water_mark = db.Column(db.DateTime, nullable=True)     # max certificate updateDate synced (UTC)
+    last_full_sync_at = db.Column(db.DateTime, nullable=True)   # last completed full (reconciling) run
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class QualysAuthToken(db.Model):
+    __tablename__ = "qualys_auth_tokens"
+
+    id = db.Column(BigIntPK, primary_key=True, autoincrement=True)
+
+    token_value = db.Column(db.Text, nullable=False)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    valid = db.Column(db.Boolean, nullable=False, default=True)
+
+    # optional tracking
+    auth_url = db.Column(db.String(512), nullable=True)
+    username = db.Column(db.String(256), nullable=True)  # rows are only reused for the same auth_url + username
+    status_code = db.Column(db.Integer, nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+
+class CertificateRollup(db.Model):
+    """
+    Certificate counts per combination of dashboard dimensions. Kept current by
+    deltas after each sync page / mapping change; rebuilt after full syncs.
+    """
+    __tablename__ = "certificate_rollups"
+
+    id = db.Column(BigIntPK, primary_key=True, autoincrement=True)
+    rollup_key = db.Column(db.String(40), nullable=False, unique=True)   # sha1 of the dimension values
+
+    expiry_date = db.Column(db.Date, nullable=True)          # valid_to_date (UTC day); buckets are computed at read time
+    issuer_category = db.Column(db.String(128), nullable=True)
+    key_size = db.Column(db.Integer, nullable=True)
+    signature_algorithm = db.Column(db.String(128), nullable=True)
+    self_signed = db.Column(db.Boolean, nullable=False)
+    extended_validation = db.Column(db.Boolean, nullable=False)
+    mapped_to_inventory = db.Column(db.Boolean, nullable=False)
+
+    cert_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CsvImportFile(db.Model):
+    """Manifest of CSV files loaded by app.csv_ingest; a completed file (same content) is not loaded again."""
+    __tablename__ = "csv_import_files"
+    __table_args__ = (
+        UniqueConstraint("target_table", "file_sha256", name="uq_csv_import_file"),
+    )
+
+    id = db.Column(BigIntPK, primary_key=True, autoincrement=True)
+    target_table = db.Column(db.String(128), nullable=False)
+    file_sha256 = db.Column(db.String(64), nullable=False)
+    file_name = db.Column(db.String(512), nullable=False)
+    file_size = db.Column(db.BigInteger, nullable=True)
+
+    status = db.Column(db.String(16), nullable=False, default="running")  # running / completed / failed
+    rows_read = db.Column(db.Integer, nullable=True)
+    inserted = db.Column(db.Integer, nullable=True)
+    existing = db.Column(db.Integer, nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class SearchTerm(db.Model):
+    """Distinct searchable values (certificate DNs, asset names) that have trigrams indexed."""
+    __tablename__ = "search_terms"
+    __table_args__ = (
+        UniqueConstraint("kind", "value_hash", name="uq_search_term"),
+    )
+
+    id = db.Column(BigIntPK, primary_key=True, autoincrement=True)
+    kind = db.Column(db.String(16), nullable=False)          # "cert_dn" / "asset_name"
+    value_hash = db.Column(db.String(40), nullable=False)    # sha1 of value (value itself is too wide to index)
+    value = db.Column(db.String(1024), nullable=False)
+
+class SearchTrigram(db.Model):
+    __tablename__ = "search_trigrams"
+
+    kind = db.Column(db.String(16), primary_key=True)
+    gram = db.Column(db.String(3), primary_key=True)    # lower-cased 3-character slice of the value
+    term_id = db.Column(db.BigInteger, primary_key=True)
+
+class SearchIndexState(db.Model):
+    """Whether every stored value of a kind has its trigrams; until then searches fall back to ILIKE."""
+    __tablename__ = "search_index_state"
+
+    kind = db.Column(db.String(16), primary_key=True)   # "cert_dn" / "asset_name"
+    complete = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1,31 +1,164 @@
-from flask import Blueprint, request, jsonify
-from ..extensions import db
-from ..models import Certificate
-
-bp = Blueprint("api", __name__, url_prefix="/api")
-
-@bp.patch("/certificates/<int:cert_id>/mapped")
-def update_certificate_mapped(cert_id: int):
-    """
-    Body JSON:
-      { "mapped_to_inventory": true }  OR  { "mapped_to_inventory": false }
-    """
-    payload = request.get_json(silent=True) or {}
-    if "mapped_to_inventory" not in payload:
-        return jsonify({"error": "mapped_to_inventory is required (true/false)"}), 400
-
-    mapped = payload["mapped_to_inventory"]
-    if not isinstance(mapped, bool):
-        return jsonify({"error": "mapped_to_inventory must be boolean"}), 400
-
-    cert = db.session.get(Certificate, cert_id)
-    if cert is None:
-        return jsonify({"error": "certificate not found"}), 404
-
-    cert.mapped_to_inventory = mapped
-    db.session.commit()
-
-    return jsonify({
-        "id": cert.id,
-        "mapped_to_inventory": cert.mapped_to_inventory
-    }), 200
+from collections import Counter
+from datetime import datetime
+from flask import Blueprint, current_app, request, jsonify
+from ..extensions import db
+from ..models import Asset, Certificate, SyncRun
+from ..services.filters import asset_filters, certificate_filters
+from ..services.inventory_service import set_mapped
+from ..services.job_runner import job_runner
+from ..services.pagination import keyset_paginate
+from ..services.rollup_service import apply_rollup_delta, certificate_dims, dashboard_summary
+from ..services.sync_service import SyncRunConflict, cancel_sync_run, run_to_dict
+
+bp = Blueprint("api", __name__, url_prefix="/api")
+
+def _row_dict(obj) -> dict:
+    row = {}
+    for column in obj.__table__.columns:
+        value = getattr(obj, column.key)
+        row[column.key] = value.isoformat() if isinstance(value, datetime) else value
+    return row
+
+def _page_json(results) -> dict:
+    return {
+        "items": [_row_dict(r) for r in results.items],
+        "total": results.total,
+        "total_is_estimate": results.total_is_estimate,
+        "next_url": results.next_url,
+        "prev_url": results.prev_url,
+    }
+
+@bp.get("/certificates")
+def list_certificates():
+    """Same filters, ?after / ?before cursors and ?per_page as the /certificates view."""
+    per_page = request.args.get("per_page", 50, type=int)
+    results = keyset_paginate(Certificate, certificate_filters(request.args), request.args, per_page=per_page)
+    return jsonify(_page_json(results)), 200
+
+@bp.get("/assets")
+def list_assets():
+    """Same filters, ?after / ?before cursors and ?per_page as the /assets view."""
+    per_page = request.args.get("per_page", 50, type=int)
+    results = keyset_paginate(Asset, asset_filters(request.args), request.args, per_page=per_page)
+    return jsonify(_page_json(results)), 200
+
+@bp.patch("/certificates/<int:cert_id>/mapped")
+def update_certificate_mapped(cert_id: int):
+    """
+    Body JSON:
+      { "mapped_to_inventory": true }  OR  { "mapped_to_inventory": false }
+    """
+    payload = request.get_json(silent=True) or {}
+    if "mapped_to_inventory" not in payload:
+        return jsonify({"error": "mapped_to_inventory is required (true/false)"}), 400
+
+    mapped = payload["mapped_to_inventory"]
+    if not isinstance(mapped, bool):
+        return jsonify({"error": "mapped_to_inventory must be boolean"}), 400
+
+    cert = db.session.get(Certificate, cert_id)
+    if cert is None:
+        return jsonify({"error": "certificate not found"}), 404
+
+    before = certificate_dims(cert)
+    cert.mapped_to_inventory = mapped
+    db.session.commit()
+    apply_rollup_delta(Counter({before: -1, certificate_dims(cert): 1}))
+
+    return jsonify({
+        "id": cert.id,
+        "mapped_to_inventory": cert.mapped_to_inventory
+    }), 200
+
+@bp.post("/certificates/mapped")
+def bulk_update_certificates_mapped():
+    """
+    Body JSON, with either ids or filters (the /certificates list filters, e.g. {"issuer_o": "Acme", "type": "Leaf"}):
+      { "mapped_to_inventory": true, "ids": [1, 2, 3] }
+      { "mapped_to_inventory": false, "filters": { "dn": "*corp.example.com" } }
+    Returns { "mapped_to_inventory", "updated", "batches" }; updated counts rows that actually changed.
+    """
+    payload = request.get_json(silent=True) or {}
+    mapped = payload.get("mapped_to_inventory")
+    if not isinstance(mapped, bool):
+        return jsonify({"error": "mapped_to_inventory is required and must be boolean"}), 400
+
+    ids, filters = payload.get("ids"), payload.get("filters")
+    if (ids is None) == (filters is None):
+        return jsonify({"error": "pass either ids or filters"}), 400
+
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return jsonify({"error": "ids must be a list of integers"}), 400
+        result = set_mapped(mapped, ids=ids)
+    else:
+        if not isinstance(filters, dict):
+            return jsonify({"error": "filters must be an object"}), 400
+        args = {k: str(v).lower() if isinstance(v, bool) else str(v) for k, v in filters.items() if v is not None}
+        criteria = certificate_filters(args)
+        if not criteria:
+            return jsonify({"error": "filters did not match any known filter; refusing to update every certificate"}), 400
+        result = set_mapped(mapped, criteria=criteria, batch_rows=current_app.config["BULK_UPDATE_BATCH_ROWS"])
+
+    return jsonify(result), 200
+
+@bp.get("/dashboard")
+def get_dashboard():
+    cfg = current_app.config
+    return jsonify(dashboard_summary(cfg["DASHBOARD_WEAK_KEY_BITS"], cfg["DASHBOARD_EXPIRY_BUCKETS"])), 200
+
+@bp.get("/sync/runs")
+def list_sync_runs():
+    runs = SyncRun.query.order_by(SyncRun.id.desc()).limit(100).all()
+    return jsonify([run_to_dict(r) for r in runs]), 200
+
+@bp.get("/sync/runs/<int:run_id>")
+def get_sync_run(run_id: int):
+    run = db.session.get(SyncRun, run_id)
+    if run is None:
+        return jsonify({"error": "sync run not found"}), 404
+    return jsonify(run_to_dict(run)), 200
+
+@bp.post("/sync/runs")
+def start_sync_run():
+    """
+    Queues a background sync run; poll status_url (or stream it) for progress.
+    Body JSON (all optional):
+      { "filter_value": "root", "asset_type": "MANAGED", "includes": ["ASSET_INTERFACES"], "mode": "full" | "incremental",
+        "partitioned": false }
+    partitioned=true pages the slices of QUALYS_PARTITION_* in parallel (progress per slice under "slices").
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        run = job_runner.start(
+            filter_value=payload.get("filter_value", "root"),
+            asset_type=payload.get("asset_type", "MANAGED"),
+            includes=payload.get("includes"),
+            mode=payload.get("mode", "full"),
+            partitioned=bool(payload.get("partitioned", False)),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except SyncRunConflict as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({**run_to_dict(run), "status_url": f"/sync/jobs/{run.id}"}), 202
+
+@bp.post("/sync/runs/<int:run_id>/resume")
+def resume_run(run_id: int):
+    try:
+        run = job_runner.resume(run_id)
+    except LookupError:
+        return jsonify({"error": "sync run not found"}), 404
+    except (ValueError, SyncRunConflict) as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({**run_to_dict(run), "status_url": f"/sync/jobs/{run.id}"}), 202
+
+@bp.post("/sync/runs/<int:run_id>/cancel")
+def cancel_run(run_id: int):
+    try:
+        run = cancel_sync_run(run_id)
+    except LookupError:
+        return jsonify({"error": "sync run not found"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify(run_to_dict(run)), 200
@@ -1,57 +1,42 @@
-import csv
-import io
-from flask import Blueprint, request, render_template, Response
-from ..models import Asset
-
-bp = Blueprint("assets", __name__, url_prefix="/assets")
-
-@bp.get("")
-def list_assets():
-    q = Asset.query
-
-    name = request.args.get("name")
-    uuid = request.args.get("uuid")
-    ip = request.args.get("ip")
-    os = request.args.get("os")
-    cert_id = request.args.get("cert_id")
-
-    if name:
-        q = q.filter(Asset.name.ilike(f"%{name}%"))
-    if uuid:
-        q = q.filter(Asset.uuid.ilike(f"%{uuid}%"))
-    if ip:
-        q = q.filter(Asset.primary_ip.ilike(f"%{ip}%"))
-    if os:
-        q = q.filter(Asset.operating_system.ilike(f"%{os}%"))
-    if cert_id:
-        q = q.filter(Asset.certificate_id == cert_id)
-
-    q = q.order_by(Asset.id.desc())
-
-    page = int(request.args.get("page", 1))
-    per_page = int(request.args.get("per_page", 50))
-    results = q.paginate(page=page, per_page=per_page, error_out=False)
-
-    return render_template("assets.html", results=results, args=request.args)
-
-@bp.get("export.csv")
-def export_assets_csv():
-    q = Asset.query.order_by(Asset.id.desc()).limit(200000)
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
-        "id","certificate_id","asset_id","uuid","name","netbios_name","operating_system","primary_ip"
-    ])
-
-    for a in q:
-        writer.writerow([
-            a.id, a.certificate_id, a.asset_id, a.uuid, a.name, a.netbios_name, a.operating_system, a.primary_ip
-        ])
-
-    output.seek(0)
-    return Response(
-        output.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-Disposition": "attachment; filename=assets.csv"},
-    )
+from flask import Blueprint, request, render_template, jsonify
+from ..models import Asset
+from ..services.export_service import csv_response, export_response, iter_rows, select_columns
+from ..services.pagination import keyset_paginate
+from ..services.filters import asset_filters
+
+bp = Blueprint("assets", __name__, url_prefix="/assets")
+
+EXPORT_COLUMNS = {c.key: c for c in Asset.__table__.columns}
+DEFAULT_EXPORT_COLUMNS = [
+    "id", "uuid", "name", "netbios_name", "operating_system", "primary_ip",
+]
+
+@bp.get("")
+def list_assets():
+    per_page = request.args.get("per_page", 50, type=int)
+    results = keyset_paginate(Asset, asset_filters(request.args), request.args, per_page=per_page)
+
+    return render_template("assets.html", results=results, args=request.args)
+
+@bp.get("export.csv")
+def export_assets_csv():
+    columns = select_columns(EXPORT_COLUMNS, None, DEFAULT_EXPORT_COLUMNS)
+    rows = iter_rows(columns, asset_filters(request.args), Asset.id.desc())
+    return csv_response([c.key for c in columns], rows, "assets.csv")
+
+@bp.get("export")
+def export_assets():
+    """
+    ?format=csv|csv.gz|ndjson|parquet&columns=id,name,... plus the list-view filters.
+    """
+    try:
+        columns = select_columns(EXPORT_COLUMNS, request.args.get("columns"), DEFAULT_EXPORT_COLUMNS)
+        return export_response(
+            request.args.get("format", "csv"),
+            columns,
+            asset_filters(request.args),
+            Asset.id.desc(),
+            "assets",
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
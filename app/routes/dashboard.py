@@ -0,0 +1,10 @@
+from flask import Blueprint, current_app, render_template
+from ..services.rollup_service import dashboard_summary
+
+bp = Blueprint("dashboard", __name__, url_prefix="/dashboard")
+
+@bp.get("")
+def dashboard():
+    cfg = current_app.config
+    summary = dashboard_summary(cfg["DASHBOARD_WEAK_KEY_BITS"], cfg["DASHBOARD_EXPIRY_BUCKETS"])
+    return render_template("dashboard.html", summary=summary)
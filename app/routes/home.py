@@ -1,7 +1,7 @@
-from flask import Blueprint, render_template
-
-bp = Blueprint("home", __name__)
-
-@bp.get("/")
-def index():
-    return render_template("index.html")
+from flask import Blueprint, render_template
+
+bp = Blueprint("home", __name__)
+
+@bp.get("/")
+def index():
+    return render_template("index.html")
@@ -0,0 +1,8 @@
+from flask import Blueprint, Response
+from ..services.metrics import render_metrics
+
+bp = Blueprint("metrics", __name__)
+
+@bp.get("/metrics")
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
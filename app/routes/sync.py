@@ -1,20 +1,83 @@
-from flask import Blueprint, render_template, request
-from ..services.sync_service import sync_all_certificates
-from ..models import ApiLog
-
-bp = Blueprint("sync", __name__, url_prefix="/sync")
-
-@bp.get("")
-def sync_page():
-    logs = ApiLog.query.order_by(ApiLog.id.desc()).limit(200).all()
-    return render_template("sync.html", logs=logs)
-
-@bp.post("")
-def run_sync():
-    # Optional overrides from form
-    filter_value = request.form.get("filter_value", "root")
-    asset_type = request.form.get("asset_type", "MANAGED")
-
-    result = sync_all_certificates(filter_value=filter_value, asset_type=asset_type)
-    logs = ApiLog.query.order_by(ApiLog.id.desc()).limit(200).all()
-    return render_template("sync.html", logs=logs, result=result)
+import json
+import time
+from flask import Blueprint, render_template, request, redirect, url_for, abort, jsonify, Response, stream_with_context, current_app
+from ..extensions import db
+from ..services.job_runner import job_runner
+from ..services.sync_service import SyncRunConflict, cancel_sync_run, run_to_dict, ACTIVE_STATUSES
+from ..models import ApiLog, SyncRun
+
+bp = Blueprint("sync", __name__, url_prefix="/sync")
+
+def _render_sync_page(**context):
+    logs = ApiLog.query.order_by(ApiLog.id.desc()).limit(200).all()
+    runs = SyncRun.query.order_by(SyncRun.id.desc()).limit(20).all()
+    return render_template("sync.html", logs=logs, runs=runs, **context)
+
+@bp.get("")
+def sync_page():
+    return _render_sync_page(started=request.args.get("started", type=int))
+
+@bp.post("")
+def run_sync():
+    # Optional overrides from form
+    filter_value = request.form.get("filter_value", "root")
+    asset_type = request.form.get("asset_type", "MANAGED")
+    mode = request.form.get("mode", "full")
+    partitioned = request.form.get("partitioned") == "1"
+
+    try:
+        run = job_runner.start(filter_value=filter_value, asset_type=asset_type, mode=mode, partitioned=partitioned)
+    except (ValueError, SyncRunConflict) as e:
+        return _render_sync_page(error=str(e))
+    return redirect(url_for("sync.sync_page", started=run.id))
+
+@bp.post("/runs/<int:run_id>/resume")
+def resume_run(run_id: int):
+    try:
+        run = job_runner.resume(run_id)
+    except LookupError:
+        abort(404)
+    except (ValueError, SyncRunConflict) as e:
+        return _render_sync_page(error=str(e))
+    return redirect(url_for("sync.sync_page", started=run.id))
+
+@bp.post("/runs/<int:run_id>/cancel")
+def cancel_run(run_id: int):
+    try:
+        cancel_sync_run(run_id)
+    except LookupError:
+        abort(404)
+    except ValueError as e:
+        return _render_sync_page(error=str(e))
+    return redirect(url_for("sync.sync_page"))
+
+@bp.get("/jobs/<int:run_id>")
+def job_status(run_id: int):
+    """
+    JSON progress of a sync job. With ?stream=1 (or Accept: text/event-stream)
+    the progress is pushed as server-sent events until the job finishes.
+    """
+    if db.session.get(SyncRun, run_id) is None:
+        return jsonify({"error": "sync job not found"}), 404
+
+    wants_stream = request.args.get("stream") == "1" or request.accept_mimetypes.best == "text/event-stream"
+    if not wants_stream:
+        return jsonify(run_to_dict(db.session.get(SyncRun, run_id))), 200
+
+    interval = current_app.config.get("SYNC_JOB_STREAM_INTERVAL_SECS", 2)
+
+    def events():
+        while True:
+            run = db.session.get(SyncRun, run_id, populate_existing=True)
+            # end the read transaction so the next poll sees the worker's commits
+            db.session.rollback()
+            yield f"data: {json.dumps(run_to_dict(run))}\n\n"
+            if run.status not in ACTIVE_STATUSES:
+                return
+            time.sleep(interval)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,6 @@
+# MSSQL caps a statement at 2100 parameters; keep IN-lists well below that
+IN_CLAUSE_CHUNK = 1000
+
+def chunked(seq, size: int = IN_CLAUSE_CHUNK):
+    for i in range(0, len(seq), size):
+        yield seq[i : i + size]
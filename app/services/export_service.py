@@ -0,0 +1,186 @@
+import csv
+import io
+import json
+import time
+import zlib
+from datetime import date, datetime
+from flask import Response, current_app, stream_with_context
+from sqlalchemy import select
+
+from ..extensions import db
+from .metrics import EXPORT_REQUESTS, EXPORT_SECONDS
+
+EXPORT_FORMATS = ("csv", "csv.gz", "ndjson", "parquet")
+
+def iter_rows(columns: list, criteria: list, order_by):
+    """
+    Yields plain row tuples for the selected columns only (no ORM objects),
+    fetched from the cursor in EXPORT_BATCH_ROWS batches.
+    """
+    batch_rows = current_app.config.get("EXPORT_BATCH_ROWS", 1000)
+    stmt = select(*columns).where(*criteria).order_by(order_by).execution_options(yield_per=batch_rows)
+    for row in db.session.execute(stmt):
+        yield tuple(row)
+
+def iter_csv(header: list, rows):
+    """Encodes rows as CSV text, one chunk per EXPORT_BATCH_ROWS rows."""
+    batch_rows = current_app.config.get("EXPORT_BATCH_ROWS", 1000)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= batch_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    yield buffer.getvalue()
+
+def _observed(body, export: str, fmt: str):
+    """Counts the export and times it until the last chunk has been handed to the client."""
+    EXPORT_REQUESTS.inc(export=export, format=fmt)
+    started = time.perf_counter()
+    yield from body
+    EXPORT_SECONDS.observe(time.perf_counter() - started, export=export, format=fmt)
+
+def csv_response(header: list, rows, filename: str) -> Response:
+    return Response(
+        stream_with_context(_observed(iter_csv(header, rows), filename.split(".")[0], "csv")),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+def iter_gzip(chunks):
+    """Gzip-compresses a stream of text chunks without buffering the whole body."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def iter_ndjson(names: list, rows):
+    batch_rows = current_app.config.get("EXPORT_BATCH_ROWS", 1000)
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(names, row)), default=_json_default))
+        if len(lines) >= batch_rows:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the response generator."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        self.position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def _arrow_type(pa, column):
+    python_type = column.type.python_type
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is datetime:
+        return pa.timestamp("us")
+    return pa.string()
+
+def iter_parquet(columns: list, rows):
+    """Writes one Parquet row group per EXPORT_BATCH_ROWS rows and yields the bytes as they are produced."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    batch_rows = current_app.config.get("EXPORT_BATCH_ROWS", 1000)
+    schema = pa.schema([(c.key, _arrow_type(pa, c)) for c in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+
+    def write_batch(batch):
+        arrays = [pa.array([row[i] for row in batch], type=field.type) for i, field in enumerate(schema)]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            write_batch(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        write_batch(batch)
+    writer.close()
+    yield sink.drain()
+
+def select_columns(available: dict, requested, default: list) -> list:
+    """
+    Resolves a comma-separated ?columns= value against the exportable columns.
+    Raises ValueError on unknown names.
+    """
+    if not requested:
+        return [available[name] for name in default]
+
+    names = [n.strip() for n in requested.split(",") if n.strip()]
+    unknown = [n for n in names if n not in available]
+    if unknown:
+        raise ValueError(f"unknown columns: {', '.join(unknown)}; available: {', '.join(available)}")
+    return [available[n] for n in names]
+
+def export_response(fmt: str, columns: list, criteria: list, order_by, basename: str) -> Response:
+    """
+    Streams the filtered rows as csv, csv.gz, ndjson or parquet.
+    Raises ValueError for an unknown format or when pyarrow is missing for parquet.
+    """
+    names = [c.key for c in columns]
+    rows = iter_rows(columns, criteria, order_by)
+
+    if fmt == "csv":
+        return csv_response(names, rows, f"{basename}.csv")
+
+    if fmt == "csv.gz":
+        body, mimetype = iter_gzip(iter_csv(names, rows)), "application/gzip"
+    elif fmt == "ndjson":
+        body, mimetype = iter_ndjson(names, rows), "application/x-ndjson"
+    elif fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("parquet export requires the pyarrow package")
+        body, mimetype = iter_parquet(columns, rows), "application/vnd.apache.parquet"
+    else:
+        raise ValueError(f"unknown format: {fmt}; use one of {', '.join(EXPORT_FORMATS)}")
+
+    return Response(
+        stream_with_context(_observed(body, basename, fmt)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={basename}.{fmt}"},
+    )
@@ -1,16 +1,18 @@
-import requests
-
-class QualysClient:
-    def __init__(self, base_url: str, jwt: str, timeout_secs: int = 60):
-        self.base_url = base_url.rstrip("/")
-        self.jwt = jwt
-        self.timeout_secs = timeout_secs
-
-    def list_certificates(self, payload: dict) -> requests.Response:
-        url = f"{self.base_url}/certview/v1/certificates"
-        headers = {
-            "accept": "application/json",
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.jwt}",
-        }
-        return requests.post(url, headers=headers, json=payload, timeout=self.timeout_secs)
+import requests
+from .http_client import QualysHttpClient
+
+class QualysClient(QualysHttpClient):
+    def __init__(self, base_url: str, jwt: str, timeout_secs: int = 60, **http_options):
+        super().__init__(base_url, timeout_secs, **http_options)
+        self.jwt = jwt
+
+    def _auth_headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.jwt}"}
+
+    def list_certificates(self, payload: dict, stream: bool = False) -> requests.Response:
+        url = f"{self.base_url}/certview/v1/certificates"
+        headers = {
+            "accept": "application/json",
+            "Content-Type": "application/json",
+        }
+        return self.post(url, headers=headers, json=payload, stream=stream)
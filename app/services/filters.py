@@ -0,0 +1,94 @@
+from sqlalchemy import exists
+
+from ..models import Certificate, Asset, AssetAddress, AssetPort, CertificateAsset, CertificateSan, CertificateSource
+from .search_service import ip_match, text_match
+
+# Search filters shared by the list views and the exports, built from request args.
+# See search_service for the =exact / prefix* / *contains syntax.
+
+def certificate_filters(args) -> list:
+    certhash = args.get("certhash")
+    serial = args.get("serial")
+    dn = args.get("dn")
+    cert_type = args.get("type")
+    mapped = args.get("mapped")  # "true"/"false"
+    san = args.get("san")
+    source = args.get("source")
+    asset_id = args.get("asset_id")
+
+    criteria = []
+    if certhash:
+        criteria.append(text_match(Certificate.certhash, certhash))
+    if serial:
+        criteria.append(text_match(Certificate.serial_number, serial))
+    if dn:
+        criteria.append(text_match(Certificate.dn, dn, kind="cert_dn"))
+    if cert_type:
+        criteria.append(text_match(Certificate.cert_type, cert_type))
+    if mapped in ("true", "false"):
+        criteria.append(Certificate.mapped_to_inventory.is_(mapped == "true"))
+
+    # normalized subject / issuer fields, e.g. ?issuer_cn==DigiCert Global Root G2
+    for param, column in (
+        ("subject_cn", Certificate.subject_cn),
+        ("subject_o", Certificate.subject_o),
+        ("subject_ou", Certificate.subject_ou),
+        ("issuer_cn", Certificate.issuer_cn),
+        ("issuer_o", Certificate.issuer_o),
+    ):
+        if args.get(param):
+            criteria.append(text_match(column, args[param]))
+    if san:
+        criteria.append(exists().where(
+            CertificateSan.certificate_id == Certificate.id,
+            text_match(CertificateSan.value, san),
+        ))
+    if source:
+        criteria.append(exists().where(
+            CertificateSource.certificate_id == Certificate.id,
+            CertificateSource.source == source.strip(),
+        ))
+    if asset_id:
+        criteria.append(exists().where(
+            CertificateAsset.certificate_id == Certificate.id,
+            CertificateAsset.asset_id == asset_id,
+        ))
+    return criteria
+
+def asset_filters(args) -> list:
+    name = args.get("name")
+    uuid = args.get("uuid")
+    ip = args.get("ip")
+    os = args.get("os")
+    cert_id = args.get("cert_id")
+    port = args.get("port", type=int)
+    protocol = args.get("protocol")
+    iface_ip = args.get("iface_ip")
+
+    criteria = []
+    if name:
+        criteria.append(text_match(Asset.name, name, kind="asset_name"))
+    if uuid:
+        criteria.append(text_match(Asset.uuid, uuid))
+    if ip:
+        criteria.append(ip_match(Asset.primary_ip, Asset.primary_ip_key, ip))
+    if os:
+        criteria.append(text_match(Asset.operating_system, os))
+    if cert_id:
+        criteria.append(exists().where(
+            CertificateAsset.asset_id == Asset.id,
+            CertificateAsset.certificate_id == cert_id,
+        ))
+    if port is not None or protocol:
+        port_criteria = [AssetPort.asset_id == Asset.id]
+        if port is not None:
+            port_criteria.append(AssetPort.port == port)
+        if protocol:
+            port_criteria.append(AssetPort.protocol == protocol.strip().upper())
+        criteria.append(exists().where(*port_criteria))
+    if iface_ip:
+        criteria.append(exists().where(
+            AssetAddress.asset_id == Asset.id,
+            ip_match(AssetAddress.address, AssetAddress.address_key, iface_ip),
+        ))
+    return criteria
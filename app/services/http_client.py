@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Throttling and gateway hiccups are retried in place; anything else is returned to the caller
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_sessions = {}
+_limiters = {}
+_registry_lock = threading.Lock()
+
+def get_session(pool_size: int = 10) -> requests.Session:
+    """
+    Process-wide keep-alive session, so TLS connections to the gateway are
+    reused across pages, syncs and threads.
+    """
+    with _registry_lock:
+        session = _sessions.get(pool_size)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Accept-Encoding"] = "gzip, deflate"
+            _sessions[pool_size] = session
+        return session
+
+class RateLimiter:
+    """Token bucket shared by every client talking to the same tenant."""
+
+    def __init__(self, rate_per_sec: float, burst: int = 1):
+        self.rate_per_sec = rate_per_sec
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_sec)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate_per_sec
+            time.sleep(wait)
+
+def get_rate_limiter(tenant_key: str, rate_per_sec: float, burst: int = 1):
+    if not rate_per_sec or rate_per_sec <= 0:
+        return None
+    with _registry_lock:
+        limiter = _limiters.get(tenant_key)
+        if limiter is None:
+            limiter = RateLimiter(rate_per_sec, burst)
+            _limiters[tenant_key] = limiter
+        return limiter
+
+def _retry_after_secs(resp: requests.Response):
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except Exception:
+        return None
+
+def http_options_from_config(cfg) -> dict:
+    """Keyword arguments for QualysHttpClient taken from app config."""
+    return {
+        "pool_size": cfg.get("QUALYS_HTTP_POOL_SIZE", 10),
+        "max_retries": cfg.get("QUALYS_HTTP_MAX_RETRIES", 5),
+        "backoff_secs": cfg.get("QUALYS_HTTP_BACKOFF_SECS", 1.0),
+        "max_backoff_secs": cfg.get("QUALYS_HTTP_MAX_BACKOFF_SECS", 60.0),
+        "rate_limit_per_sec": cfg.get("QUALYS_RATE_LIMIT_PER_SEC", 0),
+        "rate_limit_burst": cfg.get("QUALYS_RATE_LIMIT_BURST", 1),
+    }
+
+class QualysHttpClient:
+    """
+    Base for the Qualys API clients: pooled session, per-tenant rate limit and
+    retries with jittered exponential backoff that honor Retry-After.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout_secs: int = 60,
+        *,
+        pool_size: int = 10,
+        max_retries: int = 5,
+        backoff_secs: float = 1.0,
+        max_backoff_secs: float = 60.0,
+        rate_limit_per_sec: float = 0,
+        rate_limit_burst: int = 1,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout_secs = timeout_secs
+        self.max_retries = max_retries
+        self.backoff_secs = backoff_secs
+        self.max_backoff_secs = max_backoff_secs
+        self.session = get_session(pool_size)
+        self.rate_limiter = get_rate_limiter(self.base_url, rate_limit_per_sec, rate_limit_burst)
+
+    def _auth_headers(self) -> dict:
+        return {}
+
+    def _backoff(self, attempt: int, resp=None) -> float:
+        retry_after = _retry_after_secs(resp) if resp is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff_secs)
+        # "full jitter": spreads out workers that failed at the same moment
+        return random.uniform(0, min(self.max_backoff_secs, self.backoff_secs * (2 ** attempt)))
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout_secs)
+        extra_headers = kwargs.pop("headers", None) or {}
+
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            # rebuilt per attempt so a retry picks up a refreshed token
+            headers = {**extra_headers, **self._auth_headers()}
+            try:
+                resp = self.session.post(url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            if resp.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                return resp
+
+            delay = self._backoff(attempt, resp)
+            resp.close()
+            time.sleep(delay)
+            attempt += 1
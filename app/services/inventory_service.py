@@ -0,0 +1,77 @@
+from collections import Counter
+from sqlalchemy import or_, select, update
+
+from ..extensions import db
+from ..models import Certificate
+from .db_utils import chunked
+from .rollup_service import apply_rollup_delta, rollup_counts
+
+def _needs_change(mapped: bool):
+    column = Certificate.mapped_to_inventory
+    return or_(column.is_(None), column != mapped)
+
+def _update_batch(where: list, mapped: bool) -> int:
+    """
+    One UPDATE for the certificates matching `where` whose flag differs, in its
+    own transaction. The rollup delta is taken with a GROUP BY over the same rows
+    just before. Returns the rows updated.
+    """
+    before = rollup_counts(db.session, where)
+    result = db.session.execute(
+        update(Certificate)
+        .where(*where)
+        .values(mapped_to_inventory=mapped)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    delta = Counter()
+    for dims, n in before.items():
+        delta[dims] -= n
+        delta[dims[:-1] + (mapped,)] += n
+    apply_rollup_delta(delta)
+    return result.rowcount
+
+def set_mapped(mapped: bool, ids=None, criteria=None, batch_rows: int = 5000) -> dict:
+    """
+    Sets mapped_to_inventory on the certificates with `ids`, or on every
+    certificate matching `criteria` (certificate_filters() output). Rows that
+    already have the value are not touched.
+
+    ids go out in IN-list batches; criteria are applied in id-range batches of
+    about `batch_rows`, each committed on its own, so a large reconciliation
+    never holds one long transaction. Returns {"mapped_to_inventory", "updated", "batches"}.
+    """
+    if (ids is None) == (criteria is None):
+        raise ValueError("pass either ids or criteria")
+
+    updated = batches = 0
+    changed = _needs_change(mapped)
+
+    if ids is not None:
+        for chunk in chunked(sorted(set(ids))):
+            updated += _update_batch([Certificate.id.in_(chunk), changed], mapped)
+            batches += 1
+        return {"mapped_to_inventory": mapped, "updated": updated, "batches": batches}
+
+    last_id = None
+    while True:
+        window = [*criteria, changed]
+        if last_id is not None:
+            window.append(Certificate.id > last_id)
+
+        # id of the batch_rows-th matching certificate; None = the rest fits in one batch
+        upper = db.session.scalar(
+            select(Certificate.id).where(*window).order_by(Certificate.id).offset(batch_rows - 1).limit(1)
+        )
+        if upper is not None:
+            window.append(Certificate.id <= upper)
+
+        n = _update_batch(window, mapped)
+        updated += n
+        batches += 1
+        if upper is None:
+            break
+        last_id = upper
+
+    return {"mapped_to_inventory": mapped, "updated": updated, "batches": batches}
@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+
+from ..extensions import db
+from ..models import SyncRun
+from .sync_service import create_sync_run, execute_sync_run, fail_stale_runs, reopen_sync_run
+
+class SyncJobRunner:
+    """
+    Runs sync runs on an in-process thread pool so HTTP requests only enqueue
+    work. The sync_runs table is the job record: a job id is a SyncRun id and
+    progress is read back from it.
+    """
+
+    def __init__(self):
+        self.executor = None
+        # serializes the duplicate check + insert within this process
+        self.submit_lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config.get("SYNC_JOB_WORKERS", 3),
+            thread_name_prefix="sync-job",
+        )
+        app.extensions["sync_jobs"] = self
+
+        with app.app_context():
+            fail_stale_runs()
+
+    def start(self, filter_value="root", asset_type="MANAGED", includes=None, mode="full", partitioned=False) -> SyncRun:
+        with self.submit_lock:
+            run = create_sync_run(
+                filter_value=filter_value,
+                asset_type=asset_type,
+                includes=includes,
+                mode=mode,
+                status="queued",
+                partitioned=partitioned,
+            )
+        self._submit(run.id)
+        return run
+
+    def resume(self, run_id: int) -> SyncRun:
+        with self.submit_lock:
+            run = reopen_sync_run(run_id, status="queued")
+        self._submit(run.id)
+        return run
+
+    def _submit(self, run_id: int) -> None:
+        app = current_app._get_current_object()
+        self.executor.submit(self._run, app, run_id)
+
+    @staticmethod
+    def _run(app, run_id: int) -> None:
+        with app.app_context():
+            run = db.session.get(SyncRun, run_id)
+            # cancelled (or failed as stale) while waiting for a worker
+            if run is None or run.status != "queued":
+                return
+
+            run.status = "running"
+            run.updated_at = datetime.utcnow()
+            db.session.commit()
+
+            try:
+                execute_sync_run(run_id)
+            except Exception as e:
+                db.session.rollback()
+                run = db.session.get(SyncRun, run_id)
+                run.status = "failed"
+                run.error_message = str(e)
+                run.finished_at = run.updated_at = datetime.utcnow()
+                db.session.commit()
+                current_app.logger.exception("sync run %s crashed", run_id)
+
+job_runner = SyncJobRunner()
@@ -0,0 +1,116 @@
+"""
+In-process counters and histograms rendered in the Prometheus text format at /metrics.
+
+Values live in the process that served the work: with several worker
+processes each one reports its own totals (scrape them per process, or run a
+single worker for the sync).
+"""
+import bisect
+import threading
+
+REGISTRY = []
+
+# seconds; CertView pages and token requests range from sub-second to minutes
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RUN_BUCKETS = (10, 30, 60, 300, 600, 1800, 3600, 7200, 14400, 28800)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _label_text(self, key: tuple, extra=()) -> str:
+        pairs = [*zip(self.labelnames, key), *extra]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        super().__init__(f"{name}_total", documentation, labelnames)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self, key, value) -> list:
+        return [f"{self.name}{self._label_text(key)} {_number(value)}"]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self, key, value) -> list:
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, n in zip((*self.buckets, "+Inf"), counts):
+            cumulative += n
+            le = bound if bound == "+Inf" else _number(bound)
+            lines.append(f"{self.name}_bucket{self._label_text(key, [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(key)} {_number(total)}")
+        lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+SYNC_RUNS = Counter("certview_sync_runs", "Sync run executions that finished, by mode and final status.", ("mode", "status"))
+SYNC_RUN_SECONDS = Histogram(
+    "certview_sync_run_duration_seconds", "Wall time of one sync run execution.", ("mode",), buckets=RUN_BUCKETS
+)
+SYNC_PAGES = Counter("certview_sync_pages", "CertView page requests, by HTTP status (none = no response).", ("status",))
+SYNC_PAGE_PHASE_SECONDS = Histogram(
+    "certview_sync_page_phase_seconds", "Time per sync page spent in each phase.", ("phase",)
+)
+SYNC_RESPONSE_BYTES = Counter("certview_sync_response_bytes", "CertView page bytes received.")
+SYNC_ROWS = Counter("certview_sync_rows", "Certificates received by the sync, by result (inserted / updated / unchanged).", ("result",))
+
+TOKEN_REFRESHES = Counter("qualys_token_refreshes", "Qualys auth token requests, by result.", ("result",))
+TOKEN_REFRESH_SECONDS = Histogram("qualys_token_refresh_seconds", "Time to obtain a new Qualys auth token.")
+
+EXPORT_REQUESTS = Counter("export_requests", "Export downloads started, by export and format.", ("export", "format"))
+EXPORT_SECONDS = Histogram(
+    "export_duration_seconds", "Time to stream an export to the client.", ("export", "format")
+)
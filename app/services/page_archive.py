@@ -0,0 +1,168 @@
+"""
+Raw CertView page archive on local disk, written by the sync when
+QUALYS_PAGE_ARCHIVE_DIR is set and read back by `flask archive-replay`.
+
+    <dir>/run-<id>/manifest.json             filter, asset type, includes, mode of the run
+    <dir>/run-<id>/index.ndjson              one line per archived page
+    <dir>/run-<id>/segment-00001.ndjson.gz   one line per page: {"offset", "size", "page_range", "items": <body>}
+
+"items" is the response body exactly as received (only its line breaks, which
+JSON allows between tokens only, become spaces). Every page is its own gzip
+member, so the index can point at the member's byte position and a reader
+decompresses one page without the rest of the segment. The index line is
+written after the page, so a crash leaves at most an unindexed tail.
+"""
+import gzip
+import json
+import os
+import threading
+from datetime import datetime
+
+MANIFEST = "manifest.json"
+INDEX = "index.ndjson"
+COPY_BLOCK = 64 * 1024
+
+# the slices of a partitioned run archive into the same directory from several threads
+_dir_locks = {}
+_dir_locks_guard = threading.Lock()
+
+def _dir_lock(path: str) -> threading.Lock:
+    with _dir_locks_guard:
+        return _dir_locks.setdefault(path, threading.Lock())
+
+def _run_dir(root: str, run_id: int) -> str:
+    return os.path.join(root, f"run-{run_id}")
+
+def _segment_name(number: int) -> str:
+    return f"segment-{number:05d}.ndjson.gz"
+
+class PageArchive:
+    """Appends the pages of one sync run; a resumed run keeps appending to the same directory."""
+
+    def __init__(self, root: str, run_id: int, segment_bytes: int, compresslevel: int = 6):
+        self.path = _run_dir(root, run_id)
+        self.segment_bytes = segment_bytes
+        self.compresslevel = compresslevel
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = _dir_lock(self.path)
+        segments = sorted(n for n in os.listdir(self.path) if n.startswith("segment-"))
+        self._segment = int(segments[-1][len("segment-"):].split(".")[0]) if segments else 1
+
+    def write_manifest(self, manifest: dict) -> None:
+        path = os.path.join(self.path, MANIFEST)
+        with self._lock:
+            if not os.path.exists(path):
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(manifest, f, indent=2, default=str)
+
+    def _segment_path(self) -> str:
+        path = os.path.join(self.path, _segment_name(self._segment))
+        if os.path.exists(path) and os.path.getsize(path) >= self.segment_bytes:
+            self._segment += 1
+            path = os.path.join(self.path, _segment_name(self._segment))
+        return path
+
+    def add_page(self, offset: int, size: int, page_range: str, payload: dict, body, slice_key=None) -> dict:
+        """
+        Archives one page; `body` is the raw response as bytes or a binary file
+        positioned at its start. slice_key names the slice of a partitioned run.
+        """
+        with self._lock:
+            return self._add_page(offset, size, page_range, payload, body, slice_key)
+
+    def _add_page(self, offset, size, page_range, payload, body, slice_key) -> dict:
+        path = self._segment_path()
+        header = json.dumps({"offset": offset, "size": size, "page_range": page_range, "slice": slice_key})
+        body_bytes = 0
+        with open(path, "ab") as raw:
+            position = raw.tell()
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=self.compresslevel) as gz:
+                gz.write(header[:-1].encode("utf-8") + b', "items": ')
+                blocks = [body] if isinstance(body, bytes) else iter(lambda: body.read(COPY_BLOCK), b"")
+                for block in blocks:
+                    gz.write(block.replace(b"\r", b" ").replace(b"\n", b" "))
+                    body_bytes += len(block)
+                if not body_bytes:
+                    gz.write(b"null")
+                gz.write(b"}\n")
+            length = raw.tell() - position
+
+        entry = {
+            "offset": offset,
+            "size": size,
+            "page_range": page_range,
+            "slice": slice_key,
+            "segment": os.path.basename(path),
+            "position": position,
+            "length": length,
+            "bytes": body_bytes,
+            "payload": payload,
+            "archived_at": datetime.utcnow().isoformat(timespec="seconds"),
+        }
+        with open(os.path.join(self.path, INDEX), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        return entry
+
+def open_page_archive(cfg, run):
+    """The archive for `run`, or None when QUALYS_PAGE_ARCHIVE_DIR is not set."""
+    root = cfg.get("QUALYS_PAGE_ARCHIVE_DIR")
+    if not root:
+        return None
+    archive = PageArchive(root, run.id, cfg.get("QUALYS_ARCHIVE_SEGMENT_MB", 256) * 1024 * 1024)
+    archive.write_manifest({
+        "run_id": run.id,
+        "filter_value": run.filter_value,
+        "asset_type": run.asset_type,
+        "includes": json.loads(run.includes_json) if run.includes_json else None,
+        "mode": run.mode,
+        "updated_since": run.updated_since,
+        "page_size": run.page_size,
+        "started_at": run.started_at,
+    })
+    return archive
+
+def archived_run_ids(root: str) -> list:
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        int(name[len("run-"):])
+        for name in os.listdir(root)
+        if name.startswith("run-") and name[len("run-"):].isdigit()
+        and os.path.exists(os.path.join(root, name, INDEX))
+    )
+
+def read_manifest(root: str, run_id: int) -> dict:
+    path = os.path.join(_run_dir(root, run_id), MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def read_index(root: str, run_id: int) -> list:
+    """
+    Index entries of a run in (slice, offset) order. A page fetched more than
+    once (a resumed run, a retry) keeps its last entry; a truncated last line
+    is ignored.
+    """
+    path = os.path.join(_run_dir(root, run_id), INDEX)
+    if not os.path.exists(path):
+        raise LookupError(f"no archived pages for sync run {run_id} under {root}")
+
+    entries = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[(entry.get("slice") or "", entry["offset"], entry["size"])] = entry
+    return [entries[key] for key in sorted(entries)]
+
+def read_page(root: str, run_id: int, entry: dict) -> list:
+    """Certificates of one archived page (read_index entry)."""
+    with open(os.path.join(_run_dir(root, run_id), entry["segment"]), "rb") as raw:
+        raw.seek(entry["position"])
+        with gzip.GzipFile(fileobj=raw, mode="rb") as gz:
+            page = json.loads(gz.readline())
+    items = page.get("items")
+    return items if isinstance(items, list) else []
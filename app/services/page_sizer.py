@@ -0,0 +1,74 @@
+import math
+
+class AdaptivePageSizer:
+    """
+    Chooses the CertView pageSize for the next request from what recent pages cost.
+
+    Seconds and bytes per certificate are tracked as moving averages; the next
+    size is the largest step of the min_size * 2**k ladder that should come back
+    within target_secs and max_bytes. It grows to at most twice the last page
+    and shrinks as far as needed. A failed page halves the size and caps it for the
+    next few pages.
+
+    CertView pages by pageNumber, so a request covers items
+    [pageNumber * pageSize, (pageNumber + 1) * pageSize). size_for() only returns
+    sizes that divide the offset, which keeps every window contiguous with the
+    previous one: nothing is skipped or fetched twice when the size changes.
+    """
+
+    SMOOTHING = 0.3
+    # successful pages before the cap set by a failure is lifted
+    FAILURE_COOLDOWN_PAGES = 10
+
+    def __init__(self, initial: int, min_size: int, max_size: int, target_secs: float, max_bytes: int = 0):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.target_secs = target_secs
+        self.max_bytes = max_bytes
+
+        self.ladder = [self.min_size]
+        while self.ladder[-1] * 2 <= self.max_size:
+            self.ladder.append(self.ladder[-1] * 2)
+        self.size = self._step_at_most(initial)
+
+        self.secs_per_item = None
+        self.bytes_per_item = None
+        self.ceiling = None
+        self.pages_since_failure = 0
+
+    def _step_at_most(self, size: float) -> int:
+        return max((s for s in self.ladder if s <= size), default=self.min_size)
+
+    def size_for(self, offset: int) -> int:
+        """Page size for a request starting at `offset` (always divides it)."""
+        return math.gcd(offset, self.size) if offset else self.size
+
+    def record(self, size: int, items: int, latency_secs: float, nbytes: int, failed: bool = False) -> None:
+        if failed:
+            self.ceiling = self._step_at_most(max(self.min_size, size // 2))
+            self.size = min(self.size, self.ceiling)
+            self.pages_since_failure = 0
+            return
+
+        if items:
+            self.secs_per_item = self._smooth(self.secs_per_item, latency_secs / items)
+            self.bytes_per_item = self._smooth(self.bytes_per_item, nbytes / items)
+
+        self.pages_since_failure += 1
+        if self.ceiling is not None and self.pages_since_failure >= self.FAILURE_COOLDOWN_PAGES:
+            self.ceiling = None
+
+        if self.secs_per_item is None:
+            return
+
+        ideal = self.target_secs / self.secs_per_item if self.secs_per_item else self.max_size
+        if self.max_bytes and self.bytes_per_item:
+            ideal = min(ideal, self.max_bytes / self.bytes_per_item)
+        if self.ceiling is not None:
+            ideal = min(ideal, self.ceiling)
+
+        # grow at most one step beyond what was actually measured
+        self.size = min(self._step_at_most(ideal), size * 2)
+
+    def _smooth(self, current, sample: float) -> float:
+        return sample if current is None else current + self.SMOOTHING * (sample - current)
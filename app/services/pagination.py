@@ -0,0 +1,103 @@
+import threading
+import time
+from flask import current_app, request, url_for
+from sqlalchemy import func, select, text
+
+from ..extensions import db
+
+# (cache key) -> (count, computed_at monotonic)
+_count_cache = {}
+_count_lock = threading.Lock()
+
+class KeysetPage:
+    """One page of a keyset (seek) walk over a descending id."""
+
+    def __init__(self, items, has_next, has_prev, total, total_is_estimate, per_page):
+        self.items = items
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+        self.per_page = per_page
+        self.next_cursor = items[-1].id if items and has_next else None
+        self.prev_cursor = items[0].id if items and has_prev else None
+
+    def _url(self, **cursor):
+        args = {k: v for k, v in request.args.items() if k not in ("after", "before", "page")}
+        return url_for(request.endpoint, **args, **cursor)
+
+    @property
+    def next_url(self):
+        return self._url(after=self.next_cursor) if self.next_cursor is not None else None
+
+    @property
+    def prev_url(self):
+        return self._url(before=self.prev_cursor) if self.prev_cursor is not None else None
+
+def _estimated_table_rows(table_name: str):
+    """Row count from catalog metadata (no scan); None where the backend has no cheap estimate."""
+    if db.engine.dialect.name != "mssql":
+        return None
+    return db.session.execute(
+        text(
+            "SELECT SUM(p.rows) FROM sys.partitions p "
+            "WHERE p.object_id = OBJECT_ID(:t) AND p.index_id IN (0, 1)"
+        ),
+        {"t": table_name},
+    ).scalar()
+
+def _cached_count(cache_key, count_fn):
+    ttl = current_app.config.get("LIST_COUNT_CACHE_SECS", 300)
+    now = time.monotonic()
+    with _count_lock:
+        cached = _count_cache.get(cache_key)
+        if cached and now - cached[1] < ttl:
+            return cached[0]
+
+    total = count_fn()
+    with _count_lock:
+        _count_cache[cache_key] = (total, now)
+    return total
+
+def keyset_paginate(model, criteria: list, args, per_page: int = 50) -> KeysetPage:
+    """
+    Newest-first pages keyed on model.id: ?after=<id> walks forward, ?before=<id> back.
+    Every page is an index seek on the primary key, so page 5,000 costs the same as page 1.
+
+    ?count=exact runs a COUNT(*) over the filtered set. Otherwise the total is a
+    catalog estimate (unfiltered, MSSQL) or a count cached for LIST_COUNT_CACHE_SECS.
+    """
+    per_page = max(1, min(per_page, 1000))
+    after = args.get("after", type=int)
+    before = args.get("before", type=int)
+
+    q = model.query.filter(*criteria)
+    if before is not None:
+        rows = q.filter(model.id > before).order_by(model.id.asc()).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        if after is not None:
+            q = q.filter(model.id < after)
+        rows = q.order_by(model.id.desc()).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_prev = after is not None
+
+    def exact_count():
+        return db.session.scalar(select(func.count()).select_from(model).where(*criteria))
+
+    total_is_estimate = False
+    if args.get("count") == "exact":
+        total = exact_count()
+    else:
+        total_is_estimate = True
+        total = _estimated_table_rows(model.__tablename__) if not criteria else None
+        if total is None:
+            cache_key = (model.__tablename__, tuple(sorted(
+                (k, v) for k, v in args.items() if k not in ("after", "before", "page", "per_page", "count")
+            )))
+            total = _cached_count(cache_key, exact_count)
+
+    return KeysetPage(items, has_next, has_prev, total, total_is_estimate, per_page)
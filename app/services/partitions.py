@@ -0,0 +1,74 @@
+"""
+Slices of a partitioned sync run: extra CertView filters, ANDed to the run's
+filter, that split it into disjoint parts which can be paged independently.
+"""
+import json
+from datetime import date, datetime, timedelta
+
+def _add_months(d: date, months: int) -> date:
+    month = d.month - 1 + months
+    return date(d.year + month // 12, month % 12 + 1, 1)
+
+def _filter(cfg, operator_key: str, default_operator: str, value: datetime) -> dict:
+    return {
+        "field": cfg.get("QUALYS_PARTITION_FIELD", "certificate.validToDate"),
+        "value": value.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "operator": cfg.get(operator_key, default_operator),
+    }
+
+def date_window_slices(cfg, today=None) -> list:
+    """
+    Windows of QUALYS_PARTITION_MONTHS months over QUALYS_PARTITION_FIELD, from
+    QUALYS_PARTITION_YEARS_BACK years ago to QUALYS_PARTITION_YEARS_AHEAD years
+    ahead, plus an open-ended slice on each side, so every certificate falls in
+    one. A window [start, end) goes out as "GREATER start - 1s AND LESSER end":
+    whole-second dates match exactly one window, a date within the last second
+    before a boundary may match two (counted as overlap, written twice, harmless).
+    """
+    today = today or date.today()
+    months = max(int(cfg.get("QUALYS_PARTITION_MONTHS", 3)), 1)
+    first = _add_months(date(today.year, today.month, 1), -12 * int(cfg.get("QUALYS_PARTITION_YEARS_BACK", 1)))
+    last = _add_months(date(today.year, today.month, 1), 12 * int(cfg.get("QUALYS_PARTITION_YEARS_AHEAD", 3)))
+
+    bounds = []
+    d = first
+    while d <= last:
+        bounds.append(datetime(d.year, d.month, d.day))
+        d = _add_months(d, months)
+
+    label = cfg.get("QUALYS_PARTITION_FIELD", "certificate.validToDate").rsplit(".", 1)[-1]
+
+    def lower(bound):
+        return _filter(cfg, "QUALYS_PARTITION_LOWER_OPERATOR", "GREATER", bound - timedelta(seconds=1))
+
+    def upper(bound):
+        return _filter(cfg, "QUALYS_PARTITION_UPPER_OPERATOR", "LESSER", bound)
+
+    slices = [{"key": f"{label} <{bounds[0]:%Y-%m-%d}", "filters": [upper(bounds[0])]}]
+    for start, end in zip(bounds, bounds[1:]):
+        slices.append({"key": f"{label} {start:%Y-%m-%d}..{end:%Y-%m-%d}", "filters": [lower(start), upper(end)]})
+    slices.append({"key": f"{label} >={bounds[-1]:%Y-%m-%d}", "filters": [lower(bounds[-1])]})
+    return slices
+
+def partition_slices(cfg, today=None) -> list:
+    """
+    [{"key", "filters"}, ...] for a new partitioned run: QUALYS_PARTITION_SLICES
+    (the same shape as JSON, e.g. one slice per key size or issuer category) when
+    set, otherwise date_window_slices(). Custom slices must not leave gaps: a
+    full run deletes certificates that no slice returned.
+    """
+    custom = cfg.get("QUALYS_PARTITION_SLICES")
+    if not custom:
+        return date_window_slices(cfg, today)
+
+    slices = json.loads(custom) if isinstance(custom, str) else custom
+    if not isinstance(slices, list) or not slices:
+        raise ValueError("QUALYS_PARTITION_SLICES must be a non-empty JSON list")
+    keys = set()
+    for s in slices:
+        if not isinstance(s, dict) or not isinstance(s.get("key"), str) or not isinstance(s.get("filters"), list):
+            raise ValueError('every QUALYS_PARTITION_SLICES entry needs "key" (string) and "filters" (list)')
+        if s["key"] in keys:
+            raise ValueError(f"duplicate partition slice key: {s['key']}")
+        keys.add(s["key"])
+    return slices
@@ -1,18 +1,19 @@
-import requests
-from .token_service import get_valid_token
-
-class QualysClient:
-    def __init__(self, base_url: str, timeout_secs: int = 60):
-        self.base_url = base_url.rstrip("/")
-        self.timeout_secs = timeout_secs
-
-    def list_certificates(self, payload: dict) -> requests.Response:
-        url = f"{self.base_url}/certview/v1/certificates"
-        token = get_valid_token()
-
-        headers = {
-            "accept": "application/json",
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {token}",
-        }
-        return requests.post(url, headers=headers, json=payload, timeout=self.timeout_secs)
+import requests
+from .http_client import QualysHttpClient
+from .token_service import get_valid_token
+
+class QualysClient(QualysHttpClient):
+    def __init__(self, base_url: str, timeout_secs: int = 60, **http_options):
+        super().__init__(base_url, timeout_secs, **http_options)
+
+    def _auth_headers(self) -> dict:
+        token = get_valid_token()
+        return {"Authorization": f"Bearer {token}"}
+
+    def list_certificates(self, payload: dict, stream: bool = False) -> requests.Response:
+        url = f"{self.base_url}/certview/v1/certificates"
+        headers = {
+            "accept": "application/json",
+            "Content-Type": "application/json",
+        }
+        return self.post(url, headers=headers, json=payload, stream=stream)
@@ -0,0 +1,207 @@
+import hashlib
+from collections import Counter
+from datetime import date, datetime, timezone
+from sqlalchemy import Date, bindparam, cast, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+from ..models import Certificate, CertificateRollup
+from .db_utils import chunked
+
+# certificate columns the rollups are keyed on, in rollup_dims() order
+ROLLUP_COLUMNS = (
+    "valid_to_date", "issuer_category", "key_size", "signature_algorithm",
+    "self_signed", "extended_validation", "mapped_to_inventory",
+)
+DIMENSIONS = (
+    "expiry_date", "issuer_category", "key_size", "signature_algorithm",
+    "self_signed", "extended_validation", "mapped_to_inventory",
+)
+
+WEAK_SIGNATURE_MARKERS = ("MD2", "MD5", "SHA1")
+
+def _expiry_day(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.date()
+    return value
+
+def rollup_dims(row) -> tuple:
+    """Dimension tuple for a mapping with the ROLLUP_COLUMNS keys (a certificate row)."""
+    return (
+        _expiry_day(row.get("valid_to_date")),
+        row.get("issuer_category"),
+        row.get("key_size"),
+        row.get("signature_algorithm"),
+        bool(row.get("self_signed")),
+        bool(row.get("extended_validation")),
+        bool(row.get("mapped_to_inventory")),
+    )
+
+def certificate_dims(cert: Certificate) -> tuple:
+    return rollup_dims({c: getattr(cert, c) for c in ROLLUP_COLUMNS})
+
+def _rollup_key(dims: tuple) -> str:
+    return hashlib.sha1("|".join(str(v) for v in dims).encode("utf-8")).hexdigest()
+
+def apply_rollup_delta(delta) -> None:
+    """
+    Adds {dims: +/-n} to the rollup counts in its own short transaction, so
+    syncs of different scopes racing on a new dimension combination only retry
+    this step. Missed deltas are corrected by rebuild_rollups().
+    """
+    changes = {_rollup_key(dims): (dims, n) for dims, n in delta.items() if n}
+    if not changes:
+        return
+
+    for attempt in range(2):
+        try:
+            with Session(db.engine) as session:
+                _apply_changes(session, changes)
+                session.commit()
+                return
+        except IntegrityError:
+            # another writer created one of the same rows first; the re-check updates it instead
+            if attempt:
+                raise
+
+def _apply_changes(session: Session, changes: dict) -> None:
+    existing = set()
+    for chunk in chunked(list(changes)):
+        existing.update(session.scalars(
+            select(CertificateRollup.rollup_key).where(CertificateRollup.rollup_key.in_(chunk))
+        ))
+
+    now = datetime.utcnow()
+    table = CertificateRollup.__table__
+    bumps = [{"k": key, "n": n, "now": now} for key, (_, n) in changes.items() if key in existing]
+    if bumps:
+        session.connection().execute(
+            update(table)
+            .where(table.c.rollup_key == bindparam("k"))
+            .values(cert_count=table.c.cert_count + bindparam("n"), updated_at=bindparam("now")),
+            bumps,
+        )
+
+    new_rows = [
+        {"rollup_key": key, **dict(zip(DIMENSIONS, dims)), "cert_count": n, "updated_at": now}
+        for key, (dims, n) in changes.items() if key not in existing
+    ]
+    if new_rows:
+        session.execute(insert(CertificateRollup), new_rows)
+
+def rollup_counts(session, criteria=()) -> Counter:
+    """{dims: certificate count} for the certificates matching `criteria`, with one GROUP BY."""
+    day = Certificate.valid_to_date
+    expiry = func.date(day) if db.engine.dialect.name == "sqlite" else cast(day, Date)
+    columns = [
+        expiry, Certificate.issuer_category, Certificate.key_size, Certificate.signature_algorithm,
+        Certificate.self_signed, Certificate.extended_validation, Certificate.mapped_to_inventory,
+    ]
+
+    counts = Counter()
+    for row in session.execute(select(*columns, func.count()).where(*criteria).group_by(*columns)):
+        values = dict(zip(ROLLUP_COLUMNS, row[:-1]))
+        counts[rollup_dims(values)] += row[-1]
+    return counts
+
+def rebuild_rollups() -> int:
+    """Recomputes every rollup row with one GROUP BY over certificates. Returns the row count."""
+    with Session(db.engine) as session:
+        counts = rollup_counts(session)
+
+        now = datetime.utcnow()
+        session.execute(delete(CertificateRollup))
+        rows = [
+            {"rollup_key": _rollup_key(dims), **dict(zip(DIMENSIONS, dims)), "cert_count": n, "updated_at": now}
+            for dims, n in counts.items()
+        ]
+        if rows:
+            session.execute(insert(CertificateRollup), rows)
+        session.commit()
+    return len(rows)
+
+def _is_weak_key(key_size, signature_algorithm, min_bits: int) -> bool:
+    # ECDSA keys are much shorter for the same strength
+    return key_size is not None and key_size < min_bits and "ECDSA" not in (signature_algorithm or "").upper()
+
+def _is_weak_signature(signature_algorithm) -> bool:
+    alg = (signature_algorithm or "").upper().replace("-", "")
+    return any(marker in alg for marker in WEAK_SIGNATURE_MARKERS)
+
+def _expiry_bucket(expiry_date, today: date, buckets: list) -> str:
+    if expiry_date is None:
+        return "unknown"
+    days = (expiry_date - today).days
+    if days < 0:
+        return "expired"
+    for limit in buckets:
+        if days <= limit:
+            return f"{limit}d"
+    return "later"
+
+def dashboard_summary(weak_key_bits: int = 2048, buckets=(30, 60, 90), today: date = None) -> dict:
+    """
+    Expiry / posture figures read from the rollup rows only. Expiry buckets do
+    not overlap: "30d" is 0-30 days out, "60d" is 31-60 days, and so on.
+    """
+    today = today or datetime.utcnow().date()
+    buckets = sorted(buckets)
+    bucket_names = ["expired"] + [f"{b}d" for b in buckets] + ["later", "unknown"]
+
+    rollups = CertificateRollup.query.filter(CertificateRollup.cert_count > 0).all()
+    updated_at = max((r.updated_at for r in rollups if r.updated_at), default=None)
+
+    expiry = Counter()
+    by_issuer_key = {}
+    algorithms = Counter()
+    weak_keys = Counter()
+    totals = Counter()
+    for r in rollups:
+        n = r.cert_count
+        bucket = _expiry_bucket(r.expiry_date, today, buckets)
+        totals["certificates"] += n
+        expiry[bucket] += n
+
+        group = by_issuer_key.setdefault(
+            (r.issuer_category, r.key_size),
+            {"issuer_category": r.issuer_category, "key_size": r.key_size, **{b: 0 for b in bucket_names}, "total": 0},
+        )
+        group[bucket] += n
+        group["total"] += n
+
+        algorithms[r.signature_algorithm or "unknown"] += n
+        if _is_weak_key(r.key_size, r.signature_algorithm, weak_key_bits):
+            totals["weak_keys"] += n
+            weak_keys[r.key_size] += n
+        if _is_weak_signature(r.signature_algorithm):
+            totals["weak_signatures"] += n
+        if r.self_signed:
+            totals["self_signed"] += n
+        if r.extended_validation:
+            totals["extended_validation"] += n
+        totals["mapped" if r.mapped_to_inventory else "unmapped"] += n
+
+    total = totals["certificates"]
+    return {
+        "as_of": today.isoformat(),
+        "totals": {
+            k: totals[k]
+            for k in ("certificates", "weak_keys", "weak_signatures", "self_signed", "extended_validation", "mapped", "unmapped")
+        },
+        "mapped_ratio": round(totals["mapped"] / total, 4) if total else None,
+        "expiry_buckets": {b: expiry[b] for b in bucket_names},
+        "expiry_by_issuer_key_size": sorted(
+            by_issuer_key.values(), key=lambda g: (str(g["issuer_category"]), g["key_size"] or 0)
+        ),
+        "signature_algorithms": dict(algorithms.most_common()),
+        "weak_keys_by_size": {str(k): v for k, v in sorted(weak_keys.items(), key=lambda kv: kv[0] or 0)},
+        "weak_key_bits": weak_key_bits,
+        "updated_at": updated_at.isoformat() if updated_at else None,
+    }
@@ -0,0 +1,165 @@
+"""
+Search syntax for text filters:
+  =value     exact match (btree seek)
+  value*     prefix match (btree range seek)
+  *value     substring match, explicit (table scan)
+  value      substring match; DN / names use the trigram index once it is complete
+"""
+import hashlib
+import ipaddress
+from datetime import datetime
+from sqlalchemy import and_, func, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+from ..models import SearchIndexState, SearchTerm, SearchTrigram
+from .db_utils import chunked
+
+LIKE_ESCAPE = "\\"
+
+SEARCH_KINDS = ("cert_dn", "asset_name")
+
+def _escape_like(value: str) -> str:
+    return value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace("%", LIKE_ESCAPE + "%").replace("_", LIKE_ESCAPE + "_")
+
+def trigrams(value: str) -> set:
+    v = (value or "").lower()
+    return {v[i : i + 3] for i in range(len(v) - 2)}
+
+def _value_hash(value: str) -> str:
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+def _contains(column, value: str):
+    return column.ilike(f"%{_escape_like(value)}%", escape=LIKE_ESCAPE)
+
+def _trigram_contains(column, kind: str, value: str):
+    """
+    Substring match answered from the trigram index: terms containing every
+    trigram of the query are looked up by value (btree on the column), then
+    the candidates are verified with the real ILIKE. Falls back to the plain
+    ILIKE while the index for `kind` is not known to cover every row.
+    """
+    grams = trigrams(value)
+    if not grams or not index_complete(kind):
+        # 1-2 characters are too short for trigrams
+        return _contains(column, value)
+
+    term_ids = (
+        select(SearchTrigram.term_id)
+        .where(SearchTrigram.kind == kind, SearchTrigram.gram.in_(sorted(grams)))
+        .group_by(SearchTrigram.term_id)
+        .having(func.count() == len(grams))
+    )
+    values = select(SearchTerm.value).where(SearchTerm.id.in_(term_ids))
+    return and_(column.in_(values), _contains(column, value))
+
+def text_match(column, value: str, default: str = "contains", kind: str = None):
+    """Builds a filter for `value` using the search syntax above."""
+    value = value.strip()
+    if value.startswith("="):
+        return column == value[1:]
+    if value.startswith("*"):
+        return _contains(column, value.strip("*"))
+    if value.endswith("*"):
+        return column.like(f"{_escape_like(value.rstrip('*'))}%", escape=LIKE_ESCAPE)
+    if default == "prefix":
+        return column.like(f"{_escape_like(value)}%", escape=LIKE_ESCAPE)
+    if kind:
+        return _trigram_contains(column, kind, value)
+    return _contains(column, value)
+
+def ip_key(value):
+    """Sortable 32-hex-digit key for an IPv4/IPv6 address (IPv4 is IPv4-mapped); None if not an IP."""
+    try:
+        addr = ipaddress.ip_address((value or "").strip())
+    except ValueError:
+        return None
+    if addr.version == 4:
+        addr = ipaddress.IPv6Address(f"::ffff:{addr}")
+    return f"{int(addr):032x}"
+
+def ip_match(ip_column, key_column, value: str):
+    """
+    10.0.0.0/8 -> CIDR, 10.0.0.1-10.0.0.50 -> inclusive range, a full address -> exact,
+    anything else (e.g. "10.12.") -> substring of the address text.
+    """
+    value = value.strip()
+    if "/" in value:
+        try:
+            net = ipaddress.ip_network(value, strict=False)
+        except ValueError:
+            return text_match(ip_column, value)
+        return key_column.between(ip_key(str(net.network_address)), ip_key(str(net.broadcast_address)))
+
+    if "-" in value:
+        low, _, high = value.partition("-")
+        low_key, high_key = ip_key(low), ip_key(high)
+        if low_key and high_key:
+            return key_column.between(low_key, high_key)
+
+    key = ip_key(value)
+    if key:
+        return or_(key_column == key, ip_column == value)
+    return text_match(ip_column, value)
+
+def index_complete(kind: str) -> bool:
+    return bool(db.session.scalar(select(SearchIndexState.complete).where(SearchIndexState.kind == kind)))
+
+def set_index_complete(kinds, complete: bool) -> None:
+    """Records whether the trigram index of each kind covers every stored value (own transaction)."""
+    with Session(db.engine) as session:
+        for kind in kinds:
+            session.merge(SearchIndexState(kind=kind, complete=complete, updated_at=datetime.utcnow()))
+        session.commit()
+
+def index_search_terms(kind: str, values) -> int:
+    """
+    Adds trigrams for values not indexed yet. Runs in its own short transaction
+    (after the page commit) so parallel syncs racing on the same new value only
+    retry this step instead of failing a page. Returns the number of new terms.
+    """
+    by_hash = {_value_hash(v): v for v in values if v}
+    if not by_hash:
+        return 0
+
+    for attempt in range(2):
+        try:
+            with Session(db.engine) as session:
+                added = _insert_new_terms(session, kind, by_hash)
+                session.commit()
+                return added
+        except IntegrityError:
+            # another writer inserted one of the same terms first; the re-check skips it
+            if attempt:
+                raise
+
+def _insert_new_terms(session: Session, kind: str, by_hash: dict) -> int:
+    hashes = list(by_hash)
+    existing = set()
+    for chunk in chunked(hashes):
+        existing.update(session.scalars(
+            select(SearchTerm.value_hash).where(SearchTerm.kind == kind, SearchTerm.value_hash.in_(chunk))
+        ))
+
+    new_hashes = [h for h in hashes if h not in existing]
+    if not new_hashes:
+        return 0
+
+    # the value exactly as stored in the searched column: _trigram_contains matches column IN (values)
+    session.execute(
+        insert(SearchTerm),
+        [{"kind": kind, "value_hash": h, "value": by_hash[h]} for h in new_hashes],
+    )
+
+    gram_rows = []
+    for chunk in chunked(new_hashes):
+        for term_id, value_hash in session.execute(
+            select(SearchTerm.id, SearchTerm.value_hash).where(SearchTerm.kind == kind, SearchTerm.value_hash.in_(chunk))
+        ):
+            gram_rows.extend(
+                {"kind": kind, "gram": g, "term_id": term_id} for g in trigrams(by_hash[value_hash])
+            )
+    if gram_rows:
+        session.execute(insert(SearchTrigram), gram_rows)
+    return len(new_hashes)
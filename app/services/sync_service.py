@@ -1,161 +1,906 @@
-import json
-from datetime import datetime
-from flask import current_app
-from ..extensions import db
-from ..models import Certificate, Asset, ApiLog
-from .external_jwt_qualys_client import QualysClient
-
-def _parse_dt(dt_str: str):
-    # example: "2038-01-15T12:00:00.000+00:00"
-    if not dt_str:
-        return None
-    try:
-        # Python can parse ISO with offset using fromisoformat in most cases
-        return datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
-    except Exception:
-        return None
-
-def _page_range(page_number: int, page_size: int) -> str:
-    start = page_number * page_size
-    end = start + page_size - 1
-    return f"{start}-{end}"
-
-def sync_all_certificates(filter_value="root", includes=None, asset_type="MANAGED"):
-    includes = includes or ["ASSET_INTERFACES"]
-
-    cfg = current_app.config
-    #Used with External JWT
-    #client = QualysClient(cfg["QUALYS_BASE_URL"], cfg["QUALYS_JWT"], cfg["QUALYS_TIMEOUT_SECS"])
-
-    client = QualysClient(
-        cfg["QUALYS_BASE_URL"],
-        cfg["QUALYS_TIMEOUT_SECS"],
-    )
-    
-    page_size = cfg["QUALYS_PAGE_SIZE"]
-
-    page_number = 0
-    total_inserted = 0
-
-    while True:
-        page_range = _page_range(page_number, page_size)
-
-        payload = {
-            "filter": {
-                "filters": [
-                    {"field": "certificate.type", "value": filter_value, "operator": "EQUALS"}
-                ],
-                "operation": "AND",
-            },
-            "pageNumber": page_number,
-            "pageSize": page_size,
-            "includes": includes,
-            "assetType": asset_type,
-        }
-
-        log = ApiLog(
-            endpoint="/certview/v1/certificates",
-            page_number=page_number,
-            page_size=page_size,
-            page_range=page_range,
-            request_body_json=json.dumps(payload),
-        )
-        db.session.add(log)
-        db.session.flush()  # get log id
-
-        try:
-            resp = client.list_certificates(payload)
-            log.status_code = resp.status_code
-
-            if resp.status_code != 200:
-                log.error_message = f"Non-200 response: {resp.text[:2000]}"
-                db.session.commit()
-                break
-
-            data = resp.json()
-            if not isinstance(data, list) or len(data) == 0:
-                log.response_count = 0
-                db.session.commit()
-                break
-
-            log.response_count = len(data)
-
-            # Insert certificates + assets
-            inserted_this_page = 0
-
-            for item in data:
-                cert_id = item.get("id")
-                if cert_id is None:
-                    continue
-
-                cert = db.session.get(Certificate, cert_id)
-                if cert is None:
-                    cert = Certificate(id=cert_id)
-
-                cert.certhash = item.get("certhash")
-                cert.serial_number = item.get("serialNumber")
-                cert.dn = item.get("dn")
-                cert.cert_type = item.get("type")
-                cert.signature_algorithm = item.get("signatureAlgorithm")
-                cert.key_size = item.get("keySize")
-                cert.self_signed = bool(item.get("selfSigned"))
-                cert.extended_validation = bool(item.get("extendedValidation"))
-
-                cert.valid_from_date = _parse_dt(item.get("validFromDate"))
-                cert.valid_to_date = _parse_dt(item.get("validToDate"))
-                cert.created_date = _parse_dt(item.get("createdDate"))
-                cert.update_date = _parse_dt(item.get("updateDate"))
-
-                cert.issuer_category = item.get("issuerCategory")
-                cert.instance_count = item.get("instanceCount")
-                cert.asset_count = item.get("assetCount")
-
-                cert.sources_json = json.dumps(item.get("sources")) if item.get("sources") is not None else None
-                cert.subject_json = json.dumps(item.get("subject")) if item.get("subject") is not None else None
-                cert.issuer_json = json.dumps(item.get("issuer")) if item.get("issuer") is not None else None
-
-                cert.page_range = page_range  # required extra field
-                if cert.mapped_to_inventory is None:
-                    cert.mapped_to_inventory = False
-
-                db.session.add(cert)
-
-                # Assets (one cert -> many assets)
-                assets = item.get("assets") or []
-                for a in assets:
-                    asset_id = a.get("id")
-                    if asset_id is None:
-                        continue
-
-                    # uniqueness enforced per (certificate_id, asset_id)
-                    existing = (
-                        Asset.query.filter_by(certificate_id=cert.id, asset_id=asset_id).first()
-                    )
-                    if existing is None:
-                        existing = Asset(certificate_id=cert.id, asset_id=asset_id)
-
-                    existing.uuid = a.get("uuid")
-                    existing.name = a.get("name")
-                    existing.netbios_name = a.get("netbiosName")
-                    existing.operating_system = a.get("operatingSystem")
-                    existing.primary_ip = a.get("primaryIp")
-
-                    existing.host_instances_json = json.dumps(a.get("hostInstances")) if a.get("hostInstances") is not None else None
-                    existing.asset_interfaces_json = json.dumps(a.get("assetInterfaces")) if a.get("assetInterfaces") is not None else None
-
-                    db.session.add(existing)
-
-                inserted_this_page += 1
-
-            # CRITICAL: commit BEFORE next call
-            db.session.commit()
-
-            total_inserted += inserted_this_page
-            page_number += 1
-
-        except Exception as e:
-            log.error_message = str(e)
-            db.session.commit()
-            break
-
-    return {"total_inserted": total_inserted, "last_page_number": page_number}
+import json
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
+from flask import current_app
+from sqlalchemy import delete, exists, func, select, update
+from ..extensions import db
+from ..models import ApiLog, Asset, AssetAddress, Certificate, CertificateAsset, SyncRun, SyncSlice, SyncWatermark
+from .qualys_client import QualysClient
+from .http_client import http_options_from_config
+from .metrics import (
+    SYNC_PAGE_PHASE_SECONDS, SYNC_PAGES, SYNC_RESPONSE_BYTES, SYNC_ROWS, SYNC_RUN_SECONDS, SYNC_RUNS,
+)
+from .page_archive import open_page_archive, read_index, read_manifest, read_page
+from .page_sizer import AdaptivePageSizer
+from .partitions import partition_slices
+from .db_utils import chunked
+from .rollup_service import apply_rollup_delta, rebuild_rollups
+from .search_service import SEARCH_KINDS, index_search_terms, set_index_complete
+from .upsert_service import delete_child_rows, upsert_page
+
+# a stopped run can pick up again from its last committed page
+RESUMABLE_STATUSES = ("failed", "cancelled")
+# at most one run per filter/asset type may be in these states
+ACTIVE_STATUSES = ("queued", "running")
+
+class SyncRunConflict(Exception):
+    """Another run of the same filter/asset type is already queued or running."""
+
+def _page_range(offset: int, page_size: int) -> str:
+    return f"{offset}-{offset + page_size - 1}"
+
+def _build_payload(filter_value, includes, asset_type, page_number: int, page_size: int, extra_filters=()) -> dict:
+    return {
+        "filter": {
+            "filters": [
+                {"field": "certificate.type", "value": filter_value, "operator": "EQUALS"},
+                *extra_filters,
+            ],
+            "operation": "AND",
+        },
+        "pageNumber": page_number,
+        "pageSize": page_size,
+        "includes": includes,
+        "assetType": asset_type,
+    }
+
+def _failed_fetch(status_code, started: float, error: str) -> dict:
+    return {
+        "status_code": status_code,
+        "data": None,
+        "body": None,
+        "raw": None,
+        "bytes": None,
+        "latency_secs": time.perf_counter() - started,
+        "parse_secs": None,
+        "error": error,
+    }
+
+def _body_is_list(body) -> bool:
+    """Whether a spooled body starts with "[" (after whitespace); leaves it at the start."""
+    try:
+        while True:
+            block = body.read(64)
+            if not block:
+                return False
+            block = block.lstrip()
+            if block:
+                return block[:1] == b"["
+    finally:
+        body.seek(0)
+
+def _fetch_page(app, client: QualysClient, payload: dict, spool_bytes=None, keep_raw=False) -> dict:
+    """
+    POSTs one page and decodes it. Runs on a fetch worker (or inline when
+    concurrency is 1), so it gets its own app context and never raises.
+    A 200 whose body is not a JSON list (an error object, a truncated body)
+    comes back as an error like any failed request.
+
+    With spool_bytes the body is not decoded here: it is copied to a spooled
+    temp file ("body") for the writer to parse item by item. keep_raw also
+    returns the undecoded bytes ("raw") of a non-streamed body, for the archive.
+
+    "latency_secs" is the time until the whole body has arrived; "parse_secs"
+    the JSON decoding done here (None when streaming).
+    """
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            resp = client.list_certificates(payload, stream=spool_bytes is not None)
+            try:
+                if resp.status_code != 200:
+                    return _failed_fetch(resp.status_code, started, f"Non-200 response: {resp.text[:2000]}")
+                if spool_bytes is None:
+                    content = resp.content
+                    received = time.perf_counter()
+                    data = resp.json()
+                    if not isinstance(data, list):
+                        return _failed_fetch(200, started, f"Response is not a list of certificates: {resp.text[:2000]}")
+                    return {
+                        "status_code": 200,
+                        "data": data,
+                        "body": None,
+                        "raw": content if keep_raw else None,
+                        "bytes": len(content),
+                        "latency_secs": received - started,
+                        "parse_secs": time.perf_counter() - received,
+                        "error": None,
+                    }
+
+                body = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+                for block in resp.iter_content(chunk_size=64 * 1024):
+                    body.write(block)
+                size = body.tell()
+                body.seek(0)
+                if not _body_is_list(body):
+                    head = body.read(2000).decode("utf-8", "replace")
+                    body.close()
+                    return _failed_fetch(200, started, f"Response is not a list of certificates: {head}")
+                return {
+                    "status_code": 200,
+                    "data": None,
+                    "body": body,
+                    "raw": None,
+                    "bytes": size,
+                    "latency_secs": time.perf_counter() - started,
+                    "parse_secs": None,
+                    "error": None,
+                }
+            finally:
+                resp.close()
+        except Exception as e:
+            return _failed_fetch(None, started, str(e))
+
+def _iter_body_items(body):
+    """Certificates of a spooled page body, one at a time."""
+    import ijson
+
+    return ijson.items(body, "item", use_float=True)
+
+def _store_page(items, page_range: str, upsert_mode: str, run_id: int, batch_items: int):
+    """
+    Upserts a page in batches of `batch_items` certificates. All batches share
+    the caller's transaction. Returns (stats summed over the batches, item
+    count, DNs, asset names); the stats include parse_secs (pulling items out
+    of a streamed body) and upsert_secs.
+    """
+    totals = {
+        "processed": 0,
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "assets_inserted": 0,
+        "assets_updated": 0,
+        "assets_unchanged": 0,
+    }
+    parse_secs = upsert_secs = 0.0
+    max_update_date = None
+    rollup_delta = Counter()
+    item_count = 0
+    dns, names = set(), set()
+
+    items = iter(items)
+    while True:
+        started = time.perf_counter()
+        batch = list(islice(items, batch_items))
+        parse_secs += time.perf_counter() - started
+        if not batch:
+            break
+        item_count += len(batch)
+
+        started = time.perf_counter()
+        stats = upsert_page(batch, page_range, mode=upsert_mode, run_id=run_id)
+        upsert_secs += time.perf_counter() - started
+        for key in totals:
+            totals[key] += stats[key]
+        if stats["max_update_date"] and (max_update_date is None or stats["max_update_date"] > max_update_date):
+            max_update_date = stats["max_update_date"]
+        rollup_delta.update(stats["rollup_delta"])
+
+        dns.update(item.get("dn") for item in batch)
+        names.update(a.get("name") for item in batch for a in item.get("assets") or [])
+
+    stats = {
+        **totals,
+        "max_update_date": max_update_date,
+        "rollup_delta": rollup_delta,
+        "parse_secs": parse_secs,
+        "upsert_secs": upsert_secs,
+    }
+    return stats, item_count, dns, names
+
+def _ms(secs):
+    return None if secs is None else int(round(secs * 1000))
+
+def _observe_page(result: dict, stats=None, commit_secs=None) -> None:
+    SYNC_PAGES.inc(status=result["status_code"] or "none")
+    SYNC_PAGE_PHASE_SECONDS.observe(result["latency_secs"], phase="request")
+    if stats is None:
+        return
+    SYNC_RESPONSE_BYTES.inc(result["bytes"] or 0)
+    SYNC_PAGE_PHASE_SECONDS.observe((result["parse_secs"] or 0) + stats["parse_secs"], phase="parse")
+    SYNC_PAGE_PHASE_SECONDS.observe(stats["upsert_secs"], phase="upsert")
+    SYNC_PAGE_PHASE_SECONDS.observe(commit_secs, phase="commit")
+    SYNC_ROWS.inc(stats["inserted"], result="inserted")
+    SYNC_ROWS.inc(stats["updated"], result="updated")
+    SYNC_ROWS.inc(stats["unchanged"], result="unchanged")
+
+def _archive_page(archive, offset: int, size: int, page_range: str, payload: dict, result: dict, slice_key=None) -> None:
+    """Copies the raw page into the archive. Best effort: a failed write is logged and the sync goes on."""
+    body = result["body"]
+    try:
+        archive.add_page(offset, size, page_range, payload, body if body is not None else result["raw"], slice_key)
+    except Exception:
+        current_app.logger.exception("page archive write failed for %s", page_range)
+    finally:
+        if body is not None:
+            body.seek(0)
+
+def _index_page_terms(dns: set, names: set) -> None:
+    """
+    Keeps the DN / host-name trigram index current. Best effort: a failure marks
+    the index incomplete, so searches use ILIKE until `flask search-reindex` runs.
+    """
+    try:
+        index_search_terms("cert_dn", dns)
+        index_search_terms("asset_name", names)
+    except Exception:
+        current_app.logger.exception("search index update failed")
+        try:
+            set_index_complete(SEARCH_KINDS, False)
+        except Exception:
+            current_app.logger.exception("could not mark the search index incomplete")
+
+def _apply_page_rollups(delta) -> None:
+    """Dashboard rollup counts; a missed delta is corrected by the rebuild after the next full run."""
+    try:
+        apply_rollup_delta(delta)
+    except Exception:
+        current_app.logger.exception("rollup update failed")
+
+def _windows(start_offset: int, size_for):
+    """
+    Contiguous (offset, page_size) windows from start_offset. The size is asked
+    for when a window is requested, so prefetched pages use the latest size.
+    """
+    offset = start_offset
+    while True:
+        size = size_for(offset)
+        yield offset, size
+        offset += size
+
+def _iter_pages(fetch, windows, concurrency: int, prefetch: int):
+    """
+    Yields ((offset, page_size), result) strictly in offset order.
+
+    With concurrency > 1 a bounded pool keeps up to `prefetch` pages in flight
+    ahead of the consumer. Closing the generator (the consumer stopping on an
+    empty page or an error) cancels whatever has not started yet.
+    """
+    if concurrency <= 1:
+        for window in windows:
+            yield window, fetch(window)
+        return
+
+    depth = max(prefetch, concurrency)
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="certview-fetch")
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < depth:
+                window = next(windows)
+                pending.append((window, pool.submit(fetch, window)))
+            window, future = pending.popleft()
+            yield window, future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _resume_offset(run: SyncRun) -> int:
+    if run.next_offset is not None:
+        return run.next_offset
+    # runs checkpointed before next_offset existed
+    if run.last_committed_page is not None:
+        return (run.last_committed_page + 1) * run.page_size
+    return 0
+
+def _page_sizer(cfg, page_size: int) -> AdaptivePageSizer:
+    """Adaptive sizer from config, or one that always answers page_size."""
+    if not cfg.get("QUALYS_ADAPTIVE_PAGE_SIZE"):
+        return AdaptivePageSizer(page_size, page_size, page_size, target_secs=0)
+    return AdaptivePageSizer(
+        page_size,
+        cfg.get("QUALYS_PAGE_SIZE_MIN", 25),
+        cfg.get("QUALYS_PAGE_SIZE_MAX", 1000),
+        target_secs=cfg.get("QUALYS_PAGE_TARGET_SECS", 10),
+        max_bytes=cfg.get("QUALYS_PAGE_MAX_MB", 50) * 1024 * 1024,
+    )
+
+def _is_retryable_size_error(result: dict) -> bool:
+    """Timeouts / dropped connections and 5xx: the kind of failure a smaller page can avoid."""
+    return result["status_code"] is None or result["status_code"] >= 500
+
+def _updated_since_filter(cfg, updated_since: datetime) -> dict:
+    return {
+        "field": cfg.get("QUALYS_UPDATED_DATE_FIELD", "certificate.updateDate"),
+        "value": updated_since.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "operator": cfg.get("QUALYS_UPDATED_DATE_OPERATOR", "GREATER"),
+    }
+
+def _get_watermark(filter_value, asset_type):
+    return SyncWatermark.query.filter_by(filter_value=filter_value, asset_type=asset_type).first()
+
+def _full_sync_due(watermark) -> bool:
+    if watermark is None or watermark.high_water_mark is None or watermark.last_full_sync_at is None:
+        return True
+    interval = timedelta(hours=current_app.config.get("QUALYS_FULL_SYNC_INTERVAL_HOURS", 24))
+    return watermark.last_full_sync_at + interval <= datetime.utcnow()
+
+def _reconcile_deletions(run: SyncRun) -> int:
+    """
+    After a completed full run, certificates last seen by an earlier run of the
+    same filter/asset type were not returned by CertView anymore: delete them.
+    Certificates owned by other scopes (or never tagged) are left alone.
+    """
+    stale_ids = db.session.scalars(
+        select(Certificate.id)
+        .join(SyncRun, Certificate.last_seen_run_id == SyncRun.id)
+        .where(
+            SyncRun.filter_value == run.filter_value,
+            SyncRun.asset_type == run.asset_type,
+            Certificate.last_seen_run_id != run.id,
+        )
+    ).all()
+
+    delete_child_rows(stale_ids)
+    for chunk in chunked(stale_ids):
+        db.session.execute(delete(Certificate).where(Certificate.id.in_(chunk)), execution_options={"synchronize_session": False})
+    # assets no certificate links to anymore (including ones dropped from a certificate by an earlier page)
+    db.session.execute(
+        delete(AssetAddress).where(~exists().where(CertificateAsset.asset_id == AssetAddress.asset_id)),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.execute(
+        delete(Asset).where(~exists().where(CertificateAsset.asset_id == Asset.id)),
+        execution_options={"synchronize_session": False},
+    )
+    return len(stale_ids)
+
+def _complete_run(run: SyncRun) -> None:
+    """Advances the scope's high-water mark; full runs also reconcile deletions."""
+    watermark = _get_watermark(run.filter_value, run.asset_type)
+    if watermark is None:
+        watermark = SyncWatermark(filter_value=run.filter_value, asset_type=run.asset_type)
+        db.session.add(watermark)
+
+    if run.max_update_date and (watermark.high_water_mark is None or run.max_update_date > watermark.high_water_mark):
+        watermark.high_water_mark = run.max_update_date
+
+    # an empty full result is far more likely an API/filter problem than a tenant with no certificates
+    if run.mode != "incremental" and run.total_inserted:
+        run.deleted_count = _reconcile_deletions(run)
+        watermark.last_full_sync_at = run.started_at
+
+    watermark.updated_at = datetime.utcnow()
+
+def run_to_dict(run: SyncRun) -> dict:
+    slices = _run_slices(run) if run.slice_count else None
+    totals = {
+        "total_inserted": run.total_inserted,
+        "pages_committed": run.pages_committed or 0,
+        "assets_upserted": run.assets_upserted or 0,
+    }
+    if slices:
+        # a running partitioned run only sums its slices at the end
+        totals = {key: sum(getattr(s, key) or 0 for s in slices) for key in totals}
+    return {
+        "id": run.id,
+        "filter_value": run.filter_value,
+        "asset_type": run.asset_type,
+        "mode": run.mode or "full",
+        "updated_since": run.updated_since.isoformat() if run.updated_since else None,
+        "max_update_date": run.max_update_date.isoformat() if run.max_update_date else None,
+        "deleted_count": run.deleted_count,
+        "includes": json.loads(run.includes_json) if run.includes_json else None,
+        "page_size": run.page_size,
+        "status": run.status,
+        "last_committed_page": run.last_committed_page,
+        "next_offset": run.next_offset,
+        **totals,
+        "rows_per_sec": _rows_per_sec(run, totals),
+        "cancel_requested": run.cancel_requested,
+        "error_message": run.error_message,
+        "started_at": run.started_at.isoformat() if run.started_at else None,
+        "updated_at": run.updated_at.isoformat() if run.updated_at else None,
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+        "slice_count": run.slice_count,
+        "overlap_count": run.overlap_count,
+        "slices": [slice_to_dict(s) for s in slices] if slices is not None else None,
+    }
+
+def _run_slices(run: SyncRun) -> list:
+    return SyncSlice.query.filter_by(sync_run_id=run.id).order_by(SyncSlice.id).all()
+
+def slice_to_dict(sync_slice: SyncSlice) -> dict:
+    return {
+        "id": sync_slice.id,
+        "key": sync_slice.slice_key,
+        "filters": json.loads(sync_slice.filters_json),
+        "status": sync_slice.status,
+        "next_offset": sync_slice.next_offset,
+        "total_inserted": sync_slice.total_inserted,
+        "pages_committed": sync_slice.pages_committed or 0,
+        "assets_upserted": sync_slice.assets_upserted or 0,
+        "error_message": sync_slice.error_message,
+        "updated_at": sync_slice.updated_at.isoformat() if sync_slice.updated_at else None,
+        "finished_at": sync_slice.finished_at.isoformat() if sync_slice.finished_at else None,
+    }
+
+def _rows_per_sec(run: SyncRun, totals: dict):
+    if not run.started_at or not run.updated_at:
+        return None
+    elapsed = (run.updated_at - run.started_at).total_seconds()
+    if elapsed <= 0:
+        return None
+    return round(((totals["total_inserted"] or 0) + totals["assets_upserted"]) / elapsed, 1)
+
+def _is_stale(run: SyncRun) -> bool:
+    """A queued/running run whose heartbeat (updated_at) stopped: its process died."""
+    minutes = current_app.config.get("SYNC_STALE_RUN_MINUTES", 30)
+    return run.updated_at is not None and run.updated_at + timedelta(minutes=minutes) <= datetime.utcnow()
+
+def fail_stale_runs() -> int:
+    """Marks abandoned queued/running runs failed so they can be resumed."""
+    stale = [r for r in SyncRun.query.filter(SyncRun.status.in_(ACTIVE_STATUSES)).all() if _is_stale(r)]
+    for run in stale:
+        _finish_run(run, "failed", "Interrupted: no progress reported (process stopped?)")
+    if stale:
+        db.session.commit()
+    return len(stale)
+
+def _ensure_no_active_run(filter_value, asset_type, exclude_id=None) -> None:
+    q = SyncRun.query.filter(
+        SyncRun.filter_value == filter_value,
+        SyncRun.asset_type == asset_type,
+        SyncRun.status.in_(ACTIVE_STATUSES),
+    )
+    if exclude_id is not None:
+        q = q.filter(SyncRun.id != exclude_id)
+
+    for run in q.all():
+        if _is_stale(run):
+            _finish_run(run, "failed", "Interrupted: no progress reported (process stopped?)")
+            db.session.commit()
+            continue
+        raise SyncRunConflict(f"sync run {run.id} for {filter_value}/{asset_type} is already {run.status}")
+
+def _get_run(run_id: int) -> SyncRun:
+    run = db.session.get(SyncRun, run_id)
+    if run is None:
+        raise LookupError(f"sync run {run_id} not found")
+    return run
+
+def _finish_run(run: SyncRun, status: str, error_message=None) -> None:
+    now = datetime.utcnow()
+    run.status = status
+    run.error_message = error_message
+    run.updated_at = now
+    run.finished_at = now
+
+def create_sync_run(
+    filter_value="root", asset_type="MANAGED", includes=None, mode="full", status="running", partitioned=False
+) -> SyncRun:
+    """
+    mode="incremental" only asks CertView for certificates updated since the
+    scope's high-water mark; it falls back to a full run when there is no mark
+    yet or the last full run is older than QUALYS_FULL_SYNC_INTERVAL_HOURS.
+    partitioned=True splits the filter into the slices of partition_slices(),
+    paged in parallel with a checkpoint each.
+    Raises SyncRunConflict if the same filter/asset type already has an active run.
+    """
+    if mode not in ("full", "incremental"):
+        raise ValueError(f"unknown sync mode: {mode}")
+
+    slices = partition_slices(current_app.config) if partitioned else []
+    _ensure_no_active_run(filter_value, asset_type)
+
+    updated_since = None
+    if mode == "incremental":
+        watermark = _get_watermark(filter_value, asset_type)
+        if _full_sync_due(watermark):
+            mode = "full"
+        else:
+            overlap = timedelta(seconds=current_app.config.get("QUALYS_INCREMENTAL_OVERLAP_SECS", 300))
+            updated_since = watermark.high_water_mark - overlap
+
+    run = SyncRun(
+        filter_value=filter_value,
+        asset_type=asset_type,
+        mode=mode,
+        updated_since=updated_since,
+        includes_json=json.dumps(includes or ["ASSET_INTERFACES"]),
+        page_size=current_app.config["QUALYS_PAGE_SIZE"],
+        status=status,
+        total_inserted=0,
+        pages_committed=0,
+        assets_upserted=0,
+        cancel_requested=False,
+        slice_count=len(slices) or None,
+    )
+    db.session.add(run)
+    db.session.flush()
+    for s in slices:
+        db.session.add(SyncSlice(
+            sync_run_id=run.id,
+            slice_key=s["key"][:128],
+            filters_json=json.dumps(s["filters"]),
+            status="pending",
+            total_inserted=0,
+            pages_committed=0,
+            assets_upserted=0,
+        ))
+    db.session.commit()
+    return run
+
+def _walk_pages(run: SyncRun, checkpoint, extra_filters: list, concurrency: int, prefetch: int, write_lock=None):
+    """
+    Walks the run's filter plus `extra_filters` from the page after the
+    checkpoint. `checkpoint` is the run itself or one of its SyncSlice rows;
+    each page's rows and the checkpoint are committed together, so a failed or
+    cancelled walk can be resumed without re-downloading what is already
+    stored. Pages are stored while holding `write_lock`, if given (see
+    _walk_slices). Returns (status, error_message).
+    """
+    cfg = current_app.config
+    app = current_app._get_current_object()
+    client = QualysClient(
+        cfg["QUALYS_BASE_URL"],
+        cfg["QUALYS_TIMEOUT_SECS"],
+        **http_options_from_config(cfg),
+    )
+
+    filter_value = run.filter_value
+    asset_type = run.asset_type
+    includes = json.loads(run.includes_json) if run.includes_json else ["ASSET_INTERFACES"]
+    page_size = run.page_size
+    upsert_mode = cfg.get("QUALYS_SYNC_UPSERT_MODE", "bulk")
+
+    spool_bytes = None
+    if cfg.get("QUALYS_SYNC_STREAMING"):
+        try:
+            import ijson  # noqa: F401
+        except ImportError:
+            raise RuntimeError("QUALYS_SYNC_STREAMING requires the ijson package")
+        spool_bytes = cfg.get("QUALYS_STREAM_SPOOL_MB", 16) * 1024 * 1024
+        batch_items = cfg.get("QUALYS_STREAM_BATCH_ITEMS", 200)
+
+    sizer = _page_sizer(cfg, page_size)
+    archive = open_page_archive(cfg, run)
+    slice_id = checkpoint.id if isinstance(checkpoint, SyncSlice) else None
+    slice_key = checkpoint.slice_key if slice_id is not None else None
+    write_lock = write_lock or nullcontext()
+
+    def fetch(window):
+        offset, size = window
+        # size always divides offset (see AdaptivePageSizer.size_for)
+        payload = _build_payload(filter_value, includes, asset_type, offset // size, size, extra_filters)
+        return payload, _fetch_page(app, client, payload, spool_bytes, keep_raw=archive is not None)
+
+    offset = _resume_offset(checkpoint)
+    # "completed" only once an empty page ends the walk: a full run's deletion reconcile relies on it
+    status, error_message = "failed", "page walk ended without reaching an empty page"
+    retry = True
+
+    # one pass per pageSize reduction: a page that timed out is fetched again, smaller, from the same offset
+    while retry:
+        retry = False
+        pages = _iter_pages(fetch, _windows(offset, sizer.size_for), concurrency, prefetch)
+        try:
+            for (offset, size), (payload, result) in pages:
+                # cancel requests come from other requests/threads, so read the flag from the DB
+                if db.session.scalar(select(SyncRun.cancel_requested).where(SyncRun.id == run.id)):
+                    status = "cancelled"
+                    break
+
+                with write_lock:
+                    page_range = _page_range(offset, size)
+
+                    log = ApiLog(
+                        endpoint="/certview/v1/certificates",
+                        page_number=offset // size,
+                        page_size=size,
+                        page_range=page_range,
+                        request_body_json=json.dumps(payload),
+                        status_code=result["status_code"],
+                        latency_ms=_ms(result["latency_secs"]),
+                        sync_run_id=run.id,
+                        sync_slice_id=slice_id,
+                    )
+                    db.session.add(log)
+
+                    if result["error"]:
+                        log.error_message = result["error"]
+                        db.session.commit()
+                        _observe_page(result)
+                        sizer.record(size, 0, result["latency_secs"], 0, failed=True)
+                        if _is_retryable_size_error(result) and sizer.size_for(offset) < size:
+                            retry = True
+                        else:
+                            status, error_message = "failed", result["error"]
+                        break
+
+                    log.response_bytes = result["bytes"]
+                    if archive is not None:
+                        _archive_page(archive, offset, size, page_range, payload, result, slice_key)
+                    try:
+                        if result["body"] is not None:
+                            items = _iter_body_items(result["body"])
+                        else:
+                            items = result["data"]
+                            batch_items = max(len(items), 1)
+
+                        # Insert certificates + assets
+                        stats, log.response_count, dns, names = _store_page(items, page_range, upsert_mode, run.id, batch_items)
+                        log.parse_ms = _ms((result["parse_secs"] or 0) + stats["parse_secs"])
+                        log.upsert_ms = _ms(stats["upsert_secs"])
+                        log.rows_inserted = stats["inserted"]
+                        log.rows_updated = stats["updated"]
+                        log.rows_unchanged = stats["unchanged"]
+                        if log.response_count == 0:
+                            db.session.commit()
+                            _observe_page(result)
+                            status, error_message = "completed", None
+                            break
+
+                        checkpoint.next_offset = offset + size
+                        checkpoint.last_committed_page = offset // size
+                        checkpoint.total_inserted = (checkpoint.total_inserted or 0) + stats["processed"]
+                        checkpoint.pages_committed = (checkpoint.pages_committed or 0) + 1
+                        checkpoint.assets_upserted = (
+                            (checkpoint.assets_upserted or 0) + stats["assets_inserted"] + stats["assets_updated"]
+                        )
+                        if stats["max_update_date"] and (
+                            checkpoint.max_update_date is None or stats["max_update_date"] > checkpoint.max_update_date
+                        ):
+                            checkpoint.max_update_date = stats["max_update_date"]
+                        checkpoint.updated_at = datetime.utcnow()
+                        if slice_id is not None:
+                            # the run's heartbeat, which stale-run detection reads
+                            db.session.execute(
+                                update(SyncRun).where(SyncRun.id == run.id).values(updated_at=checkpoint.updated_at)
+                            )
+
+                        # CRITICAL: page rows + checkpoint commit together, BEFORE the page is counted as done
+                        db.session.flush()
+                        log_id = log.id
+                        started = time.perf_counter()
+                        db.session.commit()
+                        commit_secs = time.perf_counter() - started
+                        db.session.execute(update(ApiLog).where(ApiLog.id == log_id).values(commit_ms=_ms(commit_secs)))
+                        db.session.commit()
+                        _observe_page(result, stats, commit_secs)
+
+                        _index_page_terms(dns, names)
+                        _apply_page_rollups(stats["rollup_delta"])
+                        sizer.record(size, log.response_count, result["latency_secs"], result["bytes"] or 0)
+
+                    except Exception as e:
+                        db.session.rollback()
+                        # the rolled-back flush may have assigned an id; let the DB issue a fresh one
+                        log.id = None
+                        log.error_message = str(e)
+                        db.session.add(log)
+                        status, error_message = "failed", str(e)
+                        db.session.commit()
+                        break
+                    finally:
+                        if result["body"] is not None:
+                            result["body"].close()
+        finally:
+            pages.close()
+
+    return status, error_message
+
+def _walk_slices(run: SyncRun, extra_filters: list, concurrency: int, prefetch: int):
+    """
+    Walks the run's unfinished slices on QUALYS_PARTITION_WORKERS threads, each
+    with its own app context, session and checkpoint, then reconciles them: the
+    run's totals become the sums over its slices and overlap_count the rows
+    returned by more than one slice. Returns (status, error_message).
+
+    Only fetching runs in parallel: the slices store one page at a time. Their
+    pages share asset ids (and certificate ids at window edges), and concurrent
+    select-then-insert upserts of the same id fail with PK violations or
+    deadlocks on MSSQL and "database is locked" on SQLite.
+    """
+    app = current_app._get_current_object()
+    write_lock = threading.Lock()
+    workers = current_app.config.get("QUALYS_PARTITION_WORKERS", 4)
+    run_id = run.id
+    pending = db.session.scalars(
+        select(SyncSlice.id)
+        .where(SyncSlice.sync_run_id == run_id, SyncSlice.status != "completed")
+        .order_by(SyncSlice.id)
+    ).all()
+
+    def walk(slice_id):
+        with app.app_context():
+            if db.session.scalar(select(SyncRun.cancel_requested).where(SyncRun.id == run_id)):
+                status, error_message = "cancelled", None
+            else:
+                with write_lock:
+                    sync_slice = db.session.get(SyncSlice, slice_id)
+                    sync_slice.status = "running"
+                    sync_slice.error_message = None
+                    db.session.commit()
+                filters = [*extra_filters, *json.loads(sync_slice.filters_json)]
+                try:
+                    status, error_message = _walk_pages(
+                        _get_run(run_id), sync_slice, filters, concurrency, prefetch, write_lock
+                    )
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.exception("sync run %s slice %s crashed", run_id, slice_id)
+                    status, error_message = "failed", str(e)
+
+            with write_lock:
+                sync_slice = db.session.get(SyncSlice, slice_id)
+                sync_slice.status = status
+                sync_slice.error_message = error_message
+                sync_slice.updated_at = sync_slice.finished_at = datetime.utcnow()
+                db.session.commit()
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(min(workers, len(pending)), 1), thread_name_prefix="sync-slice") as pool:
+            list(pool.map(walk, pending))
+
+    # the slices committed on other sessions
+    db.session.expire_all()
+    return _reconcile_slices(_get_run(run_id))
+
+def _reconcile_slices(run: SyncRun):
+    slices = SyncSlice.query.filter_by(sync_run_id=run.id).order_by(SyncSlice.id).all()
+    run.total_inserted = sum(s.total_inserted or 0 for s in slices)
+    run.pages_committed = sum(s.pages_committed or 0 for s in slices)
+    run.assets_upserted = sum(s.assets_upserted or 0 for s in slices)
+    run.max_update_date = max((s.max_update_date for s in slices if s.max_update_date), default=None)
+    run.updated_at = datetime.utcnow()
+
+    failed = [s for s in slices if s.status == "failed"]
+    if failed:
+        details = "; ".join(f"{s.slice_key}: {s.error_message}" for s in failed[:5])
+        return "failed", f"{len(failed)} of {len(slices)} slices failed: {details}"
+    if any(s.status != "completed" for s in slices):
+        return "cancelled", None
+
+    distinct = db.session.scalar(
+        select(func.count()).select_from(Certificate).where(Certificate.last_seen_run_id == run.id)
+    )
+    run.overlap_count = run.total_inserted - distinct
+    if run.overlap_count:
+        current_app.logger.warning(
+            "sync run %s: %s certificates were returned by more than one slice", run.id, run.overlap_count
+        )
+    return "completed", None
+
+def execute_sync_run(run_id: int, concurrency=None, prefetch=None) -> dict:
+    """
+    Walks the run's filter from its checkpoint, or every slice of a partitioned
+    run in parallel, then finishes the run (a completed full run reconciles
+    deletions).
+    """
+    run = _get_run(run_id)
+
+    cfg = current_app.config
+    extra_filters = [_updated_since_filter(cfg, run.updated_since)] if run.updated_since else []
+    concurrency = concurrency or cfg.get("QUALYS_SYNC_CONCURRENCY", 1)
+    prefetch = prefetch or cfg.get("QUALYS_SYNC_PREFETCH", concurrency)
+    run_started = time.perf_counter()
+
+    if run.slice_count:
+        status, error_message = _walk_slices(run, extra_filters, concurrency, prefetch)
+    else:
+        status, error_message = _walk_pages(run, run, extra_filters, concurrency, prefetch)
+
+    run = _get_run(run_id)
+    if status == "completed":
+        try:
+            _complete_run(run)
+        except Exception as e:
+            db.session.rollback()
+            run = _get_run(run_id)
+            status, error_message = "failed", f"Reconciliation failed: {e}"
+    _finish_run(run, status, error_message)
+    db.session.commit()
+
+    if run.status == "completed" and run.deleted_count is not None:
+        # reconciliation deletes rows without deltas, and it is a good point to correct any drift
+        try:
+            rebuild_rollups()
+        except Exception:
+            current_app.logger.exception("rollup rebuild failed")
+
+    SYNC_RUNS.inc(mode=run.mode or "full", status=run.status)
+    SYNC_RUN_SECONDS.observe(time.perf_counter() - run_started, mode=run.mode or "full")
+
+    return {
+        "run_id": run.id,
+        "status": run.status,
+        "total_inserted": run.total_inserted,
+        "last_page_number": run.last_committed_page,
+        "next_offset": run.next_offset,
+        "slices": run.slice_count,
+        "overlap_count": run.overlap_count,
+    }
+
+def replay_archived_run(run_id: int, root=None, upsert_mode=None, batch_items=None) -> dict:
+    """
+    Upserts every page archived for sync run `run_id` (see page_archive)
+    without calling CertView: one commit per page, then a rollup rebuild.
+    Works on an empty database as well as an existing one. No SyncRun or
+    ApiLog rows are written and last_seen_run_id is left alone (new rows get
+    none), so deletion reconciliation waits for the next full sync. Rows
+    whose content hash matches are skipped as in a sync; bump
+    CONTENT_HASH_VERSION first when replaying to apply a mapping change.
+    """
+    cfg = current_app.config
+    root = root or cfg.get("QUALYS_PAGE_ARCHIVE_DIR")
+    if not root:
+        raise ValueError("no archive directory: set QUALYS_PAGE_ARCHIVE_DIR or pass one")
+    upsert_mode = upsert_mode or cfg.get("QUALYS_SYNC_UPSERT_MODE", "bulk")
+    batch_items = batch_items or cfg.get("QUALYS_STREAM_BATCH_ITEMS", 200)
+
+    entries = read_index(root, run_id)
+    totals = Counter()
+    started = time.perf_counter()
+    for entry in entries:
+        items = read_page(root, run_id, entry)
+        if not items:
+            continue
+        stats, _, dns, names = _store_page(items, entry["page_range"], upsert_mode, None, batch_items)
+        db.session.commit()
+        _index_page_terms(dns, names)
+        totals["pages"] += 1
+        for key in ("processed", "inserted", "updated", "unchanged"):
+            totals[key] += stats[key]
+    rebuild_rollups()
+
+    return {
+        "run_id": run_id,
+        "filter_value": read_manifest(root, run_id).get("filter_value"),
+        "pages": totals["pages"],
+        "processed": totals["processed"],
+        "inserted": totals["inserted"],
+        "updated": totals["updated"],
+        "unchanged": totals["unchanged"],
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+def reopen_sync_run(run_id: int, status: str = "running") -> SyncRun:
+    """Puts a failed/cancelled run back into `status` so it can continue from its checkpoint."""
+    run = _get_run(run_id)
+    if run.status not in RESUMABLE_STATUSES:
+        raise ValueError(f"sync run {run_id} is {run.status} and cannot be resumed")
+    _ensure_no_active_run(run.filter_value, run.asset_type, exclude_id=run.id)
+
+    run.status = status
+    run.cancel_requested = False
+    run.error_message = None
+    run.finished_at = None
+    run.updated_at = datetime.utcnow()
+    db.session.commit()
+    return run
+
+def resume_sync_run(run_id: int, concurrency=None, prefetch=None) -> dict:
+    reopen_sync_run(run_id)
+    return execute_sync_run(run_id, concurrency=concurrency, prefetch=prefetch)
+
+def cancel_sync_run(run_id: int) -> SyncRun:
+    """
+    A running run stops before its next page; a queued or stopped run is
+    marked cancelled immediately. Completed runs cannot be cancelled.
+    """
+    run = _get_run(run_id)
+    if run.status == "completed":
+        raise ValueError(f"sync run {run_id} is already completed")
+
+    if run.status == "running":
+        run.cancel_requested = True
+        run.updated_at = datetime.utcnow()
+    else:
+        _finish_run(run, "cancelled", run.error_message)
+    db.session.commit()
+    return run
+
+def sync_all_certificates(
+    filter_value="root", includes=None, asset_type="MANAGED", concurrency=None, prefetch=None, mode="full", partitioned=False
+):
+    run = create_sync_run(
+        filter_value=filter_value, asset_type=asset_type, includes=includes, mode=mode, partitioned=partitioned
+    )
+    return execute_sync_run(run.id, concurrency=concurrency, prefetch=prefetch)
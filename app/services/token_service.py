@@ -1,130 +1,213 @@
-import requests
-from datetime import datetime, timedelta
-from flask import current_app
-from sqlalchemy.exc import SQLAlchemyError
-
-from ..extensions import db
-from ..models import QualysAuthToken
-
-TOKEN_LIFETIME = timedelta(hours=3, minutes=55)
-
-def _parse_token_from_response(resp: requests.Response) -> str:
-    # Try JSON first
-    try:
-        body = resp.json()
-    except Exception:
-        body = None
-
-    token = None
-    if isinstance(body, dict):
-        token = (
-            body.get("token")
-            or body.get("access_token")
-            or body.get("jwt")
-            or (body.get("data") or {}).get("token")
-        )
-
-    if not token:
-        # fallback: plain text
-        text = (resp.text or "").strip()
-        if text.count(".") == 2 and len(text) > 50:
-            token = text
-
-    if not token:
-        raise RuntimeError(f"Could not parse token from auth response: {resp.text[:2000]}")
-
-    return token
-
-def _invalidate_if_expired(token_row: QualysAuthToken) -> None:
-    now = datetime.utcnow()
-    if token_row.valid and token_row.expires_at <= now:
-        token_row.valid = False
-        db.session.add(token_row)
-
-def get_valid_token() -> str:
-    """
-    Returns a valid token from DB.
-    If token expired or none exists: refresh and store a new one.
-    Ensures expired token is marked valid=False.
-    """
-    try:
-        # Get newest token row
-        token_row = (
-            QualysAuthToken.query.order_by(QualysAuthToken.id.desc()).first()
-        )
-
-        if token_row:
-            _invalidate_if_expired(token_row)
-            db.session.commit()
-
-            if token_row.valid:
-                return token_row.token_value
-
-        # No token or token invalid -> refresh
-        return refresh_token()
-
-    except SQLAlchemyError as e:
-        db.session.rollback()
-        raise RuntimeError(f"DB error while getting token: {e}")
-
-def refresh_token() -> str:
-    """
-    Requests a new Qualys token and stores it as valid=True with expires_at.
-    Marks any existing valid tokens as valid=False (optional safety).
-    """
-    cfg = current_app.config
-    auth_url = cfg["QUALYS_AUTH_URL"]
-    username = cfg["QUALYS_USERNAME"]
-    password = cfg["QUALYS_PASSWORD"]
-    timeout_secs = cfg.get("QUALYS_TIMEOUT_SECS", 60)
-
-    if not username or not password:
-        raise ValueError("QUALYS_USERNAME / QUALYS_PASSWORD not set")
-
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    data = {
-        "username": username,
-        "password": password,
-        "token": "true",
-        "permissions": "true",
-    }
-
-    resp = requests.post(auth_url, headers=headers, data=data, timeout=timeout_secs)
-
-    # Treat 200 or 201 as success
-    if resp.status_code not in (200, 201):
-        # store a failed attempt row (optional)
-        failed = QualysAuthToken(
-            token_value="",
-            valid=False,
-            created_at=datetime.utcnow(),
-            expires_at=datetime.utcnow(),
-            auth_url=auth_url,
-            status_code=resp.status_code,
-            error_message=f"Auth failed: {resp.text[:2000]}",
-        )
-        db.session.add(failed)
-        db.session.commit()
-        raise RuntimeError(f"Qualys auth failed ({resp.status_code}): {resp.text[:2000]}")
-
-    token = _parse_token_from_response(resp)
-    now = datetime.utcnow()
-    expires_at = now + TOKEN_LIFETIME
-
-    # Optional: invalidate all previous valid tokens
-    QualysAuthToken.query.filter_by(valid=True).update({"valid": False})
-    db.session.commit()
-
-    row = QualysAuthToken(
-        token_value=token,
-        created_at=now,
-        expires_at=expires_at,
-        valid=True,
-        auth_url=auth_url,
-        status_code=resp.status_code,
-        error_message=None,
-    )
-    db.session.add(row)
-    db.session.commit()
-
-    return token
+import threading
+import time
+import requests
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+from ..models import QualysAuthToken
+from .http_client import get_session
+from .metrics import TOKEN_REFRESH_SECONDS, TOKEN_REFRESHES
+
+TOKEN_LIFETIME = timedelta(hours=3, minutes=55)
+
+# (auth_url, username) -> (token, expires_at); shared by every thread in the process
+_token_cache = {}
+_token_lock = threading.Lock()
+
+def _parse_token_from_response(resp: requests.Response) -> str:
+    # Try JSON first
+    try:
+        body = resp.json()
+    except Exception:
+        body = None
+
+    token = None
+    if isinstance(body, dict):
+        token = (
+            body.get("token")
+            or body.get("access_token")
+            or body.get("jwt")
+            or (body.get("data") or {}).get("token")
+        )
+
+    if not token:
+        # fallback: plain text
+        text = (resp.text or "").strip()
+        if text.count(".") == 2 and len(text) > 50:
+            token = text
+
+    if not token:
+        raise RuntimeError(f"Could not parse token from auth response: {resp.text[:2000]}")
+
+    return token
+
+def _invalidate_if_expired(token_row: QualysAuthToken, session: Session) -> None:
+    now = datetime.utcnow()
+    if token_row.valid and token_row.expires_at <= now:
+        token_row.valid = False
+        session.add(token_row)
+
+def _refresh_margin() -> timedelta:
+    return timedelta(seconds=current_app.config.get("QUALYS_TOKEN_REFRESH_MARGIN_SECS", 300))
+
+def _cached_token(key, margin: timedelta):
+    cached = _token_cache.get(key)
+    if cached and cached[1] - margin > datetime.utcnow():
+        return cached[0]
+    return None
+
+def _load_token_from_db(session: Session, auth_url: str, username: str, margin: timedelta):
+    # Get newest token row for this account; rows stored without a username are never reused
+    token_row = session.scalars(
+        select(QualysAuthToken)
+        .where(QualysAuthToken.auth_url == auth_url, QualysAuthToken.username == username)
+        .order_by(QualysAuthToken.id.desc())
+        .limit(1)
+    ).first()
+
+    if token_row is None:
+        return None
+
+    _invalidate_if_expired(token_row, session)
+    session.commit()
+
+    if token_row.valid and token_row.expires_at - margin > datetime.utcnow():
+        return token_row.token_value, token_row.expires_at
+    return None
+
+def get_valid_token() -> str:
+    """
+    Returns a valid token, from the in-process cache when possible.
+
+    On a cache miss (or when the cached token is within the refresh margin of
+    expiring) the newest DB row is checked, and only if that is unusable too a
+    new token is requested. The lock makes concurrent callers share one refresh.
+    Token DB work runs in its own session so it never commits sync state.
+    """
+    cfg = current_app.config
+    key = (cfg["QUALYS_AUTH_URL"], cfg["QUALYS_USERNAME"])
+    margin = _refresh_margin()
+
+    token = _cached_token(key, margin)
+    if token:
+        return token
+
+    with _token_lock:
+        # another thread may have refreshed while we waited
+        token = _cached_token(key, margin)
+        if token:
+            return token
+
+        try:
+            with Session(db.engine) as session:
+                found = _load_token_from_db(session, cfg["QUALYS_AUTH_URL"], cfg["QUALYS_USERNAME"], margin)
+                if found is None:
+                    # No token or token invalid / about to expire -> refresh
+                    found = _request_token(session)
+        except SQLAlchemyError as e:
+            raise RuntimeError(f"DB error while getting token: {e}")
+
+        _token_cache[key] = found
+        return found[0]
+
+def refresh_token() -> str:
+    """
+    Requests a new Qualys token regardless of what is cached, stores it and
+    makes it the cached token.
+    """
+    cfg = current_app.config
+    key = (cfg["QUALYS_AUTH_URL"], cfg["QUALYS_USERNAME"])
+    with _token_lock:
+        with Session(db.engine) as session:
+            found = _request_token(session)
+        _token_cache[key] = found
+        return found[0]
+
+def _request_token(session: Session):
+    """_new_token() with the outcome and duration recorded in the /metrics counters."""
+    started = time.perf_counter()
+    try:
+        found = _new_token(session)
+    except Exception:
+        TOKEN_REFRESHES.inc(result="error")
+        raise
+    TOKEN_REFRESHES.inc(result="success")
+    TOKEN_REFRESH_SECONDS.observe(time.perf_counter() - started)
+    return found
+
+def _new_token(session: Session):
+    """
+    Requests a new Qualys token and stores it as valid=True with expires_at.
+    Marks the account's existing valid tokens as valid=False (optional safety).
+    Returns (token, expires_at).
+    """
+    cfg = current_app.config
+    auth_url = cfg["QUALYS_AUTH_URL"]
+    username = cfg["QUALYS_USERNAME"]
+    password = cfg["QUALYS_PASSWORD"]
+    timeout_secs = cfg.get("QUALYS_TIMEOUT_SECS", 60)
+
+    if not username or not password:
+        raise ValueError("QUALYS_USERNAME / QUALYS_PASSWORD not set")
+
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    data = {
+        "username": username,
+        "password": password,
+        "token": "true",
+        "permissions": "true",
+    }
+
+    http = get_session(cfg.get("QUALYS_HTTP_POOL_SIZE", 10))
+    resp = http.post(auth_url, headers=headers, data=data, timeout=timeout_secs)
+
+    # Treat 200 or 201 as success
+    if resp.status_code not in (200, 201):
+        # store a failed attempt row (optional)
+        failed = QualysAuthToken(
+            token_value="",
+            valid=False,
+            created_at=datetime.utcnow(),
+            expires_at=datetime.utcnow(),
+            auth_url=auth_url,
+            username=username,
+            status_code=resp.status_code,
+            error_message=f"Auth failed: {resp.text[:2000]}",
+        )
+        session.add(failed)
+        session.commit()
+        raise RuntimeError(f"Qualys auth failed ({resp.status_code}): {resp.text[:2000]}")
+
+    token = _parse_token_from_response(resp)
+    now = datetime.utcnow()
+    expires_at = now + TOKEN_LIFETIME
+
+    # Optional: invalidate previous valid tokens of the same account (other users' tokens stay usable)
+    session.execute(
+        update(QualysAuthToken)
+        .where(
+            QualysAuthToken.valid.is_(True),
+            QualysAuthToken.auth_url == auth_url,
+            QualysAuthToken.username == username,
+        )
+        .values(valid=False)
+    )
+
+    row = QualysAuthToken(
+        token_value=token,
+        created_at=now,
+        expires_at=expires_at,
+        valid=True,
+        auth_url=auth_url,
+        username=username,
+        status_code=resp.status_code,
+        error_message=None,
+    )
+    session.add(row)
+    session.commit()
+
+    return token, expires_at
@@ -0,0 +1,410 @@
+import hashlib
+import json
+from collections import Counter
+from datetime import datetime, timezone
+from sqlalchemy import delete, insert, select, update
+
+from ..extensions import db
+from ..models import Certificate, Asset, AssetAddress, AssetPort, CertificateAsset, CertificateSan, CertificateSource
+from .db_utils import chunked
+from .rollup_service import ROLLUP_COLUMNS, certificate_dims, rollup_dims
+from .search_service import ip_key
+
+def _parse_dt(dt_str: str):
+    # example: "2038-01-15T12:00:00.000+00:00"
+    if not dt_str:
+        return None
+    try:
+        # Python can parse ISO with offset using fromisoformat in most cases
+        return datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
+    except Exception:
+        return None
+
+def naive_utc(dt):
+    """Aware datetimes -> naive UTC, the form stored in DateTime columns."""
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _max_update_date(rows) -> datetime:
+    return max((naive_utc(r["update_date"]) for r in rows if r["update_date"]), default=None)
+
+def _json_or_none(value):
+    return json.dumps(value) if value is not None else None
+
+def _text(value, size: int):
+    """Name parts may come as a list (several OUs); flattened and cut to the column size."""
+    if isinstance(value, list):
+        value = ", ".join(str(v) for v in value if v)
+    return str(value)[:size] if value else None
+
+def _as_dict(value) -> dict:
+    return value if isinstance(value, dict) else {}
+
+def certificate_row(item: dict, page_range: str) -> dict:
+    """Maps one CertView certificate item to Certificate column values."""
+    subject = _as_dict(item.get("subject"))
+    issuer = _as_dict(item.get("issuer"))
+    return {
+        "id": item.get("id"),
+        "certhash": item.get("certhash"),
+        "serial_number": item.get("serialNumber"),
+        "dn": item.get("dn"),
+        "cert_type": item.get("type"),
+        "signature_algorithm": item.get("signatureAlgorithm"),
+        "key_size": item.get("keySize"),
+        "self_signed": bool(item.get("selfSigned")),
+        "extended_validation": bool(item.get("extendedValidation")),
+        "valid_from_date": _parse_dt(item.get("validFromDate")),
+        "valid_to_date": _parse_dt(item.get("validToDate")),
+        "created_date": _parse_dt(item.get("createdDate")),
+        "update_date": _parse_dt(item.get("updateDate")),
+        "issuer_category": item.get("issuerCategory"),
+        "instance_count": item.get("instanceCount"),
+        "asset_count": item.get("assetCount"),
+        "sources_json": _json_or_none(item.get("sources")),
+        "subject_json": _json_or_none(item.get("subject")),
+        "issuer_json": _json_or_none(item.get("issuer")),
+        "subject_cn": _text(subject.get("name"), 512),
+        "subject_o": _text(subject.get("organization"), 256),
+        "subject_ou": _text(subject.get("organizationUnit"), 256),
+        "issuer_cn": _text(issuer.get("name"), 512),
+        "issuer_o": _text(issuer.get("organization"), 256),
+        "page_range": page_range,  # required extra field
+    }
+
+# bump when certificate_row / asset_row / the child row mappers change, so the
+# next sync rewrites rows whose CertView content did not change
+CONTENT_HASH_VERSION = 1
+
+def content_hash(value) -> str:
+    """sha256 (hex) of `value` as canonical JSON: sorted keys, no whitespace, CONTENT_HASH_VERSION prefixed."""
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{CONTENT_HASH_VERSION}:{canonical}".encode("utf-8")).hexdigest()
+
+def asset_content_hash(a: dict) -> str:
+    """Hash of the asset itself; hostInstances belong to the certificate link, not the asset row."""
+    return content_hash({k: v for k, v in a.items() if k != "hostInstances"})
+
+def asset_row(a: dict) -> dict:
+    """Maps one asset of a CertView certificate item to Asset column values."""
+    return {
+        "id": a.get("id"),
+        "uuid": a.get("uuid"),
+        "name": a.get("name"),
+        "netbios_name": a.get("netbiosName"),
+        "operating_system": a.get("operatingSystem"),
+        "primary_ip": a.get("primaryIp"),
+        "primary_ip_key": ip_key(a.get("primaryIp")),
+        "asset_interfaces_json": _json_or_none(a.get("assetInterfaces")),
+    }
+
+def _san_entries(item: dict):
+    """
+    Yields (type, name) from subjectAlternativeNames, which shows up as
+    {"DNS Name": [...], ...}, a list of strings / {"type", "value"} dicts,
+    or one "DNS:a, DNS:b" string.
+    """
+    sans = item.get("subjectAlternativeNames") or item.get("subjectAlternativeName")
+    if isinstance(sans, dict):
+        for san_type, values in sans.items():
+            for value in values if isinstance(values, list) else [values]:
+                yield san_type, value
+    elif isinstance(sans, list):
+        for entry in sans:
+            if isinstance(entry, dict):
+                yield entry.get("type"), entry.get("value") or entry.get("name")
+            else:
+                yield None, entry
+    elif isinstance(sans, str):
+        for entry in sans.split(","):
+            san_type, sep, value = entry.strip().partition(":")
+            yield (san_type, value) if sep else (None, san_type)
+
+def certificate_child_rows(cert_id: int, item: dict) -> dict:
+    """CertificateSource / CertificateSan rows for one CertView item."""
+    sources = {s for s in item.get("sources") or [] if s}
+    sans = {(_text(t, 32), _text(v, 512)) for t, v in _san_entries(item) if v}
+    return {
+        CertificateSource: [{"certificate_id": cert_id, "source": _text(s, 64)} for s in sorted(sources)],
+        CertificateSan: [{"certificate_id": cert_id, "san_type": t, "value": v} for t, v in sorted(sans, key=str)],
+    }
+
+def asset_child_rows(cert_id: int, a: dict) -> dict:
+    """CertificateAsset link / AssetPort rows for one asset of a CertView item."""
+    ports = {
+        (h.get("port"), (_text(h.get("protocol"), 16) or "").upper() or None)
+        for h in a.get("hostInstances") or [] if isinstance(h, dict)
+    }
+    return {
+        CertificateAsset: [
+            {"certificate_id": cert_id, "asset_id": a["id"], "host_instances_json": _json_or_none(a.get("hostInstances"))}
+        ],
+        AssetPort: [
+            {"certificate_id": cert_id, "asset_id": a["id"], "port": port, "protocol": protocol}
+            for port, protocol in sorted(ports, key=str)
+        ],
+    }
+
+def asset_address_rows(a: dict) -> list:
+    """AssetAddress rows for one asset; they belong to the asset row, not to a certificate."""
+    addresses = {
+        _text(i.get("address"), 64)
+        for i in a.get("assetInterfaces") or [] if isinstance(i, dict) and i.get("address")
+    }
+    return [{"asset_id": a["id"], "address": addr, "address_key": ip_key(addr)} for addr in sorted(addresses)]
+
+# rebuilt from the item on every upsert; keyed by certificate_id
+CHILD_MODELS = (CertificateSource, CertificateSan, CertificateAsset, AssetPort)
+
+def delete_child_rows(cert_ids, models=CHILD_MODELS) -> None:
+    for chunk in chunked(list(cert_ids)):
+        for model in models:
+            db.session.execute(
+                delete(model).where(model.certificate_id.in_(chunk)),
+                execution_options={"synchronize_session": False},
+            )
+
+def _replace_child_rows(cert_items: dict, asset_items: dict, existing_cert_ids) -> None:
+    """Swaps the normalized rows of the page's certificates for freshly mapped ones."""
+    rows = {model: [] for model in CHILD_MODELS}
+    for cert_id, item in cert_items.items():
+        for model, model_rows in certificate_child_rows(cert_id, item).items():
+            rows[model].extend(model_rows)
+    for (cert_id, _), a in asset_items.items():
+        for model, model_rows in asset_child_rows(cert_id, a).items():
+            rows[model].extend(model_rows)
+
+    delete_child_rows(existing_cert_ids)
+    for model, model_rows in rows.items():
+        if model_rows:
+            db.session.execute(insert(model), model_rows)
+
+def delete_asset_addresses(asset_ids) -> None:
+    for chunk in chunked(list(asset_ids)):
+        db.session.execute(
+            delete(AssetAddress).where(AssetAddress.asset_id.in_(chunk)),
+            execution_options={"synchronize_session": False},
+        )
+
+def replace_asset_addresses(asset_items: dict, existing_asset_ids) -> None:
+    """Swaps the address rows of the written assets (asset id -> item) for freshly mapped ones."""
+    rows = [row for a in asset_items.values() for row in asset_address_rows(a)]
+    delete_asset_addresses(existing_asset_ids)
+    if rows:
+        db.session.execute(insert(AssetAddress), rows)
+
+def upsert_page_bulk(items: list, page_range: str, run_id=None) -> dict:
+    """
+    Set-based upsert of one CertView page.
+
+    Existing certificate and asset ids are resolved with one IN-list query each,
+    together with the content_hash stored for them. Rows whose hash matches the
+    incoming item are not rewritten: unchanged certificates only get
+    last_seen_run_id / page_range stamped (one UPDATE per IN-list chunk) and
+    keep their child rows, unchanged assets are skipped together with their
+    address rows. Inserts and updates of the rest go out as executemany
+    batches. Does not commit; the caller owns the transaction.
+    """
+    certs = {}
+    assets = {}
+    cert_items = {}
+    asset_items = {}
+    asset_sources = {}
+    for item in items:
+        cert_id = item.get("id")
+        if cert_id is None:
+            continue
+        certs[cert_id] = certificate_row(item, page_range)
+        certs[cert_id]["content_hash"] = content_hash(item)
+        cert_items[cert_id] = item
+        if run_id is not None:
+            certs[cert_id]["last_seen_run_id"] = run_id
+        for a in item.get("assets") or []:
+            if a.get("id") is None:
+                continue
+            # one row per asset id; last one in the page wins
+            assets[a["id"]] = {**asset_row(a), "content_hash": asset_content_hash(a)}
+            asset_sources[a["id"]] = a
+            asset_items[(cert_id, a["id"])] = a
+
+    stats = {
+        "processed": len(certs),
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "assets_inserted": 0,
+        "assets_updated": 0,
+        "assets_unchanged": 0,
+        "max_update_date": _max_update_date(certs.values()),
+        "rollup_delta": Counter(),
+    }
+    if not certs:
+        return stats
+
+    cert_ids = list(certs)
+    # id -> dashboard dimensions before this page, for the rollup delta
+    existing_dims = {}
+    existing_hashes = {}
+    existing_assets = {}
+    dim_columns = [getattr(Certificate, c) for c in ROLLUP_COLUMNS]
+    for chunk in chunked(cert_ids):
+        rows = db.session.execute(
+            select(Certificate.id, Certificate.content_hash, *dim_columns).where(Certificate.id.in_(chunk))
+        )
+        for r in rows:
+            existing_dims[r.id] = rollup_dims(r._mapping)
+            existing_hashes[r.id] = r.content_hash
+    for chunk in chunked(list(assets)):
+        rows = db.session.execute(select(Asset.id, Asset.content_hash).where(Asset.id.in_(chunk)))
+        existing_assets.update((r.id, r.content_hash) for r in rows)
+
+    new_certs = []
+    changed_certs = []
+    unchanged_ids = []
+    rollup_delta = Counter()
+    for cert_id, row in certs.items():
+        old_dims = existing_dims.get(cert_id)
+        if old_dims is not None and existing_hashes[cert_id] == row["content_hash"]:
+            unchanged_ids.append(cert_id)
+        elif old_dims is not None:
+            # mapped_to_inventory is user-owned and never overwritten by the sync
+            changed_certs.append(row)
+            rollup_delta[old_dims] -= 1
+            rollup_delta[rollup_dims({**row, "mapped_to_inventory": old_dims[-1]})] += 1
+        else:
+            new_certs.append({**row, "mapped_to_inventory": False})
+            rollup_delta[rollup_dims(new_certs[-1])] += 1
+
+    new_assets = []
+    changed_assets = []
+    for asset_id, row in assets.items():
+        if run_id is not None:
+            row["last_seen_run_id"] = run_id
+        if asset_id not in existing_assets:
+            new_assets.append(row)
+        elif existing_assets[asset_id] != row["content_hash"]:
+            changed_assets.append(row)
+
+    if new_certs:
+        db.session.execute(insert(Certificate), new_certs)
+    if changed_certs:
+        db.session.execute(update(Certificate), changed_certs)
+    if new_assets:
+        db.session.execute(insert(Asset), new_assets)
+    if changed_assets:
+        db.session.execute(update(Asset), changed_assets)
+    if unchanged_ids:
+        seen = {"page_range": page_range} if run_id is None else {"page_range": page_range, "last_seen_run_id": run_id}
+        for chunk in chunked(unchanged_ids):
+            db.session.execute(
+                update(Certificate).where(Certificate.id.in_(chunk)).values(**seen),
+                execution_options={"synchronize_session": False},
+            )
+
+    # child rows (including the asset links) only change with the certificate item
+    unchanged = set(unchanged_ids)
+    _replace_child_rows(
+        {cert_id: item for cert_id, item in cert_items.items() if cert_id not in unchanged},
+        {key: a for key, a in asset_items.items() if key[0] not in unchanged},
+        [cert_id for cert_id in existing_dims if cert_id not in unchanged],
+    )
+    # address rows follow the asset row: rebuilt only for inserted / changed assets
+    written = [row["id"] for row in new_assets + changed_assets]
+    replace_asset_addresses({asset_id: asset_sources[asset_id] for asset_id in written}, [row["id"] for row in changed_assets])
+
+    stats.update(
+        inserted=len(new_certs),
+        updated=len(changed_certs),
+        unchanged=len(unchanged_ids),
+        assets_inserted=len(new_assets),
+        assets_updated=len(changed_assets),
+        assets_unchanged=len(assets) - len(new_assets) - len(changed_assets),
+        rollup_delta=rollup_delta,
+    )
+    return stats
+
+def upsert_page_orm(items: list, page_range: str, run_id=None) -> dict:
+    """
+    Legacy per-row upsert (one SELECT per certificate and per asset). Kept for
+    comparison; always rewrites every row, but stores content_hash so a later
+    bulk sync can skip them.
+    """
+    stats = {
+        "processed": 0,
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "assets_inserted": 0,
+        "assets_updated": 0,
+        "assets_unchanged": 0,
+    }
+    rows = []
+    cert_items = {}
+    asset_items = {}
+    asset_sources = {}
+    rollup_delta = Counter()
+
+    for item in items:
+        cert_id = item.get("id")
+        if cert_id is None:
+            continue
+
+        cert = db.session.get(Certificate, cert_id)
+        if cert is None:
+            cert = Certificate(id=cert_id)
+            stats["inserted"] += 1
+        else:
+            stats["updated"] += 1
+            rollup_delta[certificate_dims(cert)] -= 1
+
+        row = certificate_row(item, page_range)
+        rows.append(row)
+        for field, value in row.items():
+            setattr(cert, field, value)
+        cert.content_hash = content_hash(item)
+        if run_id is not None:
+            cert.last_seen_run_id = run_id
+        if cert.mapped_to_inventory is None:
+            cert.mapped_to_inventory = False
+        rollup_delta[certificate_dims(cert)] += 1
+
+        db.session.add(cert)
+        cert_items[cert_id] = item
+
+        # Assets (one cert -> many assets)
+        for a in item.get("assets") or []:
+            asset_id = a.get("id")
+            if asset_id is None:
+                continue
+
+            existing = db.session.get(Asset, asset_id)
+            if existing is None:
+                existing = Asset(id=asset_id)
+                stats["assets_inserted"] += 1
+            else:
+                stats["assets_updated"] += 1
+
+            for field, value in asset_row(a).items():
+                setattr(existing, field, value)
+            existing.content_hash = asset_content_hash(a)
+            if run_id is not None:
+                existing.last_seen_run_id = run_id
+
+            db.session.add(existing)
+            asset_sources[asset_id] = a
+            asset_items[(cert.id, asset_id)] = a
+
+        stats["processed"] += 1
+
+    db.session.flush()
+    _replace_child_rows(cert_items, asset_items, list(cert_items))
+    replace_asset_addresses(asset_sources, list(asset_sources))
+    stats["max_update_date"] = _max_update_date(rows)
+    stats["rollup_delta"] = rollup_delta
+    return stats
+
+def upsert_page(items: list, page_range: str, mode: str = "bulk", run_id=None) -> dict:
+    if mode == "orm":
+        return upsert_page_orm(items, page_range, run_id=run_id)
+    return upsert_page_bulk(items, page_range, run_id=run_id)
@@ -0,0 +1,72 @@
+"""
+Compares the bulk and the legacy ORM page upsert on synthetic CertView pages.
+
+    python -m bench.bench_upsert --pages 20 --page-size 100 --assets 50
+    DATABASE_URL="mssql+pyodbc://..." python -m bench.bench_upsert
+
+Each mode runs twice against an empty database: an insert pass, then an update
+pass over the same items. Defaults to a throwaway SQLite file.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from .synthetic import make_item
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--assets", type=int, default=50, help="assets per certificate")
+    parser.add_argument("--shared-assets", type=float, default=0, help="fraction of assets shared between certificates")
+    parser.add_argument("--modes", default="bulk,orm")
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="qualys-bench-"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from sqlalchemy import event
+    from app import create_app
+    from app.extensions import db
+    from app.services.upsert_service import upsert_page
+
+    app = create_app()
+    pages = [
+        [
+            make_item(p * args.page_size + i + 1, args.assets, shared_assets=args.shared_assets)
+            for i in range(args.page_size)
+        ]
+        for p in range(args.pages)
+    ]
+
+    with app.app_context():
+        statements = {"n": 0}
+
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            statements["n"] += 1
+
+        print(f"{db.engine.url.get_backend_name()}: {args.pages} pages x {args.page_size} certs x {args.assets} assets")
+        for mode in args.modes.split(","):
+            db.drop_all()
+            db.create_all()
+            for pass_name in ("insert", "update"):
+                statements["n"] = 0
+                started = time.perf_counter()
+                for p, items in enumerate(pages):
+                    upsert_page(items, f"{p * args.page_size}-{(p + 1) * args.page_size - 1}", mode=mode)
+                    db.session.commit()
+                elapsed = time.perf_counter() - started
+                certs = args.pages * args.page_size
+                print(
+                    f"  {mode:<4} {pass_name:<6} {elapsed:8.2f}s  "
+                    f"{certs / elapsed:9.0f} certs/s  {statements['n']:7d} statements"
+                )
+            db.session.remove()
+
+
+if __name__ == "__main__":
+    main()
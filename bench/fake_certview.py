@@ -0,0 +1,197 @@
+"""
+Local stand-in for the Qualys gateway: POST /auth and POST /certview/v1/certificates.
+
+    python -m bench.fake_certview --port 8765 --certs 20000 --assets 5 --latency-ms 50 --error-rate 0.02
+
+then point the app at it:
+
+    QUALYS_BASE_URL=http://127.0.0.1:8765 QUALYS_AUTH_URL=http://127.0.0.1:8765/auth
+    QUALYS_USERNAME=bench QUALYS_PASSWORD=bench
+
+Pages are generated on request from the certificate id (bench.synthetic), so
+any tenant size costs no memory. Each request sleeps latency_ms plus
+latency_per_item_ms for every certificate returned; error_rate of the
+certificate requests answer 503 instead. certificate.validToDate GREATER /
+LESSER filters (partitioned syncs) are applied; other filters are ignored.
+--shared-assets makes that fraction of the assets come from a pool that many
+certificates list (bench.synthetic.make_asset).
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .synthetic import SHARED_ASSET_POOL, make_item, make_page
+
+# three dot-separated parts, like a JWT, so the token parser accepts it either way
+TOKEN = "bench." + "x" * 64 + ".token"
+
+
+class FakeTenant:
+    """What the fake gateway serves, plus request counters."""
+
+    def __init__(
+        self,
+        certs: int = 10000,
+        assets: int = 5,
+        interfaces: int = 1,
+        latency_ms: float = 0,
+        latency_per_item_ms: float = 0,
+        error_rate: float = 0,
+        seed: int = 1,
+        shared_assets: float = 0,
+        shared_pool: int = SHARED_ASSET_POOL,
+    ):
+        self.certs = certs
+        self.assets = assets
+        self.interfaces = interfaces
+        self.shared_assets = shared_assets
+        self.shared_pool = shared_pool
+        self.latency_ms = latency_ms
+        self.latency_per_item_ms = latency_per_item_ms
+        self.error_rate = error_rate
+        self.requests = {"auth": 0, "pages": 0, "errors": 0}
+        self._matches = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.requests[key] += 1
+
+    def inject_error(self) -> bool:
+        with self._lock:
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def matching_ids(self, filters: list) -> list:
+        """Certificate ids passing the validToDate filters (cached per filter set)."""
+        key = json.dumps([self.certs, filters], sort_keys=True)
+        with self._lock:
+            cached = self._matches.get(key)
+        if cached is None:
+            cached = [i for i in range(1, self.certs + 1) if _passes(make_item(i, 0), filters)]
+            with self._lock:
+                self._matches[key] = cached
+        return cached
+
+    def page(self, payload: dict) -> list:
+        page_number = int(payload.get("pageNumber", 0))
+        page_size = int(payload.get("pageSize", 100))
+        filters = [
+            f for f in (payload.get("filter") or {}).get("filters") or []
+            if f.get("field") == "certificate.validToDate"
+        ]
+        if not filters:
+            return make_page(
+                page_number, page_size, self.certs, self.assets, self.interfaces, self.shared_assets, self.shared_pool
+            )
+        ids = self.matching_ids(filters)[page_number * page_size:(page_number + 1) * page_size]
+        return [make_item(i, self.assets, self.interfaces, self.shared_assets, self.shared_pool) for i in ids]
+
+
+def _date(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _passes(item: dict, filters: list) -> bool:
+    valid_to = _date(item["validToDate"])
+    for f in filters:
+        if f.get("operator") == "GREATER" and not valid_to > _date(f["value"]):
+            return False
+        if f.get("operator") == "LESSER" and not valid_to < _date(f["value"]):
+            return False
+    return True
+
+
+def _handler(tenant: FakeTenant):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body, content_type="application/json"):
+            data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            if status == 503:
+                self.send_header("Retry-After", "0")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+
+            if self.path.rstrip("/").endswith("/auth"):
+                tenant.count("auth")
+                return self._send(200, {"token": TOKEN})
+
+            if self.path.rstrip("/").endswith("/certview/v1/certificates"):
+                if self.headers.get("Authorization") != f"Bearer {TOKEN}":
+                    return self._send(401, {"error": "missing or invalid token"})
+                tenant.count("pages")
+                if tenant.inject_error():
+                    tenant.count("errors")
+                    return self._send(503, {"error": "injected failure"})
+
+                page = tenant.page(json.loads(raw or b"{}"))
+                delay_ms = tenant.latency_ms + tenant.latency_per_item_ms * len(page)
+                if delay_ms:
+                    time.sleep(delay_ms / 1000)
+                return self._send(200, page)
+
+            self._send(404, {"error": f"unknown path {self.path}"})
+
+    return Handler
+
+
+def start_server(tenant: FakeTenant, host: str = "127.0.0.1", port: int = 0):
+    """Serves `tenant` on a daemon thread. Returns (server, base_url); stop with server.shutdown()."""
+    server = ThreadingHTTPServer((host, port), _handler(tenant))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-certview", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--certs", type=int, default=10000)
+    parser.add_argument("--assets", type=int, default=5, help="assets per certificate")
+    parser.add_argument("--interfaces", type=int, default=1, help="interfaces per asset")
+    parser.add_argument("--shared-assets", type=float, default=0, help="fraction of assets shared between certificates")
+    parser.add_argument("--shared-pool", type=int, default=SHARED_ASSET_POOL, help="number of distinct shared assets")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--latency-per-item-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of page requests answered with 503")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    tenant = FakeTenant(
+        certs=args.certs,
+        assets=args.assets,
+        interfaces=args.interfaces,
+        latency_ms=args.latency_ms,
+        latency_per_item_ms=args.latency_per_item_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        shared_assets=args.shared_assets,
+        shared_pool=args.shared_pool,
+    )
+    server, base_url = start_server(tenant, args.host, args.port)
+    print(f"fake CertView on {base_url} ({args.certs} certificates); Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
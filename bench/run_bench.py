@@ -0,0 +1,398 @@
+"""
+End-to-end benchmarks against the local CertView stand-in (bench.fake_certview).
+
+    python -m bench.run_bench --certs 5000 --assets 5 --interfaces 2 --csv-rows 200000
+    python -m bench.run_bench --scenarios sync --latency-ms 40 --error-rate 0.02 --concurrency 4
+    python -m bench.run_bench --scenarios sync --latency-per-item-ms 2 --partitioned --partition-workers 8
+    python -m bench.run_bench --scenarios sync --shared-assets 0.3 --shared-pool 500 --partitioned
+    python -m bench.run_bench --database-url "mssql+pyodbc://..."      # a local SQL Server instead of SQLite
+
+Scenarios (each in its own process, so peak RSS is per scenario):
+
+  sync              sync_all_certificates() against the fake gateway
+  leafcert_import   app.leafcert_import, in_list and staged strategies
+  csv_import_to_db  app.csv_import_to_db.import_leaf_certs (SQLAlchemy session)
+  export            /certificates/export and /assets/export in every format
+  replay            flask archive-replay of the pages the sync scenario archived
+
+The importers run twice on the same file: "load" into an empty table, then
+"reload" where every serial is already stored. Export reads what sync wrote
+and replay the raw pages it archived, so run them together. Without
+--database-url a throwaway SQLite file is used (replay gets a second, empty one).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from .synthetic import SHARED_ASSET_POOL, write_leafcert_csv
+
+SCENARIOS = ("sync", "leafcert_import", "csv_import_to_db", "export", "replay")
+LEAF_TABLE = "qualysLeafcertificates"
+LEAF_CSV_MAP = {
+    "Serial number": "serial_number",
+    "Cert name": "cert_name",
+    "Cert hash": "certhash",
+    "Valid from": "valid_from_date",
+    "Valid to": "valid_to_date",
+    "Cert status": "certificate_status",
+}
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _count_statements(engine) -> dict:
+    from sqlalchemy import event
+
+    counter = {"n": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter["n"] += 1
+
+    return counter
+
+
+class _CountingCursor:
+    """DB-API cursor wrapper counting execute/executemany round trips (raw cursors bypass engine events)."""
+
+    def __init__(self, cursor):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "statements", 0)
+
+    def execute(self, *args):
+        object.__setattr__(self, "statements", self.statements + 1)
+        return self._cursor.execute(*args)
+
+    def executemany(self, *args):
+        object.__setattr__(self, "statements", self.statements + 1)
+        return self._cursor.executemany(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+def _leaf_model():
+    from sqlalchemy import Integer, String
+    from sqlalchemy.orm import DeclarativeBase, mapped_column
+
+    class Base(DeclarativeBase):
+        pass
+
+    class LeafCertificate(Base):
+        __tablename__ = LEAF_TABLE
+
+        id = mapped_column(Integer, primary_key=True, autoincrement=True)
+        serial_number = mapped_column(String(128), nullable=False, index=True)
+        cert_name = mapped_column(String(512))
+        certhash = mapped_column(String(128))
+        valid_from_date = mapped_column(String(64))
+        valid_to_date = mapped_column(String(64))
+        certificate_status = mapped_column(String(64))
+
+    return LeafCertificate
+
+
+def _empty_leaf_table(engine):
+    from sqlalchemy import delete
+
+    model = _leaf_model()
+    model.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(delete(model))
+    return model
+
+
+def bench_sync(args) -> list:
+    from bench.fake_certview import FakeTenant, start_server
+    from app import create_app
+    from app.extensions import db
+    from app.models import Asset, Certificate
+    from app.services.sync_service import sync_all_certificates
+
+    tenant = FakeTenant(
+        certs=args.certs,
+        assets=args.assets,
+        interfaces=args.interfaces,
+        latency_ms=args.latency_ms,
+        latency_per_item_ms=args.latency_per_item_ms,
+        error_rate=args.error_rate,
+        shared_assets=args.shared_assets,
+        shared_pool=args.shared_pool,
+    )
+    server, base_url = start_server(tenant)
+    app = create_app()
+    app.config.update(
+        QUALYS_BASE_URL=base_url,
+        QUALYS_AUTH_URL=f"{base_url}/auth",
+        QUALYS_USERNAME="bench",
+        QUALYS_PASSWORD="bench",
+        QUALYS_PAGE_SIZE=args.page_size,
+        QUALYS_SYNC_STREAMING=args.streaming,
+        QUALYS_HTTP_BACKOFF_SECS=0.05,
+        QUALYS_HTTP_MAX_BACKOFF_SECS=0.5,
+        QUALYS_PAGE_ARCHIVE_DIR=args.archive_dir,
+        QUALYS_PARTITION_WORKERS=args.partition_workers,
+    )
+    try:
+        with app.app_context():
+            statements = _count_statements(db.engine)
+            started = time.perf_counter()
+            result = sync_all_certificates(concurrency=args.concurrency, partitioned=args.partitioned)
+            seconds = time.perf_counter() - started
+            stored = Certificate.query.count()
+            stored_assets = Asset.query.count()
+    finally:
+        server.shutdown()
+
+    return [{
+        "scenario": "sync",
+        "variant": f"c={args.concurrency}"
+        + (f" partitioned w={args.partition_workers}" if args.partitioned else "")
+        + (" streaming" if args.streaming else "")
+        + (f" shared={args.shared_assets}" if args.shared_assets else ""),
+        "status": result["status"],
+        "rows": result["total_inserted"],
+        "seconds": round(seconds, 2),
+        "rows_per_sec": round(result["total_inserted"] / seconds) if seconds else None,
+        "statements": statements["n"],
+        "http_requests": tenant.requests["pages"],
+        "injected_errors": tenant.requests["errors"],
+        "stored": stored,
+        "stored_assets": stored_assets,
+    }]
+
+
+def bench_leafcert_import(args) -> list:
+    from sqlalchemy import create_engine
+    from app.leafcert_import import STRATEGIES, import_leafcert_csv
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+    results = []
+    for strategy in STRATEGIES:
+        _empty_leaf_table(engine)
+        for pass_name in ("load", "reload"):
+            conn = engine.raw_connection()
+            try:
+                cursor = _CountingCursor(conn.cursor())
+                with open(args.csv_path, "r", encoding="utf-8", newline="") as f:
+                    stats = import_leafcert_csv(
+                        f, cursor, table=LEAF_TABLE, chunksize=args.chunksize, strategy=strategy, commit=True
+                    )
+                conn.commit()
+            finally:
+                conn.close()
+            results.append({
+                "scenario": "leafcert_import",
+                "variant": f"{strategy} {pass_name}",
+                "rows": stats["rows_read"],
+                "inserted": stats["inserted"],
+                "seconds": stats["seconds"],
+                "rows_per_sec": stats["rows_per_sec"],
+                "statements": cursor.statements,
+            })
+    return results
+
+
+def bench_csv_import_to_db(args) -> list:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from app.csv_import_to_db import import_leaf_certs
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+    model = _empty_leaf_table(engine)
+    statements = _count_statements(engine)
+    results = []
+    for pass_name, upsert in (("load", False), ("reload", False), ("upsert", True)):
+        statements["n"] = 0
+        started = time.perf_counter()
+        with Session(engine) as session, open(args.csv_path, "r", encoding="utf-8", newline="") as f:
+            stats = import_leaf_certs(
+                f,
+                session,
+                model,
+                csv_to_model_map=LEAF_CSV_MAP,
+                serial_csv_col="Serial number",
+                serial_model_field="serial_number",
+                batch_size=args.batch_size,
+                upsert=upsert,
+            )
+        seconds = time.perf_counter() - started
+        results.append({
+            "scenario": "csv_import_to_db",
+            "variant": pass_name,
+            "rows": stats["rows_read"],
+            "inserted": stats["inserted"],
+            "seconds": round(seconds, 2),
+            "rows_per_sec": round(stats["rows_read"] / seconds) if seconds else None,
+            "statements": statements["n"],
+        })
+    return results
+
+
+def bench_export(args) -> list:
+    from app import create_app
+    from app.extensions import db
+    from app.services.export_service import EXPORT_FORMATS
+
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        statements = _count_statements(db.engine)
+
+    results = []
+    for path in ("/certificates/export", "/assets/export"):
+        for fmt in EXPORT_FORMATS:
+            statements["n"] = 0
+            started = time.perf_counter()
+            resp = client.get(path, query_string={"format": fmt}, buffered=False)
+            size = 0
+            try:
+                if resp.status_code != 200:
+                    results.append({"scenario": "export", "variant": f"{path} {fmt}", "status": resp.status_code})
+                    continue
+                for chunk in resp.iter_encoded():
+                    size += len(chunk)
+            finally:
+                resp.close()
+            seconds = time.perf_counter() - started
+            results.append({
+                "scenario": "export",
+                "variant": f"{path} {fmt}",
+                "bytes": size,
+                "seconds": round(seconds, 2),
+                "mb_per_sec": round(size / seconds / 1e6, 1) if seconds else None,
+                "statements": statements["n"],
+            })
+    return results
+
+
+def bench_replay(args) -> list:
+    if not args.database_url:
+        # before the app import: Config reads DATABASE_URL at import time
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(os.path.dirname(args.archive_dir), 'replay.db')}"
+
+    from app import create_app
+    from app.extensions import db
+    from app.services.page_archive import archived_run_ids
+    from app.services.sync_service import replay_archived_run
+
+    run_ids = archived_run_ids(args.archive_dir)
+    if not run_ids:
+        raise RuntimeError("nothing archived; run the sync scenario first")
+
+    app = create_app()
+    results = []
+    with app.app_context():
+        statements = _count_statements(db.engine)
+        for pass_name in ("load", "reload"):
+            statements["n"] = 0
+            result = replay_archived_run(run_ids[-1], args.archive_dir)
+            results.append({
+                "scenario": "replay",
+                "variant": pass_name,
+                "rows": result["processed"],
+                "inserted": result["inserted"],
+                "unchanged": result["unchanged"],
+                "seconds": result["seconds"],
+                "rows_per_sec": round(result["processed"] / result["seconds"]) if result["seconds"] else None,
+                "statements": statements["n"],
+            })
+    return results
+
+
+RUNNERS = {
+    "sync": bench_sync,
+    "leafcert_import": bench_leafcert_import,
+    "csv_import_to_db": bench_csv_import_to_db,
+    "export": bench_export,
+    "replay": bench_replay,
+}
+
+
+def _run_child(name: str, args: argparse.Namespace, results) -> None:
+    try:
+        rows = RUNNERS[name](args)
+    except Exception as e:
+        rows = [{"scenario": name, "error": f"{type(e).__name__}: {e}"}]
+    peak = _peak_rss_mb()
+    results.put([{**row, "peak_rss_mb": peak} for row in rows])
+
+
+def _print_rows(rows: list) -> None:
+    for row in rows:
+        details = "  ".join(f"{k}={v}" for k, v in row.items() if k not in ("scenario", "variant"))
+        print(f"  {row['scenario']:<17} {row.get('variant', ''):<28} {details}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--database-url", default=None, help="defaults to a throwaway SQLite file")
+    parser.add_argument("--certs", type=int, default=5000)
+    parser.add_argument("--assets", type=int, default=5, help="assets per certificate")
+    parser.add_argument("--interfaces", type=int, default=1, help="interfaces per asset")
+    parser.add_argument("--shared-assets", type=float, default=0, help="fraction of assets shared between certificates")
+    parser.add_argument("--shared-pool", type=int, default=SHARED_ASSET_POOL, help="number of distinct shared assets")
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--streaming", action="store_true", help="QUALYS_SYNC_STREAMING (needs ijson)")
+    parser.add_argument("--partitioned", action="store_true", help="partitioned sync (validTo slices)")
+    parser.add_argument("--partition-workers", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--latency-per-item-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--csv-rows", type=int, default=100000)
+    parser.add_argument("--csv-duplicate-every", type=int, default=50, help="every Nth CSV row repeats a serial")
+    parser.add_argument("--chunksize", type=int, default=50000, help="leafcert_import chunk rows")
+    parser.add_argument("--batch-size", type=int, default=2000, help="csv_import_to_db batch rows")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in RUNNERS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}; available: {', '.join(SCENARIOS)}")
+
+    workdir = tempfile.mkdtemp(prefix="qualys-bench-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    args.archive_dir = os.path.join(workdir, "archive")
+    if {"leafcert_import", "csv_import_to_db"} & set(names):
+        args.csv_path = os.path.join(workdir, "leaf_certs.csv")
+        write_leafcert_csv(args.csv_path, args.csv_rows, duplicate_every=args.csv_duplicate_every)
+
+    print(
+        f"{os.environ['DATABASE_URL'].split(':', 1)[0]}: {args.certs} certs x {args.assets} assets x "
+        f"{args.interfaces} interfaces, page size {args.page_size}; {args.csv_rows} CSV rows"
+    )
+    ctx = multiprocessing.get_context("spawn")
+    all_rows = []
+    for name in names:
+        results = ctx.Queue()
+        child = ctx.Process(target=_run_child, args=(name, args, results))
+        child.start()
+        rows = results.get()
+        child.join()
+        _print_rows(rows)
+        all_rows.extend(rows)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(all_rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
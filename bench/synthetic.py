@@ -0,0 +1,128 @@
+"""
+Synthetic CertView certificates and leaf certificate CSV exports for the benchmarks.
+
+Everything is derived from the certificate id, so the same arguments always
+produce the same data.
+"""
+import csv
+
+
+# shared assets get ids above any cert_id * 1000 + n a bench tenant produces
+SHARED_ASSET_ID_BASE = 10 ** 12
+SHARED_ASSET_POOL = 1000
+
+
+def _asset(asset_id: int, uuid: str, name: str, netbios_name: str, a: int, b: int, interfaces_per_asset: int) -> dict:
+    return {
+        "id": asset_id,
+        "uuid": uuid,
+        "name": name,
+        "netbiosName": netbios_name,
+        "operatingSystem": "Linux",
+        "primaryIp": f"10.{(a >> 8) & 255}.{a & 255}.{b}",
+        "hostInstances": [{"port": 443, "protocol": "TCP"}],
+        "assetInterfaces": [{"address": f"10.{i}.{a & 255}.{b}"} for i in range(interfaces_per_asset)],
+    }
+
+
+def _is_shared(cert_id: int, n: int, shared_assets: float) -> bool:
+    # a fixed hash of (cert_id, n) in [0, 1), so the same slots are shared on every run
+    return ((cert_id * 2654435761 + n * 40503) % 1000) / 1000 < shared_assets
+
+
+def make_asset(
+    cert_id: int,
+    n: int,
+    interfaces_per_asset: int = 1,
+    shared_assets: float = 0,
+    shared_pool: int = SHARED_ASSET_POOL,
+) -> dict:
+    """
+    Asset n of a certificate. With shared_assets > 0 that fraction of the slots
+    draws from a pool of `shared_pool` assets that other certificates list too;
+    a shared asset's fields depend only on its id, so every certificate
+    reports it identically.
+    """
+    if _is_shared(cert_id, n, shared_assets):
+        k = (cert_id * 7919 + n) % shared_pool
+        asset_id, uuid, name, netbios_name = SHARED_ASSET_ID_BASE + k, f"shared-{k:08x}", f"shared-{k}", f"SHARED{k}"
+        return _asset(asset_id, uuid, name, netbios_name, k, 250 + k % 5, interfaces_per_asset)
+    asset_id, uuid, name, netbios_name = cert_id * 1000 + n, f"{cert_id:08x}-{n:04x}", f"host-{cert_id}-{n}", f"HOST{n}"
+    return _asset(asset_id, uuid, name, netbios_name, n, cert_id % 250, interfaces_per_asset)
+
+
+def make_item(
+    cert_id: int,
+    assets_per_cert: int,
+    interfaces_per_asset: int = 1,
+    shared_assets: float = 0,
+    shared_pool: int = SHARED_ASSET_POOL,
+) -> dict:
+    """
+    One CertView certificate with `assets_per_cert` assets of
+    `interfaces_per_asset` interfaces each; see make_asset for shared_assets.
+    """
+    return {
+        "id": cert_id,
+        "certhash": f"{cert_id:064x}",
+        "serialNumber": f"{cert_id:032x}",
+        "dn": f"CN=bench-{cert_id}.example.com, O=Bench, C=US",
+        "type": "Leaf",
+        "signatureAlgorithm": "SHA256withRSA" if cert_id % 10 else "SHA1withRSA",
+        "keySize": 2048 if cert_id % 7 else 1024,
+        "selfSigned": cert_id % 13 == 0,
+        "extendedValidation": False,
+        "validFromDate": "2024-01-01T00:00:00.000+00:00",
+        "validToDate": f"2026-{cert_id % 12 + 1:02d}-01T00:00:00.000+00:00",
+        "createdDate": "2024-01-02T00:00:00.000+00:00",
+        "updateDate": "2024-06-01T00:00:00.000+00:00",
+        "issuerCategory": "Public",
+        "instanceCount": assets_per_cert,
+        "assetCount": assets_per_cert,
+        "sources": ["VM"],
+        "subject": {"name": f"bench-{cert_id}.example.com", "organization": "Bench"},
+        "issuer": {"name": "Bench CA", "organization": "Bench"},
+        "assets": [
+            make_asset(cert_id, n, interfaces_per_asset, shared_assets, shared_pool) for n in range(assets_per_cert)
+        ],
+    }
+
+
+def make_page(
+    page_number: int,
+    page_size: int,
+    total: int,
+    assets_per_cert: int,
+    interfaces_per_asset: int = 1,
+    shared_assets: float = 0,
+    shared_pool: int = SHARED_ASSET_POOL,
+) -> list:
+    """Certificates pageNumber * pageSize + 1 ... of a tenant holding `total` certificates."""
+    first = page_number * page_size + 1
+    last = min(total, first + page_size - 1)
+    return [
+        make_item(i, assets_per_cert, interfaces_per_asset, shared_assets, shared_pool) for i in range(first, last + 1)
+    ]
+
+
+LEAFCERT_CSV_HEADER = ["Serial number", "Cert name", "Cert hash", "Valid from", "Valid to", "Cert status"]
+
+
+def write_leafcert_csv(path: str, rows: int, start: int = 1, duplicate_every: int = 0) -> None:
+    """
+    Leaf certificate export in the layout leafcert_import.DEFAULT_COLUMN_MAP
+    expects. duplicate_every=N repeats every Nth serial once more later in the file.
+    """
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(LEAFCERT_CSV_HEADER)
+        for n in range(start, start + rows):
+            serial = n - 1 if duplicate_every and n % duplicate_every == 0 and n > start else n
+            writer.writerow([
+                f" {serial:032x} ",
+                f"bench-{serial}.example.com",
+                f"{serial:064x}",
+                "2024-01-01",
+                "2026-01-01",
+                "ACTIVE" if serial % 5 else "",
+            ])
@@ -0,0 +1,96 @@
+import io
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from app.leafcert_import import DEFAULT_COLUMN_MAP, STRATEGIES, import_leafcert_csv, normalize_chunk
+
+HEADER = "Serial number,Cert name,Cert hash,Valid from,Valid to,Cert status\n"
+
+
+def _csv(*rows) -> io.StringIO:
+    return io.StringIO(HEADER + "".join(row + "\n" for row in rows))
+
+
+def _read(*rows) -> pd.DataFrame:
+    return pd.read_csv(_csv(*rows), dtype=str, keep_default_na=False)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        """
+        CREATE TABLE qualysLeafcertificates (
+            id INTEGER PRIMARY KEY,
+            serial_number VARCHAR(128) NOT NULL UNIQUE,
+            cert_name TEXT, certhash TEXT, valid_from_date TEXT, valid_to_date TEXT, certificate_status TEXT
+        )
+        """
+    )
+    yield conn
+    conn.close()
+
+
+def _stored(conn) -> list:
+    return conn.execute(
+        "SELECT serial_number, cert_name, certificate_status FROM qualysLeafcertificates ORDER BY serial_number"
+    ).fetchall()
+
+
+def test_normalize_chunk_strips_values_and_blanks_become_null():
+    df = normalize_chunk(
+        _read(" s1 ,  name one ,h1,2024-01-01,2025-01-01,Active", "s2,,h2,2024-01-01,2025-01-01,   "),
+        DEFAULT_COLUMN_MAP,
+        "serial_number",
+    )
+
+    assert list(df.columns) == list(DEFAULT_COLUMN_MAP)
+    assert df.iloc[0]["serial_number"] == "s1"
+    assert df.iloc[0]["cert_name"] == "name one"
+    assert df.iloc[1].isna().tolist() == [False, True, False, False, False, True]
+
+
+def test_normalize_chunk_blank_after_value_is_not_filled_from_previous_row():
+    df = normalize_chunk(_read("s1,a,h,,,Active", "s2,b,h,,,"), DEFAULT_COLUMN_MAP, "serial_number")
+
+    assert df["certificate_status"].isna().tolist() == [False, True]
+
+
+def test_normalize_chunk_drops_rows_without_serial():
+    df = normalize_chunk(
+        _read("s1,a,h,,,", "   ,b,h,,,", ",c,h,,,", "s4,d,h,,,"), DEFAULT_COLUMN_MAP, "serial_number"
+    )
+
+    assert df["serial_number"].tolist() == ["s1", "s4"]
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_import_skips_serials_repeated_across_chunks(conn, strategy):
+    f = _csv("s1,first,h,,,", "s2,b,h,,,", "s3,c,h,,,", " s1 ,second,h,,,", "s4,d,h,,,", "s2,again,h,,,")
+
+    stats = import_leafcert_csv(f, conn.cursor(), chunksize=2, strategy=strategy)
+
+    assert stats["rows_read"] == 6
+    assert stats["duplicates_in_file"] == 2
+    assert stats["inserted"] == 4
+    assert stats["existing"] == 0
+    assert _stored(conn) == [("s1", "first", None), ("s2", "b", None), ("s3", "c", None), ("s4", "d", None)]
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_import_then_rerun_inserts_only_new_serials(conn, strategy):
+    rows = ["s1,a,h1,2024-01-01,2025-01-01,Active", "s2,b,h2,2024-01-01,2025-01-01,", " ,no serial,h,,,"]
+
+    first = import_leafcert_csv(_csv(*rows), conn.cursor(), chunksize=2, strategy=strategy, commit=True)
+    rerun = import_leafcert_csv(_csv(*rows, "s3,c,h3,,,Revoked"), conn.cursor(), chunksize=2, strategy=strategy, commit=True)
+
+    assert (first["rows_read"], first["inserted"], first["existing"]) == (3, 2, 0)
+    assert (rerun["rows_read"], rerun["inserted"], rerun["existing"]) == (4, 1, 2)
+    assert _stored(conn) == [("s1", "a", "Active"), ("s2", "b", None), ("s3", "c", "Revoked")]
+
+
+def test_import_rejects_unknown_strategy(conn):
+    with pytest.raises(ValueError):
+        import_leafcert_csv(_csv("s1,a,h,,,"), conn.cursor(), strategy="merge")